@@ -27,6 +27,9 @@ var pitchHigh = 64;           // E3
 var baseBpm = 120;
 var velocityGamma = 1.5;          // Velocity curve: <1 = punch, 1 = linear, >1 = gentle
 
+// Precomputed onsets from onset_table.py (null until loadTable)
+var onsetTable = null;
+
 
 /**
  * Generate note times for Layer 1 (fades out), starting at t=0.
@@ -90,6 +93,125 @@ function generateLayerTimesBackward(totalBeats, baseBpm, startTempo, endTempo) {
     return times;
 }
 
+/**
+ * Read count little-endian values with File.readint16/readint32, in chunks.
+ */
+function readInts(f, count, bytes) {
+    var values = [];
+    while (values.length < count) {
+        var n = Math.min(1024, count - values.length);
+        var chunk = (bytes === 2) ? f.readint16(n) : f.readint32(n);
+        if (!chunk || chunk.length === 0) {
+            break;  // Truncated file
+        }
+        for (var i = 0; i < chunk.length; i++) {
+            values.push((bytes === 2) ? (chunk[i] & 0xFFFF) : chunk[i]);
+        }
+    }
+    return values;
+}
+
+/**
+ * Load an onset table written by onset_table.py into memory: header,
+ * index and every onset's step index. Lookups don't touch the file.
+ */
+function loadTable(path) {
+    var f = new File(path, "read");
+    if (!f.isopen) {
+        post("loadTable: can't open", path, "\n");
+        return;
+    }
+    f.byteorder = "little";
+
+    if (f.readchars(4).join("") !== "RSOT" || f.readint32(1)[0] !== 1) {
+        post("loadTable: not a version 1 onset table:", path, "\n");
+        f.close();
+        return;
+    }
+    var timeStep = f.readfloat64(1)[0];
+    var tableBpm = f.readfloat64(1)[0];
+    var nRatios = f.readint32(1)[0];
+    var nLengths = f.readint32(1)[0];
+
+    var ratioValues = readInts(f, 2 * nRatios, 4);
+    var ratios = {};
+    for (var i = 0; i < nRatios; i++) {
+        ratios[ratioValues[2 * i] + ":" + ratioValues[2 * i + 1]] = i;
+    }
+    var lengthValues = readInts(f, nLengths, 4);
+    var lengths = {};
+    for (var i = 0; i < nLengths; i++) {
+        lengths[lengthValues[i]] = i;
+    }
+    var index = readInts(f, 3 * nRatios * 2 * nLengths, 4);
+
+    var nSteps = 0;
+    for (var e = 0; e < index.length; e += 3) {
+        nSteps = Math.max(nSteps, index[e] + index[e + 1] + index[e + 2]);
+    }
+    var steps = readInts(f, nSteps, 2);
+    f.close();
+    if (steps.length < nSteps) {
+        post("loadTable: truncated onset table:", path, "\n");
+        return;
+    }
+
+    // Onsets are in beats and don't depend on tempo: bpm is informational
+    onsetTable = {
+        path: path,
+        timeStep: timeStep,
+        bpm: tableBpm,
+        nLengths: nLengths,
+        ratios: ratios,
+        lengths: lengths,
+        index: index,
+        steps: steps
+    };
+    post("Loaded onset table:", path, "(" + nRatios + " ratios, " + nLengths + " lengths)\n");
+}
+
+function gcd(a, b) {
+    return b === 0 ? a : gcd(b, a % b);
+}
+
+/**
+ * [layer1Times, layer2Times] from the loaded table, or null if there is
+ * no table or the current settings aren't on its grid.
+ */
+function lookupTableOnsets(metabarBeats) {
+    if (onsetTable === null) {
+        return null;
+    }
+    var num = Math.max(ratioNum, ratioDen);
+    var den = Math.min(ratioNum, ratioDen);
+    var common = gcd(num, den);
+    var ratioIndex = onsetTable.ratios[(num / common) + ":" + (den / common)];
+
+    var steps = metabarBeats / onsetTable.timeStep;
+    var lengthIndex = onsetTable.lengths[Math.round(steps)];
+    if (ratioIndex === undefined || lengthIndex === undefined || Math.abs(steps - Math.round(steps)) > 1e-6) {
+        return null;
+    }
+
+    var directionIndex = (direction === "accel") ? 0 : 1;
+    var entry = (ratioIndex * 2 + directionIndex) * onsetTable.nLengths + lengthIndex;
+    var offset = onsetTable.index[3 * entry];
+    var nLayer1 = onsetTable.index[3 * entry + 1];
+    var nLayer2 = onsetTable.index[3 * entry + 2];
+
+    var layer1Times = [];
+    var layer2Times = [];
+    for (var i = 0; i < nLayer1 + nLayer2; i++) {
+        var t = onsetTable.steps[offset + i] * onsetTable.timeStep;
+        if (i < nLayer1) {
+            layer1Times.push(t);
+        } else {
+            layer2Times.push(t);
+        }
+    }
+    return [layer1Times, layer2Times];
+}
+
 /**
  * Create notes for a layer with velocity crossfade.
  */
@@ -187,8 +309,16 @@ function generate() {
         layer2EndTempo = baseBpm;
     }
 
-    var layer1Times = generateLayerTimesForward(metabarBeats, baseBpm, layer1StartTempo, layer1EndTempo);
-    var layer2Times = generateLayerTimesBackward(metabarBeats, baseBpm, layer2StartTempo, layer2EndTempo);
+    var layer1Times, layer2Times;
+    var tableTimes = lookupTableOnsets(metabarBeats);
+    if (tableTimes !== null) {
+        post("onsets from table\n");
+        layer1Times = tableTimes[0];
+        layer2Times = tableTimes[1];
+    } else {
+        layer1Times = generateLayerTimesForward(metabarBeats, baseBpm, layer1StartTempo, layer1EndTempo);
+        layer2Times = generateLayerTimesBackward(metabarBeats, baseBpm, layer2StartTempo, layer2EndTempo);
+    }
 
     var allNotes = [];
 
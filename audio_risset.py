@@ -9,17 +9,34 @@ Two modes:
 - Simple: Two copies at fixed stretch ratios, crossfaded (stepped but fast)
 - Variable: Continuously varying playback rate (smooth but requires pyrubberband)
 
+Stretch backends (--stretch-backend):
+- librosa: phase vocoder (default for fixed rates)
+- rubberband: pyrubberband (default for variable rates)
+- wsola: pure-NumPy waveform-similarity overlap-add (fast, keeps transients)
+
 Usage:
     python audio_risset.py input.wav output.wav --ratio 2 --direction accel
     python audio_risset.py input.wav output.wav --ratio 3/2 --direction decel --mode variable
+    python audio_risset.py input.wav output.wav --ratio 2 --direction accel --stretch-backend wsola
 """
 
 import argparse
+import csv
+import hashlib
+import os
+import struct
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 import numpy as np
 import soundfile as sf
 import warnings
 from pathlib import Path
 
+from profiling import NULL_PROFILER, StageProfiler
+
 # Try to import optional dependencies
 try:
     import librosa
@@ -33,6 +50,32 @@ try:
 except ImportError:
     HAS_PYRUBBERBAND = False
 
+# "auto" = librosa for fixed rates, rubberband for variable rates
+STRETCH_BACKENDS = ["auto", "librosa", "rubberband", "wsola"]
+
+DEFAULT_CACHE_SIZE_MB = 2048
+
+# Samples mixed and written per block by the streaming output stage
+DEFAULT_BLOCK_SIZE = 65536
+
+# Window (samples) of the peak envelopes that set the streaming gain
+PEAK_RESOLUTION = 256
+
+# Shepard layers whose envelope stays below this in a block (-80 dB) are skipped
+SHEPARD_SILENCE = 1e-4
+
+# Internal sample rate targeted by --draft previews
+DRAFT_SAMPLE_RATE = 11025
+
+# Block size for --realtime (samples per device callback)
+REALTIME_BLOCK_SIZE = 512
+
+# Files picked up when --batch points at a directory
+AUDIO_EXTENSIONS = {".wav", ".flac", ".ogg", ".aif", ".aiff"}
+
+# Columns of a --batch manifest (only input is required)
+BATCH_FIELDS = ["input", "output", "ratio", "direction", "mode", "gamma"]
+
 
 def parse_ratio(ratio_str):
     """Parse ratio string like '2/1' or '3:2' into float >= 1."""
@@ -62,15 +105,7 @@ def apply_amplitude_envelope(audio, fade_out=True, gamma=1.5):
     - 3.0 = "Gentle" (soft, conservative)
     """
     n_samples = len(audio)
-    t = np.linspace(0, 1, n_samples)
-
-    if fade_out:
-        linear = 1.0 - t  # 1.0 → 0.0
-    else:
-        linear = t  # 0.0 → 1.0
-
-    # Apply gamma curve
-    envelope = np.power(linear, gamma)
+    envelope = fade_envelope(0, n_samples, n_samples, fade_out=fade_out, gamma=gamma)
 
     # Handle stereo
     if audio.ndim == 2:
@@ -79,11 +114,229 @@ def apply_amplitude_envelope(audio, fade_out=True, gamma=1.5):
     return audio * envelope
 
 
-def time_stretch_simple(audio, sr, rate):
+def detect_transients(mono, sr, frame_ms=2.0, lookback_ms=10.0, rise_db=12.0, floor_db=-50.0):
+    """
+    Onset sample positions from a short-frame energy envelope.
+
+    An onset is the first frame of a run whose level rises more than
+    rise_db over the quietest of the previous lookback_ms and is within
+    floor_db of the loudest frame. The signal is preceded by silence,
+    so an onset at sample 0 is found too. Each onset is then refined to
+    the first sample within a frame of it reaching a tenth of the local
+    peak.
+    """
+    frame = max(int(sr * frame_ms / 1000), 1)
+    lookback = max(1, int(round(lookback_ms / frame_ms)))
+    n_frames = len(mono) // frame
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    frames = np.asarray(mono[:n_frames * frame], dtype=np.float64).reshape(n_frames, frame)
+    levels = 10 * np.log10(np.maximum(np.mean(frames ** 2, axis=1), 1e-12))
+    levels = np.concatenate([np.full(lookback, -120.0), levels])
+
+    previous_min = np.lib.stride_tricks.sliding_window_view(levels[:-1], lookback).min(axis=1)
+    current = levels[lookback:]
+    rising = (current - previous_min > rise_db) & (current > levels.max() + floor_db)
+    first = rising & ~np.concatenate(([False], rising[:-1]))
+
+    magnitude = np.abs(np.asarray(mono, dtype=np.float64))
+    onsets = []
+    for start in (np.flatnonzero(first) * frame).tolist():
+        span = magnitude[max(0, start - frame):start + 2 * frame]
+        offset = int(np.argmax(span >= 0.1 * span.max())) if span.max() > 0 else frame
+        onsets.append(max(0, start - frame) + offset)
+    return np.array(onsets, dtype=np.int64)
+
+
+def time_stretch_wsola(audio, sr, start_rate, end_rate=None, frame_ms=40.0, tolerance_ms=10.0,
+                       transients=True, attack_ms=25.0):
+    """
+    Time-stretch using WSOLA (waveform-similarity overlap-add), NumPy only.
+
+    Each output frame is copied from near its nominal source position, shifted
+    by up to tolerance_ms so that it lines up with the natural continuation of
+    the previous frame. The best shift is found by normalized cross-correlation
+    computed with the FFT. Frames are Hann-windowed with 50% overlap.
+
+    transients=True keeps onsets (detect_transients) intact: the source from
+    just before each onset to attack_ms after it is copied verbatim, once, at
+    the onset's stretched time. Every frame overlapping that stretch of output
+    is pinned to the same source offset (no similarity shift), and no other
+    frame may read it, so a click is neither dropped at fast rates nor
+    repeated at slow ones. Onsets closer together than a frame are kept as
+    one group, with their spacing unstretched; a group whose output would
+    overlap the previous group's pinned frames is left to plain WSOLA.
+
+    start_rate, end_rate: playback rates (>1 = faster, <1 = slower).
+    end_rate=None gives a fixed rate; otherwise the rate changes linearly
+    over the source, like time_stretch_variable.
+
+    Multichannel audio is aligned on the mono sum so channels stay in phase.
+    """
+    if end_rate is None:
+        end_rate = start_rate
+
+    x = np.asarray(audio, dtype=np.float64)
+    is_mono = x.ndim == 1
+    if is_mono:
+        x = x[:, np.newaxis]
+    n_samples, n_channels = x.shape
+
+    hop = max(2, int(sr * frame_ms / 1000) // 2)
+    frame_len = 2 * hop
+    tol = max(1, int(sr * tolerance_ms / 1000))
+
+    # Source position s(t) for output time t solves ds/dt = rate(s):
+    # rate(s) = r0 + (r1 - r0) * s / n  ->  s(t) = r0 / k * (exp(k t) - 1)
+    fixed = np.isclose(start_rate, end_rate)
+    slope = (end_rate - start_rate) / max(n_samples, 1)
+    if fixed:
+        out_len = int(round(n_samples / start_rate))
+    else:
+        out_len = int(round(np.log(end_rate / start_rate) / slope))
+
+    n_frames = out_len // hop + 2
+    out_times = np.arange(n_frames) * hop
+    if fixed:
+        centres = start_rate * out_times
+    else:
+        centres = start_rate / slope * np.expm1(slope * out_times)
+
+    # Periodic Hann: windows at hop = frame_len / 2 sum to exactly 1
+    window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame_len) / frame_len)
+
+    # Zero-pad so frames and search regions near the edges stay in bounds
+    pad = frame_len + tol
+    src = np.pad(x, ((pad, pad + frame_len), (0, 0)))
+    guide = src.mean(axis=1)
+    energy = np.concatenate([[0.0], np.cumsum(guide ** 2)])
+    max_start = len(guide) - frame_len - tol - 1
+
+    # Transient groups: pinned frame start per frame, and the source each
+    # unpinned frame must stay within (padded sample positions)
+    pinned = np.full(n_frames, -1, dtype=np.int64)
+    allowed_lo = np.zeros(n_frames, dtype=np.int64)
+    allowed_hi = np.full(n_frames, max_start, dtype=np.int64)
+    if transients:
+        onsets = detect_transients(x.mean(axis=1), sr)
+        pre = max(1, int(sr * 0.005))  # Onset detection works in 2 ms frames
+        post = max(1, int(sr * attack_ms / 1000))
+
+        groups = []  # [first onset, last onset] in source samples
+        for onset in onsets.tolist():
+            if groups and onset - groups[-1][1] < pre + post + frame_len:
+                groups[-1][1] = onset
+            else:
+                groups.append([onset, onset])
+
+        last_pinned = -1
+        for first, last in groups:
+            # Output time of the first onset (inverse of the source map)
+            if fixed:
+                t = first / start_rate
+            else:
+                t = np.log1p(slope * first / start_rate) / slope
+            # Pre-trim output span to copy verbatim, and the frames touching it
+            out_lo = int(round(t)) + hop - pre
+            out_hi = int(round(t)) + hop + (last - first) + post
+            k_lo = max(0, -(-(out_lo - frame_len + 1) // hop))
+            k_hi = min(n_frames - 1, (out_hi - 1) // hop)
+            if k_lo <= last_pinned or k_lo > k_hi:
+                continue
+            offset = first + pad - (int(round(t)) + hop)
+            pinned[k_lo:k_hi + 1] = np.clip(np.arange(k_lo, k_hi + 1) * hop + offset, 0, max_start)
+            last_pinned = k_hi
+
+            # Unpinned frames keep out of the group's source
+            zone_lo, zone_hi = first + pad - pre, last + pad + post
+            allowed_hi[:k_lo] = np.minimum(allowed_hi[:k_lo], zone_lo - frame_len)
+            allowed_lo[k_hi + 1:] = np.maximum(allowed_lo[k_hi + 1:], zone_hi)
+
+    search_len = 2 * tol + 1
+    n_fft = 1 << int(np.ceil(np.log2(search_len + 2 * frame_len)))
+
+    output = np.zeros((n_frames * hop + frame_len, n_channels))
+    prev_start = None
+
+    for k in range(n_frames):
+        nominal = min(int(round(centres[k])) - hop + pad, max_start)
+        lo_k, hi_k = allowed_lo[k], allowed_hi[k]
+
+        if pinned[k] >= 0:
+            start = int(pinned[k])
+        elif prev_start is None:
+            start = nominal if lo_k > hi_k else int(np.clip(nominal, lo_k, hi_k))
+        else:
+            # Pick the shift that best continues the previous frame
+            template = guide[prev_start + hop:prev_start + hop + frame_len]
+            lo = nominal - tol
+            region = guide[lo:lo + search_len + frame_len - 1]
+
+            corr = np.fft.irfft(
+                np.fft.rfft(region, n_fft) * np.conj(np.fft.rfft(template, n_fft)),
+                n_fft
+            )[:search_len]
+            norms = np.sqrt(np.maximum(
+                energy[lo + frame_len:lo + frame_len + search_len] - energy[lo:lo + search_len],
+                0.0
+            ))
+            score = corr / np.maximum(norms, 1e-12)
+
+            # Shifts reading a pinned transient's source are off limits
+            candidates = lo + np.arange(search_len)
+            valid = (candidates >= lo_k) & (candidates <= hi_k)
+            if valid.all():
+                start = lo + int(np.argmax(score))
+            elif valid.any():
+                start = lo + int(np.argmax(np.where(valid, score, -np.inf)))
+            else:
+                start = int(np.clip(nominal, lo_k, hi_k)) if lo_k <= hi_k else int(lo_k)
+
+        output[k * hop:k * hop + frame_len] += src[start:start + frame_len] * window[:, np.newaxis]
+        prev_start = start
+
+    # Drop the half-window fade-in so output[0] lines up with source[0]
+    output = output[hop:hop + out_len]
+
+    if is_mono:
+        output = output[:, 0]
+    return output
+
+
+def time_stretch_simple(audio, sr, rate, backend="auto", cache=None, profiler=None):
     """
     Simple time-stretch using librosa.
     rate > 1 = faster (shorter), rate < 1 = slower (longer)
+
+    backend: "auto"/"librosa" (phase vocoder), "rubberband" or "wsola"
+    cache: optional StretchCache; hits skip the stretch entirely
+    profiler: optional profiling.StageProfiler ("stretch:<backend>" stage)
     """
+    if cache is not None:
+        key = cache.stretch_key(audio, sr, (rate,), "librosa" if backend == "auto" else backend)
+        stretched = cache.get(key)
+        if stretched is None:
+            stretched = cache.put(key, time_stretch_simple(audio, sr, rate, backend=backend, profiler=profiler))
+        return stretched
+
+    name = "librosa" if backend == "auto" else backend
+    with (profiler or NULL_PROFILER).stage(f"stretch:{name}", samples_in=len(audio)) as counters:
+        stretched = _time_stretch_simple(audio, sr, rate, backend)
+        counters["samples_out"] = len(stretched)
+    return stretched
+
+
+def _time_stretch_simple(audio, sr, rate, backend):
+    """Uncached fixed-rate stretch with the given backend."""
+    if backend == "wsola":
+        return time_stretch_wsola(audio, sr, rate)
+
+    if backend == "rubberband":
+        if not HAS_PYRUBBERBAND:
+            raise ImportError("pyrubberband required for the rubberband backend. Install with: pip install pyrubberband")
+        return pyrb.time_stretch(audio, sr, rate)
+
     if not HAS_LIBROSA:
         raise ImportError("librosa required for time-stretching. Install with: pip install librosa")
 
@@ -99,14 +352,40 @@ def time_stretch_simple(audio, sr, rate):
         return np.column_stack(channels)
 
 
-def time_stretch_variable(audio, sr, start_rate, end_rate):
+def time_stretch_variable(audio, sr, start_rate, end_rate, backend="auto", cache=None, profiler=None):
     """
     Variable-rate time-stretch using pyrubberband time-map.
 
     The rate changes continuously from start_rate to end_rate.
 
     start_rate, end_rate: playback rates (>1 = faster, <1 = slower)
+    backend: "auto"/"rubberband" or "wsola" (librosa has no variable rate)
+    cache: optional StretchCache; hits skip the stretch entirely
+    profiler: optional profiling.StageProfiler ("stretch:<backend>" stage)
     """
+    if cache is not None:
+        key = cache.stretch_key(audio, sr, (start_rate, end_rate), "rubberband" if backend == "auto" else backend)
+        stretched = cache.get(key)
+        if stretched is None:
+            stretched = cache.put(key, time_stretch_variable(audio, sr, start_rate, end_rate,
+                                                             backend=backend, profiler=profiler))
+        return stretched
+
+    name = "rubberband" if backend == "auto" else backend
+    with (profiler or NULL_PROFILER).stage(f"stretch:{name}", samples_in=len(audio)) as counters:
+        stretched = _time_stretch_variable(audio, sr, start_rate, end_rate, backend)
+        counters["samples_out"] = len(stretched)
+    return stretched
+
+
+def _time_stretch_variable(audio, sr, start_rate, end_rate, backend):
+    """Uncached variable-rate stretch with the given backend."""
+    if backend == "wsola":
+        return time_stretch_wsola(audio, sr, start_rate, end_rate)
+
+    if backend == "librosa":
+        raise ValueError("librosa backend has no variable-rate mode. Use rubberband or wsola.")
+
     if not HAS_PYRUBBERBAND:
         raise ImportError("pyrubberband required for variable-rate stretching. Install with: pip install pyrubberband")
 
@@ -149,16 +428,306 @@ def time_stretch_variable(audio, sr, start_rate, end_rate):
     return stretched
 
 
-def generate_audio_risset_simple(
+class StretchCache:
+    """
+    Content-addressed on-disk cache of decoded input and stretched layers.
+
+    Entries are plain .npy files named by a SHA-256 key over the input
+    content, the rate(s), the stretch backend and the sample rate. Hits are
+    opened with mmap_mode="r", so a cached layer costs no decode, no stretch
+    and no up-front read. A gamma-only change then just re-runs the envelope
+    and mix.
+
+    The directory is kept under max_bytes by evicting least-recently-used
+    entries (file mtime is bumped on every hit).
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_SIZE_MB * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # id(array) -> (array, digest) so arrays we loaded are never re-hashed
+        self._digests = {}
+        self.evict()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.npy"
+
+    def digest(self, audio):
+        """SHA-256 of an array's contents (memoized per array object)."""
+        entry = self._digests.get(id(audio))
+        if entry is not None and entry[0] is audio:
+            return entry[1]
+        h = hashlib.sha256()
+        h.update(str((audio.dtype.str, audio.shape)).encode())
+        h.update(np.ascontiguousarray(audio).data)
+        digest = h.hexdigest()
+        self._digests[id(audio)] = (audio, digest)
+        return digest
+
+    def stretch_key(self, audio, sr, rates, backend):
+        parts = ["stretch", self.digest(audio), repr(tuple(float(r) for r in rates)), backend, str(sr)]
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+    def get(self, key):
+        """Return the cached array (memory-mapped, read-only) or None."""
+        path = self._path(key)
+        try:
+            arr = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+        os.utime(path)  # LRU bookkeeping
+        self.hits += 1
+        return arr
+
+    def put(self, key, arr):
+        """Store arr under key (atomically), evict if over budget, return arr."""
+        path = self._path(key)
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(arr))
+        os.replace(tmp, path)
+        self.evict(keep=path)
+        return arr
+
+    def load_audio(self, path, mapped=False):
+        """
+        Decode an audio file through the cache.
+
+        Keyed by the file's content hash, so the decode is skipped for any
+        file seen before, whatever its name. mapped=True decodes a miss
+        through load_audio_mapped, so the input is never read into RAM
+        whole; hits are memory-mapped either way.
+        """
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        sr = sf.info(str(path)).samplerate
+        key = hashlib.sha256(f"decoded|{h.hexdigest()}|{sr}".encode()).hexdigest()
+
+        audio = self.get(key)
+        if audio is None:
+            if mapped:
+                audio, sr = load_audio_mapped(path, scratch_dir=self.cache_dir)
+            else:
+                audio, sr = sf.read(str(path))
+            self.put(key, audio)
+            audio = np.load(self._path(key), mmap_mode="r")
+
+        # Stretch keys are derived from the file hash, not the decoded bytes
+        self._digests[id(audio)] = (audio, key)
+        return audio, sr
+
+    def evict(self, keep=None):
+        """Delete least-recently-used entries until under max_bytes."""
+        entries = []
+        total = 0
+        for p in self.cache_dir.glob("*.npy"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+
+        for _, size, p in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if p == keep:
+                continue
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+# WAVE_FORMAT tags understood by the memory-mapped reader
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# RIFF chunk sizes are 32-bit; bigger files are written as RF64
+RIFF_MAX_BYTES = 0xFFFFFFFF
+
+
+def open_wav_memmap(path, mode="r"):
+    """
+    Memory-map the data chunk of an uncompressed WAV or RF64 file.
+
+    Returns (array, sr), where array is an np.memmap of shape (frames,) or
+    (frames, channels) viewing the samples in place: nothing is read
+    until it's touched. Supports 16/32-bit PCM and 32/64-bit float,
+    including WAVE_FORMAT_EXTENSIBLE. Raises ValueError for anything else
+    (24-bit PCM, compressed formats, non-RIFF files).
+    """
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] not in (b"RIFF", b"RF64") or riff[8:12] != b"WAVE":
+            raise ValueError(f"{path}: not a RIFF/RF64 WAVE file")
+
+        fmt = None
+        ds64_data_size = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path}: no data chunk")
+            chunk_id = header[:4]
+            chunk_size = struct.unpack("<I", header[4:])[0]
+
+            if chunk_id == b"ds64":
+                body = f.read(chunk_size)
+                ds64_data_size = struct.unpack("<Q", body[8:16])[0]
+            elif chunk_id == b"fmt ":
+                body = f.read(chunk_size)
+                tag, channels, sr, _, block_align, bits = struct.unpack("<HHIIHH", body[:16])
+                if tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    tag = struct.unpack("<H", body[24:26])[0]
+                fmt = (tag, channels, sr, block_align, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError(f"{path}: data chunk before fmt chunk")
+                if chunk_size == RIFF_MAX_BYTES and ds64_data_size is not None:
+                    chunk_size = ds64_data_size
+                offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size, 1)
+            if chunk_size % 2:
+                f.seek(1, 1)  # chunks are word-aligned
+
+        f.seek(0, 2)
+        chunk_size = min(chunk_size, f.tell() - offset)
+
+    tag, channels, sr, block_align, bits = fmt
+    dtypes = {
+        (WAVE_FORMAT_PCM, 16): "<i2",
+        (WAVE_FORMAT_PCM, 32): "<i4",
+        (WAVE_FORMAT_IEEE_FLOAT, 32): "<f4",
+        (WAVE_FORMAT_IEEE_FLOAT, 64): "<f8",
+    }
+    if (tag, bits) not in dtypes:
+        raise ValueError(f"{path}: can't memory-map format tag {tag:#x} at {bits} bits")
+
+    frames = chunk_size // block_align
+    shape = (frames,) if channels == 1 else (frames, channels)
+    return np.memmap(path, dtype=dtypes[(tag, bits)], mode=mode, offset=offset, shape=shape), sr
+
+
+def create_wav_memmap(path, n_frames, n_channels, sr):
+    """
+    Create a 32-bit float WAV (RF64 above 4 GiB) and memory-map its data.
+
+    Returns a writable np.memmap of shape (n_frames,) or
+    (n_frames, n_channels); the file is allocated sparsely, so nothing is
+    written until samples are assigned.
+    """
+    block_align = 4 * n_channels
+    data_bytes = n_frames * block_align
+    fmt = struct.pack("<HHIIHH", WAVE_FORMAT_IEEE_FLOAT, n_channels, sr,
+                      sr * block_align, block_align, 32)
+    fact = struct.pack("<I", min(n_frames, RIFF_MAX_BYTES))
+    # 12 (RIFF) + 24 (fmt) + 12 (fact) + 8 (data header) + optional 36 (ds64)
+    rf64 = 56 + data_bytes > RIFF_MAX_BYTES
+
+    with open(path, "wb") as f:
+        if rf64:
+            f.write(b"RF64" + struct.pack("<I", RIFF_MAX_BYTES) + b"WAVE")
+            f.write(b"ds64" + struct.pack("<IQQQI", 28, 36 + 56 - 8 + data_bytes,
+                                          data_bytes, n_frames, 0))
+        else:
+            f.write(b"RIFF" + struct.pack("<I", 56 - 8 + data_bytes) + b"WAVE")
+        f.write(b"fmt " + struct.pack("<I", len(fmt)) + fmt)
+        f.write(b"fact" + struct.pack("<I", len(fact)) + fact)
+        f.write(b"data" + struct.pack("<I", RIFF_MAX_BYTES if rf64 else data_bytes))
+        offset = f.tell()
+        f.truncate(offset + data_bytes)
+
+    shape = (n_frames,) if n_channels == 1 else (n_frames, n_channels)
+    return np.memmap(path, dtype="<f4", mode="r+", offset=offset, shape=shape)
+
+
+def load_audio_mapped(path, scratch_dir=None, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Open an input file without loading it into RAM.
+
+    Float WAV/RF64 data is returned as a direct memory-mapped view. PCM
+    WAV is converted block by block into a float32 scratch file (in
+    scratch_dir, default the system temp dir) and returned memory-mapped,
+    so peak memory is one block. Anything else falls back to sf.read.
+    """
+    try:
+        raw, sr = open_wav_memmap(path)
+    except ValueError:
+        return sf.read(str(path))
+
+    if raw.dtype.kind == "f":
+        return raw, sr
+
+    scale = float(2 ** (8 * raw.dtype.itemsize - 1))
+    fd, scratch = tempfile.mkstemp(suffix=".npy", dir=scratch_dir)
+    os.close(fd)
+    audio = np.lib.format.open_memmap(scratch, mode="w+", dtype=np.float32, shape=raw.shape)
+    for start in range(0, len(raw), block_size):
+        audio[start:start + block_size] = raw[start:start + block_size] / scale
+    audio.flush()
+    # The mapping stays valid after unlinking on POSIX; the space is freed on exit
+    try:
+        os.unlink(scratch)
+    except OSError:
+        pass
+    return audio, sr
+
+
+def fade_envelope(start, stop, n_samples, fade_out=True, gamma=1.5):
+    """
+    Samples [start, stop) of the crossfade curve used by
+    apply_amplitude_envelope over n_samples, so mixes can be built
+    block by block without materializing the whole envelope.
+    """
+    t = np.arange(start, stop) / max(n_samples - 1, 1)
+    linear = 1.0 - t if fade_out else t
+    return np.power(np.clip(linear, 0.0, 1.0), gamma)
+
+
+def shepard_envelope_matrix(start, stop, n_samples, positions, direction="accel",
+                            gamma=1.5, sigma=0.3, dtype=np.float32):
+    """
+    (layers × samples) Gaussian envelopes for samples [start, stop).
+
+    The bell centre sweeps 0 → 1 (accel) or 1 → 0 (decel) over n_samples;
+    positions are the layers' places in the rate spectrum (0 to 1).
+    exp(-d²/2)**gamma is folded into a single exp(-gamma·d²/2).
+    """
+    center = (np.arange(start, stop) / max(n_samples - 1, 1)).astype(dtype)
+    if direction != "accel":
+        center = 1.0 - center
+    d = (np.asarray(positions, dtype=dtype)[:, np.newaxis] - center) / dtype(sigma)
+    return np.exp(dtype(-0.5 * gamma) * d * d)
+
+
+def bell_envelope(start, stop, n_samples, position, direction="accel", gamma=1.5, sigma=0.3):
+    """Samples [start, stop) of one Shepard layer's Gaussian envelope."""
+    return shepard_envelope_matrix(start, stop, n_samples, [position], direction=direction,
+                                   gamma=gamma, sigma=sigma, dtype=np.float64)[0]
+
+
+def plan_audio_risset_simple(
     audio,
     sr,
     ratio=2.0,
     direction="accel",
     gamma=1.5,
-    n_layers=2
+    backend="auto",
+    cache=None,
+    profiler=None
 ):
     """
-    Generate Risset audio using simple fixed-rate stretching.
+    Mix plan for simple fixed-rate stretching.
 
     Creates two layers:
     - Layer 1: Original rate, fading out
@@ -171,55 +740,37 @@ def generate_audio_risset_simple(
     if direction == "accel":
         # Layer 1: base tempo → faster (but we use original audio)
         # Layer 2: slower tempo → base (stretched = longer = slower)
-        layer1_audio = audio.copy()
-        layer2_audio = time_stretch_simple(audio, sr, rate=1.0/ratio)  # Slower
+        layer2_audio = time_stretch_simple(audio, sr, rate=1.0/ratio, backend=backend, cache=cache, profiler=profiler)  # Slower
     else:
         # Decel: Layer 1 base→slower, Layer 2 faster→base
-        layer1_audio = audio.copy()
-        layer2_audio = time_stretch_simple(audio, sr, rate=ratio)  # Faster
-
-    # Match lengths: trim or pad layer2 to match layer1
-    target_len = n_samples
-    if len(layer2_audio) > target_len:
-        layer2_audio = layer2_audio[:target_len]
-    elif len(layer2_audio) < target_len:
-        # Pad with zeros (or loop if you prefer)
-        if audio.ndim == 2:
-            padding = np.zeros((target_len - len(layer2_audio), audio.shape[1]))
-        else:
-            padding = np.zeros(target_len - len(layer2_audio))
-        layer2_audio = np.concatenate([layer2_audio, padding])
+        layer2_audio = time_stretch_simple(audio, sr, rate=ratio, backend=backend, cache=cache, profiler=profiler)  # Faster
 
-    # Apply amplitude envelopes
-    layer1 = apply_amplitude_envelope(layer1_audio, fade_out=True, gamma=gamma)
-    layer2 = apply_amplitude_envelope(layer2_audio, fade_out=False, gamma=gamma)
+    # Layer 2 is trimmed (or zero-padded) to layer 1's length by mix_block
+    return {
+        "n_samples": n_samples,
+        "layers": [
+            (audio, partial(fade_envelope, n_samples=n_samples, fade_out=True, gamma=gamma)),
+            (layer2_audio, partial(fade_envelope, n_samples=n_samples, fade_out=False, gamma=gamma)),
+        ],
+    }
 
-    # Mix layers
-    output = layer1 + layer2
 
-    # Normalize to prevent clipping
-    max_val = np.max(np.abs(output))
-    if max_val > 0:
-        output = output / max_val * 0.95
-
-    return output
-
-
-def generate_audio_risset_variable(
+def plan_audio_risset_variable(
     audio,
     sr,
     ratio=2.0,
     direction="accel",
-    gamma=1.5
+    gamma=1.5,
+    backend="auto",
+    cache=None,
+    profiler=None
 ):
     """
-    Generate Risset audio using variable-rate time-stretching.
+    Mix plan for variable-rate time-stretching.
 
     Creates two layers with continuously varying playback rates,
     matching the MIDI implementation more closely.
     """
-    n_samples = len(audio)
-
     if direction == "accel":
         # Layer 1: rate goes 1.0 → ratio (speeding up)
         # Layer 2: rate goes 1/ratio → 1.0 (also speeding up, from slower)
@@ -231,54 +782,45 @@ def generate_audio_risset_variable(
         layer2_start, layer2_end = ratio, 1.0
 
     # Generate layers with variable rate
-    layer1_audio = time_stretch_variable(audio, sr, layer1_start, layer1_end)
-    layer2_audio = time_stretch_variable(audio, sr, layer2_start, layer2_end)
+    layer1_audio = time_stretch_variable(audio, sr, layer1_start, layer1_end,
+                                         backend=backend, cache=cache, profiler=profiler)
+    layer2_audio = time_stretch_variable(audio, sr, layer2_start, layer2_end,
+                                         backend=backend, cache=cache, profiler=profiler)
 
-    # Match lengths
+    # Output spans the longer layer; the shorter one is zero-padded
     target_len = max(len(layer1_audio), len(layer2_audio))
 
-    def pad_or_trim(arr, target):
-        if len(arr) > target:
-            return arr[:target]
-        elif len(arr) < target:
-            if arr.ndim == 2:
-                padding = np.zeros((target - len(arr), arr.shape[1]))
-            else:
-                padding = np.zeros(target - len(arr))
-            return np.concatenate([arr, padding])
-        return arr
-
-    layer1_audio = pad_or_trim(layer1_audio, target_len)
-    layer2_audio = pad_or_trim(layer2_audio, target_len)
+    return {
+        "n_samples": target_len,
+        "layers": [
+            (layer1_audio, partial(fade_envelope, n_samples=target_len, fade_out=True, gamma=gamma)),
+            (layer2_audio, partial(fade_envelope, n_samples=target_len, fade_out=False, gamma=gamma)),
+        ],
+    }
 
-    # Apply amplitude envelopes
-    layer1 = apply_amplitude_envelope(layer1_audio, fade_out=True, gamma=gamma)
-    layer2 = apply_amplitude_envelope(layer2_audio, fade_out=False, gamma=gamma)
 
-    # Mix
-    output = layer1 + layer2
-
-    # Normalize
-    max_val = np.max(np.abs(output))
-    if max_val > 0:
-        output = output / max_val * 0.95
-
-    return output
-
-
-def generate_audio_risset_shepard(
+def plan_audio_risset_shepard(
     audio,
     sr,
     ratio=2.0,
     direction="accel",
     gamma=1.5,
-    n_layers=8
+    n_layers=8,
+    backend="auto",
+    cache=None,
+    profiler=None
 ):
     """
-    Generate Risset audio using Shepard-style multiple layers.
+    Mix plan for Shepard-style multiple layers.
 
     Creates N layers at logarithmically spaced rates with bell-curve
     amplitude envelopes. More computationally expensive but smoother.
+
+    The plan is mixed as a matrix: each block computes the whole
+    (layers × samples) envelope matrix at once, accumulates in float32, and
+    skips layers below SHEPARD_SILENCE in that block, so the quiet tails
+    of the outer layers cost nothing. Stretched layers are trimmed to the
+    metabar and kept as float32 (cached layers stay memory-mapped).
     """
     n_samples = len(audio)
 
@@ -287,55 +829,753 @@ def generate_audio_risset_shepard(
     log_rates = np.linspace(-np.log(ratio), np.log(ratio), n_layers)
     rates = np.exp(log_rates)
 
+    # Position of each layer in the "spectrum" (0 to 1)
+    if n_layers > 1:
+        positions = np.arange(n_layers) / (n_layers - 1)
+    else:
+        positions = np.array([0.5])
+
     layers = []
-    for i, rate in enumerate(rates):
-        # Time-stretch this layer
-        stretched = time_stretch_simple(audio, sr, rate=rate)
+    for rate, position in zip(rates, positions):
+        # Time-stretch this layer; only the first n_samples are ever heard
+        stretched = time_stretch_simple(audio, sr, rate=rate, backend=backend, cache=cache,
+                                        profiler=profiler)[:n_samples]
+        if not isinstance(stretched, np.memmap):
+            stretched = stretched.astype(np.float32)
+
+        # Bell moves from low rates to high rates (accel) or back (decel)
+        envelope = partial(bell_envelope, n_samples=n_samples, position=position,
+                           direction=direction, gamma=gamma)
+        layers.append((stretched, envelope))
+
+    return {
+        "n_samples": n_samples,
+        "layers": layers,
+        "envelopes": partial(shepard_envelope_matrix, n_samples=n_samples, positions=positions,
+                             direction=direction, gamma=gamma),
+        "silence": SHEPARD_SILENCE,
+        "dtype": np.float32,
+    }
+
+
+def plan_audio_risset(audio, sr, mode="simple", ratio=2.0, direction="accel",
+                      gamma=1.5, n_layers=8, backend="auto", cache=None, profiler=None):
+    """Build the mix plan for one of the three modes by name."""
+    if mode == "simple":
+        return plan_audio_risset_simple(
+            audio, sr, ratio=ratio, direction=direction, gamma=gamma,
+            backend=backend, cache=cache, profiler=profiler
+        )
+    elif mode == "variable":
+        return plan_audio_risset_variable(
+            audio, sr, ratio=ratio, direction=direction, gamma=gamma,
+            backend=backend, cache=cache, profiler=profiler
+        )
+    elif mode == "shepard":
+        return plan_audio_risset_shepard(
+            audio, sr, ratio=ratio, direction=direction,
+            gamma=gamma, n_layers=n_layers, backend=backend,
+            cache=cache, profiler=profiler
+        )
+    raise ValueError(f"Unknown mode: {mode}")
+
+
+def plan_envelopes(plan, start, stop):
+    """
+    Envelope matrix (layers × samples) of a plan for samples [start, stop).
+
+    Plans may supply a vectorized "envelopes" function; otherwise the
+    per-layer envelope functions are stacked.
+    """
+    if "envelopes" in plan:
+        return plan["envelopes"](start, stop)
+    return np.stack([envelope_fn(start, stop) for _, envelope_fn in plan["layers"]])
+
+
+def mix_block(plan, start, stop):
+    """
+    Mix output samples [start, stop) of a plan.
+
+    Layers shorter than the plan are treated as zero-padded and longer
+    ones as trimmed, so no layer is ever copied to a common length.
+    Layers whose envelope stays at or below plan["silence"] over the block
+    are skipped. Accumulates in plan["dtype"] (default float64).
+    """
+    first = plan["layers"][0][0]
+    shape = (stop - start,) + first.shape[1:]
+    block = np.zeros(shape, dtype=plan.get("dtype", np.float64))
+    silence = plan.get("silence", 0.0)
+
+    envelopes = plan_envelopes(plan, start, stop)
+    for (layer_audio, _), envelope in zip(plan["layers"], envelopes):
+        end = min(stop, len(layer_audio))
+        if end <= start:
+            continue
+        envelope = envelope[:end - start]
+        if envelope.max() <= silence:
+            continue
+        if layer_audio.ndim == 2:
+            envelope = envelope[:, np.newaxis]
+        block[:end - start] += layer_audio[start:end] * envelope
+
+    return block
+
+
+def iter_mix_blocks(plan, block_size=DEFAULT_BLOCK_SIZE):
+    """Yield (start, block) over the whole plan, block_size samples at a time."""
+    for start in range(0, plan["n_samples"], block_size):
+        yield start, mix_block(plan, start, min(start + block_size, plan["n_samples"]))
+
+
+def _window_max(values, resolution):
+    """Max over consecutive windows of `resolution` samples (last may be short)."""
+    n_windows = -(-len(values) // resolution)
+    padded = np.zeros(n_windows * resolution)
+    padded[:len(values)] = values
+    return padded.reshape(n_windows, resolution).max(axis=1)
+
+
+def estimate_peak(plan, block_size=DEFAULT_BLOCK_SIZE, resolution=PEAK_RESOLUTION):
+    """
+    Upper bound on the mix peak from per-layer peak envelopes.
+
+    Every `resolution`-sample window contributes the sum over layers of
+    (envelope max × layer peak) in that window. This never underestimates,
+    so a gain derived from it can't clip, and it needs no mixed output at
+    all: memory stays at one block.
+    """
+    bound = 0.0
+    silence = plan.get("silence", 0.0)
+    for start in range(0, plan["n_samples"], block_size):
+        stop = min(start + block_size, plan["n_samples"])
+        window_bounds = np.zeros(-(-(stop - start) // resolution))
+        envelopes = plan_envelopes(plan, start, stop)
+        for (layer_audio, _), envelope in zip(plan["layers"], envelopes):
+            end = min(stop, len(layer_audio))
+            if end <= start:
+                continue
+            envelope = envelope[:end - start]
+            if envelope.max() <= silence:
+                continue
+            samples = np.abs(layer_audio[start:end])
+            if samples.ndim == 2:
+                samples = samples.max(axis=1)
+            layer_peaks = _window_max(samples, resolution)
+            envelope_peaks = _window_max(envelope, resolution)
+            window_bounds[:len(layer_peaks)] += layer_peaks * envelope_peaks
+        bound = max(bound, float(window_bounds.max()))
+    return bound
+
+
+def render_mix(plan, headroom=0.95, block_size=DEFAULT_BLOCK_SIZE, profiler=None):
+    """Mix a plan into one array, normalized so the peak is headroom."""
+    profiler = profiler or NULL_PROFILER
+    first = plan["layers"][0][0]
+    with profiler.stage("mix", samples=plan["n_samples"]):
+        output = np.empty((plan["n_samples"],) + first.shape[1:], dtype=plan.get("dtype", np.float64))
+        for start, block in iter_mix_blocks(plan, block_size):
+            output[start:start + len(block)] = block
+
+    # Normalize to prevent clipping
+    with profiler.stage("normalize", samples=plan["n_samples"]):
+        max_val = np.max(np.abs(output))
+        if max_val > 0:
+            output = output / max_val * headroom
+
+    return output
+
+
+def write_mix(path, plan, sr, block_size=DEFAULT_BLOCK_SIZE, headroom=0.95, cycles=1, mmap=False,
+              profiler=None):
+    """
+    Stream a plan to disk block by block (format from the extension:
+    WAV, FLAC, OGG, ...).
+
+    Gain comes from estimate_peak, so the full mix is never held in memory.
+    The true peak is tracked on the way out and returned with the gain.
+
+    cycles > 1 tiles the metabar back to back. It is mixed once into a
+    float32 buffer and written out cycles times, so compute and memory
+    stay at one metabar and every repeat has the same gain. Repeats join
+    with no gap or overlap.
+
+    mmap=True writes a float32 WAV/RF64 through create_wav_memmap instead
+    and mixes in place on the disk-backed array (see _write_mix_mapped).
+
+    profiler (optional profiling.StageProfiler) gets "peak_scan" (the
+    normalization gain), "mix" (enveloping and summing) and "write".
+    """
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage("peak_scan", samples=plan["n_samples"] * len(plan["layers"])):
+        bound = estimate_peak(plan, block_size)
+    gain = headroom / bound if bound > 0 else 1.0
+    n_channels = plan["layers"][0][0].shape[1] if plan["layers"][0][0].ndim == 2 else 1
+
+    if mmap:
+        stats = _write_mix_mapped(path, plan, sr, gain, block_size, cycles, n_channels, profiler)
+        profiler.count("write", bytes=os.path.getsize(path))
+        return stats
+
+    peak = 0.0
+    cycle = None
+    if cycles > 1:
+        first = plan["layers"][0][0]
+        cycle = np.empty((plan["n_samples"],) + first.shape[1:], dtype=np.float32)
+
+    with sf.SoundFile(path, "w", samplerate=sr, channels=n_channels) as f:
+        for start in range(0, plan["n_samples"], block_size):
+            with profiler.stage("mix") as counters:
+                block = mix_block(plan, start, min(start + block_size, plan["n_samples"]))
+                block *= gain
+                peak = max(peak, float(np.max(np.abs(block))) if len(block) else 0.0)
+                counters["samples"] = len(block)
+            with profiler.stage("write", samples=len(block)):
+                if cycle is not None:
+                    # Write the stored copy so every repeat is bit-identical
+                    cycle[start:start + len(block)] = block
+                    block = cycle[start:start + len(block)]
+                f.write(block)
+
+        with profiler.stage("write", samples=plan["n_samples"] * (cycles - 1)):
+            for _ in range(cycles - 1):
+                for start in range(0, plan["n_samples"], block_size):
+                    f.write(cycle[start:start + block_size])
+    profiler.count("write", bytes=os.path.getsize(path))
+
+    return {"frames": plan["n_samples"] * cycles, "gain": gain, "peak": peak, "cycles": cycles}
+
+
+def _write_mix_mapped(path, plan, sr, gain, block_size, cycles, n_channels, profiler=NULL_PROFILER):
+    """
+    write_mix for memory-mapped float WAV output.
+
+    Accumulates one layer at a time straight into the mapped output, so each
+    (possibly also mapped) layer is read sequentially once. Repeats are
+    copied from the first cycle on disk.
+    """
+    n_samples = plan["n_samples"]
+    out = create_wav_memmap(path, n_samples * cycles, n_channels, sr)
+
+    # The new file is zero-filled, so every layer can simply accumulate
+    silence = plan.get("silence", 0.0)
+    with profiler.stage("mix") as counters:
+        counters["samples"] = 0
+        for layer_audio, envelope_fn in plan["layers"]:
+            for start in range(0, min(len(layer_audio), n_samples), block_size):
+                end = min(start + block_size, n_samples, len(layer_audio))
+                envelope = envelope_fn(start, end)
+                if envelope.max() <= silence:
+                    continue
+                envelope = envelope * gain
+                if layer_audio.ndim == 2:
+                    envelope = envelope[:, np.newaxis]
+                out[start:end] += layer_audio[start:end] * envelope
+                counters["samples"] += end - start
+
+    with profiler.stage("measure_peak", samples=n_samples):
+        peak = 0.0
+        for start in range(0, n_samples, block_size):
+            block = out[start:start + block_size]
+            peak = max(peak, float(np.max(np.abs(block))) if len(block) else 0.0)
+
+    with profiler.stage("write", samples=n_samples * cycles):
+        for c in range(1, cycles):
+            for start in range(0, n_samples, block_size):
+                end = min(start + block_size, n_samples)
+                out[c * n_samples + start:c * n_samples + end] = out[start:end]
+
+        out.flush()
+        del out
+    return {"frames": n_samples * cycles, "gain": gain, "peak": peak, "cycles": cycles}
+
+
+def generate_audio_risset_simple(audio, sr, ratio=2.0, direction="accel", gamma=1.5,
+                                 n_layers=2, backend="auto", cache=None):
+    """Generate Risset audio using simple fixed-rate stretching (normalized array)."""
+    return render_mix(plan_audio_risset_simple(
+        audio, sr, ratio=ratio, direction=direction, gamma=gamma, backend=backend, cache=cache
+    ))
+
+
+def generate_audio_risset_variable(audio, sr, ratio=2.0, direction="accel", gamma=1.5,
+                                   backend="auto", cache=None):
+    """Generate Risset audio using variable-rate time-stretching (normalized array)."""
+    return render_mix(plan_audio_risset_variable(
+        audio, sr, ratio=ratio, direction=direction, gamma=gamma, backend=backend, cache=cache
+    ))
+
+
+def generate_audio_risset_shepard(audio, sr, ratio=2.0, direction="accel", gamma=1.5,
+                                  n_layers=8, backend="auto", cache=None):
+    """Generate Risset audio using Shepard-style multiple layers (normalized array)."""
+    return render_mix(plan_audio_risset_shepard(
+        audio, sr, ratio=ratio, direction=direction, gamma=gamma, n_layers=n_layers,
+        backend=backend, cache=cache
+    ))
+
+
+def render_audio_risset(audio, sr, mode="simple", ratio=2.0, direction="accel",
+                        gamma=1.5, n_layers=8, backend="auto", cache=None, profiler=None):
+    """Run one of the three generators by mode name."""
+    return render_mix(plan_audio_risset(
+        audio, sr, mode=mode, ratio=ratio, direction=direction, gamma=gamma,
+        n_layers=n_layers, backend=backend, cache=cache, profiler=profiler
+    ), profiler=profiler)
+
+
+class RealtimeRisset:
+    """
+    Block-based Risset effect for a live audio chain.
+
+    Feed fixed-size input blocks to process() and get output blocks of the
+    same size back. Each layer is a WSOLA read head on a delay line over the
+    input: its playback rate follows the layer's tempo ramp and its gain the
+    crossfade envelope, both driven by the metabar phase, which loops
+    forever. At every seam the loud fading-in head carries on as the new
+    fading-out head (read position and grain alignment intact), and a fresh,
+    silent head starts at the far end of the delay range.
+
+    The delay range is fixed by ratio and metabar length, so latency is
+    bounded: every output sample is between min_latency and latency
+    samples behind the input it came from (one hop of that is synthesis).
+    """
+
+    def __init__(self, sr, metabar_seconds, ratio=2.0, direction="accel", gamma=1.5,
+                 n_channels=1, frame_ms=40.0, tolerance_ms=10.0):
+        self.sr = sr
+        self.n_channels = n_channels
+        self.gamma = gamma
 
-        # Calculate position in the "spectrum" (0 to 1)
-        position = i / (n_layers - 1) if n_layers > 1 else 0.5
+        self.hop = max(2, int(sr * frame_ms / 1000) // 2)
+        self.frame_len = 2 * self.hop
+        self.tol = max(1, int(sr * tolerance_ms / 1000))
+        self.window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.frame_len) / self.frame_len)
+        self.search_len = 2 * self.tol + 1
+        self.n_fft = 1 << int(np.ceil(np.log2(self.search_len + 2 * self.frame_len)))
+
+        # Whole number of hops per metabar, so every cycle is identical
+        self.frames_per_metabar = max(1, int(round(metabar_seconds * sr / self.hop)))
+        self.metabar = self.frames_per_metabar * self.hop
 
-        # Bell curve amplitude based on position
-        # Center of the bell moves based on direction
         if direction == "accel":
-            # Bell moves from low rates to high rates
-            center = np.linspace(0, 1, n_samples)
+            self.layer1_rates = (1.0, ratio)
+            self.layer2_rates = (1.0 / ratio, 1.0)
         else:
-            # Bell moves from high rates to low rates
-            center = np.linspace(1, 0, n_samples)
-
-        # Gaussian envelope
-        sigma = 0.3
-        envelope = np.exp(-0.5 * ((position - center) / sigma) ** 2)
-
-        # Apply gamma
-        envelope = np.power(envelope, gamma)
-
-        # Trim/pad to match length
-        if len(stretched) > n_samples:
-            stretched = stretched[:n_samples]
-        elif len(stretched) < n_samples:
-            if audio.ndim == 2:
-                padding = np.zeros((n_samples - len(stretched), audio.shape[1]))
+            self.layer1_rates = (1.0, 1.0 / ratio)
+            self.layer2_rates = (ratio, 1.0)
+
+        # Delays drift monotonically within a metabar, so checking the
+        # endpoints of layer 2 and then layer 1 bounds the whole trajectory
+        drift2 = self._drift(self.layer2_rates)
+        drift1 = self._drift(self.layer1_rates)
+        min_delay = self.frame_len + self.tol + 1
+        self.layer2_start_delay = min_delay - min(0.0, drift2, drift2 + drift1)
+        max_delay = self.layer2_start_delay + max(0.0, drift2, drift2 + drift1)
+        self.min_latency = min_delay + self.hop
+        self.latency = int(np.ceil(max_delay)) + self.hop
+
+        # Input history long enough for the longest delay plus a frame search
+        self.history = int(np.ceil(max_delay)) + 2 * self.frame_len + 2 * self.tol
+
+        # Crossfade gains sum to at most 2 * 0.5**gamma (gamma < 1)
+        self.output_gain = 1.0 / max(1.0, 2 * 0.5 ** gamma)
+
+        self.reset()
+
+    def _drift(self, rates):
+        """Delay added over one metabar by a head stepping through `rates`."""
+        n = self.frames_per_metabar
+        advance = self.hop * (n * rates[0] + (rates[1] - rates[0]) * (n - 1) / 2)
+        return self.metabar - advance
+
+    def reset(self):
+        """Clear all buffers and restart at the top of a metabar."""
+        self.buffer = np.zeros((2 * self.history, self.n_channels))
+        self.base = -self.history   # absolute input index of buffer[0]
+        self.written = 0            # input samples received
+        self.frames = 0             # frames synthesized
+        self.ola = np.zeros((self.frame_len, self.n_channels))
+        # Output runs one hop behind so each emitted sample is fully overlapped
+        self.pending = [np.zeros((self.hop, self.n_channels))]
+        # Layer 1 enters as if it had been layer 2 for the previous metabar
+        layer1_delay = self.layer2_start_delay + self._drift(self.layer2_rates)
+        self.heads = [{"pos": -layer1_delay, "prev": None},
+                      {"pos": -self.layer2_start_delay, "prev": None}]
+
+    def _write(self, block):
+        n = len(block)
+        end = self.written + n - self.base
+        if end > len(self.buffer):
+            # Slide forward, dropping input older than any head can reach
+            drop = self.written - self.history - self.base
+            keep = len(self.buffer) - drop
+            self.buffer[:keep] = self.buffer[drop:]
+            self.buffer[keep:] = 0.0
+            self.base += drop
+            end -= drop
+            if end > len(self.buffer):
+                self.buffer = np.concatenate([self.buffer, np.zeros((end - len(self.buffer), self.n_channels))])
+        self.buffer[end - n:end] = block
+        self.written += n
+
+    def _guide(self, start, stop):
+        segment = self.buffer[start - self.base:stop - self.base]
+        return segment.mean(axis=1) if self.n_channels > 1 else segment[:, 0]
+
+    def _frame_start(self, head, nominal):
+        """Shift nominal (absolute) to best continue the head's previous frame."""
+        if head["prev"] is None:
+            return nominal
+        template = self._guide(head["prev"] + self.hop, head["prev"] + self.hop + self.frame_len)
+        lo = nominal - self.tol
+        region = self._guide(lo, lo + self.search_len + self.frame_len - 1)
+
+        corr = np.fft.irfft(
+            np.fft.rfft(region, self.n_fft) * np.conj(np.fft.rfft(template, self.n_fft)),
+            self.n_fft
+        )[:self.search_len]
+        energy = np.concatenate([[0.0], np.cumsum(region ** 2)])
+        norms = np.sqrt(np.maximum(
+            energy[self.frame_len:self.frame_len + self.search_len] - energy[:self.search_len], 0.0
+        ))
+        return lo + int(np.argmax(corr / np.maximum(norms, 1e-12)))
+
+    def _synthesize_hop(self):
+        """Add the next frame and return the hop of output it completes."""
+        cycle, offset = divmod(self.frames, self.frames_per_metabar)
+        if offset == 0 and self.frames > 0:
+            # Seam: the loud head becomes the fading-out layer
+            t = self.frames * self.hop
+            self.heads = [self.heads[1], {"pos": t - self.layer2_start_delay, "prev": None}]
+        phase = offset / self.frames_per_metabar
+
+        frame = np.zeros((self.frame_len, self.n_channels))
+        for i, head in enumerate(self.heads):
+            rates = self.layer1_rates if i == 0 else self.layer2_rates
+            linear = 1.0 - phase if i == 0 else phase
+            gain = np.power(linear, self.gamma)
+
+            start = self._frame_start(head, int(round(head["pos"])))
+            s = start - self.base
+            frame += self.buffer[s:s + self.frame_len] * gain
+            head["prev"] = start
+            head["pos"] += self.hop * (rates[0] + (rates[1] - rates[0]) * phase)
+
+        self.ola += frame * (self.window * self.output_gain)[:, np.newaxis]
+        done = self.ola[:self.hop].copy()
+        self.ola[:self.hop] = self.ola[self.hop:]
+        self.ola[self.hop:] = 0.0
+        self.frames += 1
+        return done
+
+    def process(self, block):
+        """
+        Process one input block (n_samples,) or (n_samples, n_channels) and
+        return an output block of the same shape.
+        """
+        block = np.asarray(block, dtype=np.float64)
+        is_mono = block.ndim == 1
+        self._write(block[:, np.newaxis] if is_mono else block)
+
+        # A frame may run once the input covering its output hop has arrived
+        while (self.frames + 1) * self.hop <= self.written:
+            self.pending.append(self._synthesize_hop())
+
+        out = np.concatenate(self.pending)
+        n = len(block)
+        self.pending = [out[n:]]
+        out = out[:n]
+        return out[:, 0] if is_mono else out
+
+
+class ArrayAudioDevice:
+    """
+    In-memory stand-in for an audio device.
+
+    read() hands out fixed-size input blocks (the last one zero-padded, then
+    `tail` samples of silence so delayed output can drain); write() collects
+    output, available as .output.
+    """
+
+    def __init__(self, audio, sr, block_size=512, tail=0):
+        audio = np.asarray(audio, dtype=np.float64)
+        self.is_mono = audio.ndim == 1
+        self.audio = audio[:, np.newaxis] if self.is_mono else audio
+        self.sr = sr
+        self.block_size = block_size
+        self.n_channels = self.audio.shape[1]
+        self.total = len(self.audio) + tail
+        self.position = 0
+        self.chunks = []
+
+    def read(self):
+        if self.position >= self.total:
+            return None
+        block = np.zeros((self.block_size, self.n_channels))
+        chunk = self.audio[self.position:self.position + self.block_size]
+        block[:len(chunk)] = chunk
+        self.position += self.block_size
+        return block[:, 0] if self.is_mono else block
+
+    def write(self, block):
+        self.chunks.append(block)
+
+    def close(self):
+        pass
+
+    @property
+    def output(self):
+        return np.concatenate(self.chunks) if self.chunks else np.zeros(0)
+
+
+class FileAudioDevice:
+    """
+    File-backed stand-in for an audio device: streams blocks from in_path
+    and writes processed blocks to out_path without loading either file.
+    """
+
+    def __init__(self, in_path, out_path, block_size=512, tail=0):
+        self.infile = sf.SoundFile(in_path)
+        self.sr = self.infile.samplerate
+        self.n_channels = self.infile.channels
+        self.block_size = block_size
+        self.tail = tail
+        self.outfile = sf.SoundFile(out_path, "w", samplerate=self.sr, channels=self.n_channels)
+
+    def read(self):
+        block = self.infile.read(self.block_size, always_2d=True)
+        if len(block) == 0:
+            if self.tail <= 0:
+                return None
+            self.tail -= self.block_size
+            block = np.zeros((self.block_size, self.n_channels))
+        elif len(block) < self.block_size:
+            block = np.concatenate([block, np.zeros((self.block_size - len(block), self.n_channels))])
+        return block
+
+    def write(self, block):
+        self.outfile.write(block)
+
+    def close(self):
+        self.infile.close()
+        self.outfile.close()
+
+
+def run_realtime(processor, device):
+    """
+    Drive a RealtimeRisset from a device stand-in, block by block.
+
+    Times every process() call against the block deadline
+    (block_size / sr) and returns the timing and latency figures. The
+    timing figures are None if no block was processed.
+    """
+    deadline = device.block_size / device.sr
+    times = []
+    try:
+        while True:
+            block = device.read()
+            if block is None:
+                break
+            t0 = time.perf_counter()
+            out = processor.process(block)
+            times.append(time.perf_counter() - t0)
+            device.write(out)
+    finally:
+        device.close()
+
+    stats = {
+        "blocks": len(times),
+        "block_size": device.block_size,
+        "deadline_ms": deadline * 1000,
+        "mean_ms": None,
+        "p99_ms": None,
+        "max_ms": None,
+        "overruns": 0,
+        "load": None,
+        "min_latency_ms": processor.min_latency / processor.sr * 1000,
+        "latency_ms": processor.latency / processor.sr * 1000,
+    }
+    if times:
+        times = np.array(times)
+        stats.update(
+            mean_ms=float(times.mean() * 1000),
+            p99_ms=float(np.percentile(times, 99) * 1000),
+            max_ms=float(times.max() * 1000),
+            overruns=int(np.sum(times > deadline)),
+            load=float(times.mean() / deadline),
+        )
+    return stats
+
+
+def make_draft(audio, sr, target_sr=DRAFT_SAMPLE_RATE, n_taps=63):
+    """
+    Downmix to mono and decimate by an integer factor for draft previews.
+
+    A windowed-sinc low-pass (cutoff at the new Nyquist) runs before
+    dropping samples, so the preview doesn't alias. Returns (audio, new_sr).
+    """
+    if audio.ndim == 2:
+        audio = audio.mean(axis=1)
+    audio = np.asarray(audio, dtype=np.float64)
+
+    factor = max(1, int(sr // target_sr))
+    if factor == 1:
+        return audio, sr
+
+    n = np.arange(n_taps) - (n_taps - 1) / 2
+    taps = np.sinc(n / factor) / factor * np.hamming(n_taps)
+    filtered = np.convolve(audio, taps, mode="same")
+    return filtered[::factor], sr // factor
+
+
+def draft_output_path(output):
+    """Preview path next to the real output: out.wav -> out.draft.wav"""
+    path = Path(output)
+    return str(path.with_name(f"{path.stem}.draft{path.suffix}"))
+
+
+def resolve_backend(backend, mode):
+    """Map "auto" to the default backend for a mode."""
+    if backend == "auto":
+        return "rubberband" if mode == "variable" else "librosa"
+    return backend
+
+
+def load_batch_jobs(source, defaults, out_dir=None):
+    """
+    Build the job list for --batch.
+
+    source is either a directory (every audio file in it, rendered with the
+    command-line settings into out_dir, default <dir>/risset) or a CSV
+    manifest with columns input,output,ratio,direction,mode,gamma. Empty or
+    missing manifest columns fall back to the command-line settings; relative
+    paths are relative to the manifest.
+    """
+    source = Path(source)
+    jobs = []
+
+    if source.is_dir():
+        out_dir = Path(out_dir) if out_dir else source / "risset"
+        for path in sorted(source.iterdir()):
+            if path.suffix.lower() in AUDIO_EXTENSIONS:
+                job = dict(defaults)
+                job["input"] = str(path)
+                job["output"] = str(out_dir / path.name)
+                jobs.append(job)
+        return jobs
+
+    base = source.parent
+    with open(source, newline="") as f:
+        for row in csv.DictReader(f):
+            row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+            if not row.get("input"):
+                continue
+            job = dict(defaults)
+            job.update({k: row[k] for k in BATCH_FIELDS if row.get(k)})
+
+            in_path = Path(job["input"])
+            if not in_path.is_absolute():
+                in_path = base / in_path
+            job["input"] = str(in_path)
+
+            if row.get("output"):
+                out_path = Path(row["output"])
+                if not out_path.is_absolute():
+                    out_path = (Path(out_dir) if out_dir else base) / out_path
             else:
-                padding = np.zeros(n_samples - len(stretched))
-            stretched = np.concatenate([stretched, padding])
+                out_path = (Path(out_dir) if out_dir else in_path.parent / "risset") / in_path.name
+            job["output"] = str(out_path)
+            jobs.append(job)
+    return jobs
+
+
+def _init_batch_worker(backends):
+    """Pay the heavy imports once per worker process, not once per job."""
+    if "librosa" in backends and HAS_LIBROSA:
+        librosa.effects.time_stretch  # librosa loads submodules lazily
+    if "rubberband" in backends and HAS_PYRUBBERBAND:
+        pyrb.timemap_stretch
+
+
+def run_batch_job(job):
+    """Render one batch job. Never raises; failures come back in the result."""
+    result = {"input": job["input"], "output": job["output"], "status": "ok",
+              "load_s": 0.0, "render_s": 0.0, "write_s": 0.0, "duration_s": 0.0, "error": ""}
+    t_start = time.perf_counter()
+    try:
+        if job["direction"] not in ("accel", "decel"):
+            raise ValueError(f"direction must be accel or decel (got {job['direction']!r})")
+
+        cache = None
+        if job.get("cache_dir"):
+            cache = StretchCache(job["cache_dir"], max_bytes=job["cache_size"] * 1024 * 1024)
+
+        t0 = time.perf_counter()
+        if cache is not None:
+            audio, sr = cache.load_audio(Path(job["input"]))
+        else:
+            audio, sr = sf.read(job["input"])
+        result["load_s"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        plan = plan_audio_risset(
+            audio, sr, mode=job["mode"], ratio=parse_ratio(str(job["ratio"])),
+            direction=job["direction"], gamma=float(job["gamma"]), n_layers=job["layers"],
+            backend=resolve_backend(job["backend"], job["mode"]), cache=cache
+        )
+        result["render_s"] = time.perf_counter() - t0
 
-        # Apply envelope
-        if stretched.ndim == 2:
-            envelope = envelope[:, np.newaxis]
+        # Mixing happens block by block inside the write
+        t0 = time.perf_counter()
+        Path(job["output"]).parent.mkdir(parents=True, exist_ok=True)
+        stats = write_mix(job["output"], plan, sr, cycles=int(job.get("cycles", 1)))
+        result["write_s"] = time.perf_counter() - t0
+        result["duration_s"] = stats["frames"] / sr
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = "".join(traceback.format_exception_only(type(e), e)).strip()
 
-        layers.append(stretched * envelope)
+    result["total_s"] = time.perf_counter() - t_start
+    return result
 
-    # Sum all layers
-    output = sum(layers)
 
-    # Normalize
-    max_val = np.max(np.abs(output))
-    if max_val > 0:
-        output = output / max_val * 0.95
+def run_batch(jobs, n_workers=None, summary_path=None):
+    """
+    Render jobs on a process pool and write a CSV summary.
 
-    return output
+    Returns the list of per-job results in job order.
+    """
+    backends = sorted({resolve_backend(j["backend"], j["mode"]) for j in jobs})
+    results = [None] * len(jobs)
+    t_start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_batch_worker,
+                             initargs=(backends,)) as pool:
+        futures = {pool.submit(run_batch_job, job): i for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            r = results[i]
+            mark = "✓" if r["status"] == "ok" else "✗"
+            detail = f"{r['total_s']:.2f}s" if r["status"] == "ok" else r["error"]
+            print(f"  {mark} {Path(r['input']).name} -> {r['output']} ({detail})")
+
+    wall = time.perf_counter() - t_start
+    n_failed = sum(1 for r in results if r["status"] != "ok")
+    print(f"\nBatch: {len(jobs) - n_failed}/{len(jobs)} succeeded in {wall:.2f}s "
+          f"(sum of job times {sum(r['total_s'] for r in results):.2f}s)")
+
+    if summary_path:
+        fields = ["input", "output", "status", "load_s", "render_s", "write_s",
+                  "total_s", "duration_s", "error"]
+        with open(summary_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for r in results:
+                writer.writerow({k: (f"{r[k]:.4f}" if isinstance(r[k], float) else r[k]) for k in fields})
+        print(f"Summary: {summary_path}")
+
+    return results
 
 
 def main():
@@ -355,17 +1595,50 @@ Examples:
 
     # Adjust crossfade curve
     python audio_risset.py input.wav output.wav --ratio 2 --direction accel --gamma 1.0
+
+    # Pure-NumPy WSOLA stretching (no librosa/rubberband, crisper drums)
+    python audio_risset.py drum_loop.wav output.wav --ratio 2 --direction accel --stretch-backend wsola
+
+    # Cache decoded input and stretched layers (gamma sweeps skip the stretch)
+    python audio_risset.py drum_loop.wav output.wav --ratio 2 --direction accel --cache-dir ~/.cache/risset
+
+    # Quick mono low-rate preview (writes output.draft.wav)
+    python audio_risset.py drum_loop.wav output.wav --ratio 3/2 --direction accel --gamma 1.0 --draft
+
+    # Preview first, then the full-quality render, with measured speed-up
+    python audio_risset.py drum_loop.wav output.wav --ratio 3/2 --direction accel --draft --full
+
+    # 30-minute loop bed: one metabar rendered, tiled seamlessly
+    python audio_risset.py drum_loop.wav bed.flac --ratio 2 --direction accel --cycles 450
+
+    # Multi-GB WAV/RF64 stems: memory-map input and (float32) output
+    python audio_risset.py stem_96k.wav out.wav --ratio 2 --direction accel --stretch-backend wsola --mmap
+
+    # Compressed output is streamed block by block (format from extension)
+    python audio_risset.py drum_loop.wav output.flac --ratio 2 --direction accel
+
+    # Real-time engine on a file-backed device stand-in (4 s metabar)
+    python audio_risset.py live_in.wav live_out.wav --ratio 2 --direction accel --realtime --metabar 4
+
+    # Batch: every audio file in stems/ into stems/risset/, 4 worker processes
+    python audio_risset.py --batch stems/ --ratio 2 --direction accel --jobs 4
+
+    # Batch from a CSV manifest (columns: input,output,ratio,direction,mode,gamma)
+    python audio_risset.py --batch jobs.csv --out-dir renders/
+
+    # Where does the time go? Per-stage wall/CPU time, samples and bytes
+    python audio_risset.py input.wav output.wav --ratio 2 --direction accel --profile
 """
     )
 
-    parser.add_argument("input", type=str, help="Input audio file")
-    parser.add_argument("output", type=str, help="Output audio file")
+    parser.add_argument("input", type=str, nargs="?", help="Input audio file")
+    parser.add_argument("output", type=str, nargs="?", help="Output audio file")
 
     parser.add_argument("--ratio", type=str, default="2",
                         help="Speed ratio (e.g., '2', '2/1', '3:2'). Default: 2")
-    parser.add_argument("--direction", type=str, required=True,
+    parser.add_argument("--direction", type=str, default=None,
                         choices=["accel", "decel"],
-                        help="Direction: accel or decel (REQUIRED)")
+                        help="Direction: accel or decel (REQUIRED, except per-row in a --batch manifest)")
     parser.add_argument("--mode", type=str, default="simple",
                         choices=["simple", "variable", "shepard"],
                         help="Processing mode (default: simple)")
@@ -373,19 +1646,128 @@ Examples:
                         help="Amplitude curve gamma (0.5=punch, 1.0=linear, 1.5=default, 3.0=gentle)")
     parser.add_argument("--layers", type=int, default=8,
                         help="Number of layers for shepard mode (default: 8)")
+    parser.add_argument("--stretch-backend", type=str, default="auto",
+                        choices=STRETCH_BACKENDS,
+                        help="Time-stretch backend (default: auto = librosa for simple/shepard, rubberband for variable)")
+    parser.add_argument("--cache-dir", type=str, default=None,
+                        help="Cache decoded input and stretched layers here (default: no cache)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE_MB,
+                        help=f"Cache size limit in MB, least-recently-used entries evicted (default: {DEFAULT_CACHE_SIZE_MB})")
+    parser.add_argument("--draft", action="store_true",
+                        help="Write a quick mono, low-rate, WSOLA preview to <output>.draft.<ext>")
+    parser.add_argument("--draft-rate", type=int, default=DRAFT_SAMPLE_RATE,
+                        help=f"Internal sample rate for --draft (default: {DRAFT_SAMPLE_RATE})")
+    parser.add_argument("--full", action="store_true",
+                        help="With --draft, also write the full-quality render to output")
+    parser.add_argument("--cycles", type=int, default=1,
+                        help="Repeat the metabar N times in the output, rendered once (default: 1)")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Memory-map WAV/RF64 input, and write .wav output as memory-mapped 32-bit float")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE,
+                        help=f"Samples mixed and written per block (default: {DEFAULT_BLOCK_SIZE})")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Run the block-based real-time engine over the input, streaming from file")
+    parser.add_argument("--metabar", type=float, default=None,
+                        help="Real-time metabar length in seconds (default: input duration)")
+    parser.add_argument("--realtime-block", type=int, default=REALTIME_BLOCK_SIZE,
+                        help=f"Real-time block size in samples (default: {REALTIME_BLOCK_SIZE})")
+    parser.add_argument("--batch", type=str, default=None,
+                        help="Render a directory of audio files or a CSV manifest instead of one input")
+    parser.add_argument("--out-dir", type=str, default=None,
+                        help="Batch output directory (default: <dir>/risset)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Batch worker processes (default: CPU count)")
+    parser.add_argument("--summary", type=str, default=None,
+                        help="Batch timing/failure summary CSV (default: <out-dir>/batch_summary.csv)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print per-stage wall/CPU time, sample counts and bytes written")
+    parser.add_argument("--profile-json", type=str, default=None,
+                        help="Write the per-stage profile as JSON to this file ('-' for stdout)")
 
     args = parser.parse_args()
 
-    # Check dependencies
-    if not HAS_LIBROSA:
-        print("Error: librosa required. Install with: pip install librosa")
-        return 1
+    if args.cycles < 1:
+        parser.error("--cycles must be at least 1")
+
+    if args.batch:
+        defaults = {"ratio": args.ratio, "direction": args.direction, "mode": args.mode,
+                    "gamma": args.gamma, "layers": args.layers, "backend": args.stretch_backend,
+                    "cache_dir": args.cache_dir, "cache_size": args.cache_size,
+                    "cycles": args.cycles}
+        jobs = load_batch_jobs(args.batch, defaults, out_dir=args.out_dir)
+        if not jobs:
+            print(f"Error: no jobs found in {args.batch}")
+            return 1
+
+        summary_path = args.summary
+        if summary_path is None:
+            if args.out_dir:
+                summary_dir = Path(args.out_dir)
+            elif Path(args.batch).is_dir():
+                summary_dir = Path(args.batch) / "risset"
+            else:
+                summary_dir = Path(args.batch).parent
+            summary_dir.mkdir(parents=True, exist_ok=True)
+            summary_path = str(summary_dir / "batch_summary.csv")
+
+        print(f"Batch: {len(jobs)} jobs from {args.batch}")
+        results = run_batch(jobs, n_workers=args.jobs, summary_path=summary_path)
+        return 0 if all(r["status"] == "ok" for r in results) else 1
+
+    if args.input is None or args.output is None:
+        parser.error("input and output are required (or use --batch)")
+    if args.direction is None:
+        parser.error("--direction is required")
+
+    if args.realtime:
+        if not Path(args.input).exists():
+            print(f"Error: Input file not found: {args.input}")
+            return 1
+        info = sf.info(args.input)
+        metabar = args.metabar if args.metabar else info.duration
+        processor = RealtimeRisset(
+            info.samplerate, metabar, ratio=parse_ratio(args.ratio), direction=args.direction,
+            gamma=args.gamma, n_channels=info.channels
+        )
+        # Run past the end of the input so the delayed tail drains
+        device = FileAudioDevice(args.input, args.output, block_size=args.realtime_block,
+                                 tail=processor.latency)
+        stats = run_realtime(processor, device)
+
+        print(f"Real-time: {args.input} -> {args.output}")
+        print(f"Metabar: {processor.metabar / processor.sr:.3f}s")
+        print(f"Latency: {stats['min_latency_ms']:.1f}-{stats['latency_ms']:.1f} ms")
+        print(f"Blocks: {stats['blocks']} x {stats['block_size']} samples "
+              f"(deadline {stats['deadline_ms']:.2f} ms)")
+        if stats["blocks"]:
+            print(f"Block time: mean {stats['mean_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms, "
+                  f"max {stats['max_ms']:.3f} ms ({stats['load'] * 100:.1f}% load, "
+                  f"{stats['overruns']} overruns)")
+        return 0
+
+    # Full-quality render runs unless this is a draft-only preview
+    render_full = args.full or not args.draft
 
-    if args.mode == "variable" and not HAS_PYRUBBERBAND:
-        print("Error: pyrubberband required for variable mode.")
-        print("Install with: pip install pyrubberband")
-        print("Also requires rubberband library: brew install rubberband")
-        return 1
+    # Check dependencies
+    backend = resolve_backend(args.stretch_backend, args.mode)
+
+    # Draft previews always use wsola, so only the full render needs these
+    if render_full:
+        if backend == "librosa" and args.mode == "variable":
+            print("Error: librosa backend has no variable-rate mode. Use rubberband or wsola.")
+            return 1
+
+        if backend == "librosa" and not HAS_LIBROSA:
+            print("Error: librosa required. Install with: pip install librosa")
+            print("Or use --stretch-backend wsola (no extra dependencies)")
+            return 1
+
+        if backend == "rubberband" and not HAS_PYRUBBERBAND:
+            print(f"Error: pyrubberband required for {'variable mode' if args.mode == 'variable' else 'the rubberband backend'}.")
+            print("Install with: pip install pyrubberband")
+            print("Also requires rubberband library: brew install rubberband")
+            print("Or use --stretch-backend wsola (no extra dependencies)")
+            return 1
 
     # Load audio
     input_path = Path(args.input)
@@ -393,8 +1775,21 @@ Examples:
         print(f"Error: Input file not found: {args.input}")
         return 1
 
+    cache = None
+    if args.cache_dir:
+        cache = StretchCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+
+    profiler = StageProfiler() if args.profile or args.profile_json else NULL_PROFILER
+
     print(f"Loading: {args.input}")
-    audio, sr = sf.read(args.input)
+    with profiler.stage("load") as counters:
+        if cache is not None:
+            audio, sr = cache.load_audio(input_path, mapped=args.mmap)
+        elif args.mmap:
+            audio, sr = load_audio_mapped(input_path)
+        else:
+            audio, sr = sf.read(args.input)
+        counters["samples"] = len(audio)
 
     # Parse ratio
     ratio = parse_ratio(args.ratio)
@@ -402,29 +1797,59 @@ Examples:
     print(f"Direction: {args.direction}")
     print(f"Mode: {args.mode}")
     print(f"Gamma: {args.gamma}")
-
-    # Generate
-    if args.mode == "simple":
-        output = generate_audio_risset_simple(
-            audio, sr, ratio=ratio, direction=args.direction, gamma=args.gamma
-        )
-    elif args.mode == "variable":
-        output = generate_audio_risset_variable(
-            audio, sr, ratio=ratio, direction=args.direction, gamma=args.gamma
-        )
-    elif args.mode == "shepard":
-        output = generate_audio_risset_shepard(
-            audio, sr, ratio=ratio, direction=args.direction,
-            gamma=args.gamma, n_layers=args.layers
-        )
-
-    # Write output
-    sf.write(args.output, output, sr)
-
-    duration = len(output) / sr
-    print(f"Generated: {args.output}")
-    print(f"Duration: {duration:.3f}s")
-    print(f"Sample rate: {sr} Hz")
+    print(f"Stretch backend: {backend if render_full else 'wsola (draft)'}")
+
+    params = dict(mode=args.mode, ratio=ratio, direction=args.direction,
+                  gamma=args.gamma, n_layers=args.layers, cache=cache)
+
+    # Draft preview: mono, decimated, cheapest backend
+    if args.draft:
+        t0 = time.perf_counter()
+        with profiler.stage("draft") as counters:
+            draft_audio, draft_sr = make_draft(audio, sr, target_sr=args.draft_rate)
+            draft_plan = plan_audio_risset(draft_audio, draft_sr, backend="wsola", **params)
+            draft_path = draft_output_path(args.output)
+            write_mix(draft_path, draft_plan, draft_sr, cycles=args.cycles)
+            counters["samples"] = draft_plan["n_samples"] * args.cycles
+            counters["bytes"] = os.path.getsize(draft_path)
+        draft_time = time.perf_counter() - t0
+
+        print(f"Draft: {draft_path} ({draft_sr} Hz mono, {draft_time:.2f}s)")
+        if not render_full:
+            # Only a sample count: short inputs are dominated by fixed costs
+            channels = audio.shape[1] if audio.ndim == 2 else 1
+            reduction = (sr * channels) / draft_sr
+            print(f"Draft processes ~{reduction:.1f}x fewer samples (speed-up not measured; "
+                  f"add --full to time both)")
+            print("Full render: re-run without --draft, or add --full")
+
+    if render_full:
+        # Generate
+        t0 = time.perf_counter()
+        plan = plan_audio_risset(audio, sr, backend=backend, profiler=profiler, **params)
+
+        # Mix and write block by block (gain from the peak-envelope pre-scan)
+        mmap_output = args.mmap and Path(args.output).suffix.lower() == ".wav"
+        stats = write_mix(args.output, plan, sr, block_size=args.block_size, cycles=args.cycles,
+                          mmap=mmap_output, profiler=profiler)
+        full_time = time.perf_counter() - t0
+
+        duration = stats["frames"] / sr
+        print(f"Generated: {args.output}")
+        print(f"Duration: {duration:.3f}s")
+        if args.cycles > 1:
+            print(f"Cycles: {args.cycles} x {plan['n_samples'] / sr:.3f}s")
+        print(f"Sample rate: {sr} Hz")
+        print(f"Peak: {20 * np.log10(max(stats['peak'], 1e-12)):.2f} dBFS (gain {stats['gain']:.3f})")
+        if args.draft:
+            print(f"Draft speed-up: {full_time / max(draft_time, 1e-9):.1f}x ({draft_time:.2f}s vs {full_time:.2f}s)")
+        if cache is not None:
+            print(f"Cache: {cache.hits} hits, {cache.misses} misses ({cache.cache_dir})")
+
+    if args.profile:
+        profiler.report()
+    if args.profile_json:
+        profiler.write_json(args.profile_json)
 
     return 0
 
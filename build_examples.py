@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Build every example asset with one command, rebuilding only what's stale.
+
+Artifacts (example MIDI, the tempo table, LilyPond notation, piano-roll
+PNGs) are nodes in a dependency graph. Each node's key is a hash of its
+parameters, the source files that generate it and the content of its
+input artifacts; a node is rebuilt when its key changes or its outputs
+are missing or were edited. Keys and output hashes are kept in
+.build_manifest.json. Stale nodes run in parallel, one dependency level
+at a time. Because inputs are hashed by content, a MIDI file that
+rebuilds to the same bytes doesn't trigger its piano rolls.
+
+    python build_examples.py            # build what's stale
+    python build_examples.py --dry-run  # list what would be built
+    python build_examples.py --force    # rebuild everything
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MANIFEST = os.path.join(ROOT, ".build_manifest.json")
+
+RATIOS = [
+    (2, 1), (3, 1), (3, 2), (4, 3), (5, 3),
+    (5, 4), (6, 5), (7, 4), (7, 5), (8, 5)
+]
+DIRECTIONS = ["accel", "decel"]
+BPM = 120
+EXAMPLE_MEASURES = 8   # Arc mode: 2 metabars
+NOTATION_MEASURES = 4  # Ramp mode: single metabar for cleaner notation
+
+# Piano rolls shown in the README: (ratio, direction, arc or ramp)
+PIANO_ROLLS = [
+    ((2, 1), "accel", "ramp"),
+    ((3, 2), "accel", "arc"),
+    ((3, 2), "accel", "ramp"),
+    ((5, 4), "decel", "arc"),
+    ((5, 4), "decel", "ramp"),
+]
+
+GENERATOR_SOURCES = ["risset.py", "profiling.py", "notation_quantize.py"]
+PIANO_ROLL_SOURCES = ["visualization/generate_piano_roll.py", "midi_notes.py"]
+
+
+def example_name(ratio, direction, measures=EXAMPLE_MEASURES):
+    """File stem of an example MIDI, e.g. risset_120bpm_2-1_accel_8m."""
+    return f"risset_{BPM}bpm_{ratio[0]}-{ratio[1]}_{direction}_{measures}m"
+
+
+def build_graph():
+    """
+    Every artifact node, in dependency order.
+
+    A node is a dict: name, builder (key into BUILDERS), params, sources
+    (files whose contents decide the output), inputs (names of nodes it
+    reads) and outputs (paths relative to the repo root).
+    """
+    nodes = []
+    for ratio in RATIOS:
+        for direction in DIRECTIONS:
+            stem = example_name(ratio, direction)
+            nodes.append({
+                "name": f"midi/{stem}",
+                "builder": "midi",
+                "params": {"ratio": ratio, "direction": direction, "measures": EXAMPLE_MEASURES, "bpm": BPM},
+                "sources": GENERATOR_SOURCES,
+                "inputs": [],
+                "outputs": [f"examples/midi/{stem}.mid"],
+            })
+
+    nodes.append({
+        "name": "tempo_table",
+        "builder": "tempo_table",
+        "params": {"ratios": RATIOS, "directions": DIRECTIONS, "bpm": BPM},
+        "sources": ["build_examples.py"],
+        "inputs": [],
+        "outputs": ["examples/tempo_table.csv"],
+    })
+
+    for direction in DIRECTIONS:
+        for ratio in RATIOS:
+            stem = f"risset_{ratio[0]}-{ratio[1]}_{direction}"
+            nodes.append({
+                "name": f"notation/{stem}",
+                "builder": "notation",
+                "params": {"ratio": ratio, "direction": direction, "measures": NOTATION_MEASURES, "bpm": BPM},
+                "sources": GENERATOR_SOURCES,
+                "inputs": [],
+                "outputs": [f"visualization/notation/{stem}.mid", f"visualization/notation/{stem}.ly"],
+            })
+
+    for ratio, direction, mode in PIANO_ROLLS:
+        stem = example_name(ratio, direction)
+        nodes.append({
+            "name": f"piano_roll/{stem}_{mode}",
+            "builder": "piano_roll",
+            "params": {"ratio": ratio, "direction": direction, "mode": mode},
+            "sources": PIANO_ROLL_SOURCES,
+            "inputs": [f"midi/{stem}"],
+            "outputs": [f"visualization/piano_rolls/{stem}_{mode}.png"],
+        })
+
+    return nodes
+
+
+def build_midi(params, outputs, inputs):
+    """An arc-mode example MIDI file."""
+    import risset
+    ratio_num, ratio_den = params["ratio"]
+    risset.generate_risset_rhythm(
+        bpm=params["bpm"], num_measures=params["measures"], ratio_num=ratio_num, ratio_den=ratio_den,
+        direction=params["direction"], output_file=outputs[0]
+    )
+
+
+def build_tempo_table(params, outputs, inputs):
+    """CSV of each layer's start and end tempo for every example."""
+    def fmt(value):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+
+    bpm = params["bpm"]
+    lines = ["Ratio,Direction,Bottom (C3) Start,Bottom (C3) End,Top (E3) Start,Top (E3) End"]
+    for ratio_num, ratio_den in params["ratios"]:
+        ratio_value = ratio_num / ratio_den
+        for direction in params["directions"]:
+            if direction == "accel":
+                tempos = (bpm, bpm * ratio_value, bpm / ratio_value, bpm)
+            else:
+                tempos = (bpm, bpm / ratio_value, bpm * ratio_value, bpm)
+            lines.append(f"{ratio_num}:{ratio_den},{direction.capitalize()},"
+                         + ",".join(fmt(t) for t in tempos))
+    with open(outputs[0], "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def build_notation(params, outputs, inputs):
+    """Ramp-mode MIDI and its LilyPond notation."""
+    import risset
+    ratio_num, ratio_den = params["ratio"]
+    # Accel examples are named fast:slow but entered slow:fast
+    if params["direction"] == "accel":
+        ratio_num, ratio_den = ratio_den, ratio_num
+    midi_path, ly_path = outputs
+    result = risset.generate_risset_rhythm(
+        bpm=params["bpm"], num_measures=params["measures"], ratio_num=ratio_num, ratio_den=ratio_den,
+        direction=params["direction"], output_file=midi_path, ramp=True
+    )
+    risset.generate_lilypond(
+        layer1_times=result["layer1_times"],
+        layer2_times=result["layer2_times"],
+        metabar_beats=result["metabar_beats"],
+        time_sig_num=4,
+        time_sig_den=4,
+        bpm=params["bpm"],
+        ratio_num=ratio_num,
+        ratio_den=ratio_den,
+        direction=params["direction"],
+        output_file=ly_path,
+        ramp=True
+    )
+
+
+def build_piano_roll(params, outputs, inputs):
+    """Piano roll of an example MIDI: the whole arc, or its first metabar."""
+    sys.path.insert(0, os.path.join(ROOT, "visualization"))
+    from generate_piano_roll import generate_piano_roll
+    ratio_num, ratio_den = params["ratio"]
+    max_beats = 16 if params["mode"] == "ramp" else None
+    if not generate_piano_roll(inputs[0], outputs[0], ratio_num, ratio_den, params["direction"],
+                               max_beats=max_beats):
+        raise RuntimeError(f"No notes to draw in {inputs[0]}")
+
+
+BUILDERS = {
+    "midi": build_midi,
+    "tempo_table": build_tempo_table,
+    "notation": build_notation,
+    "piano_roll": build_piano_roll,
+}
+
+
+def file_digest(path):
+    """sha256 of a file's contents, or None if it doesn't exist."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def node_key(node, source_digests, input_digests):
+    """Content hash of everything that decides a node's outputs."""
+    payload = json.dumps({
+        "builder": node["builder"],
+        "params": node["params"],
+        "sources": [source_digests[path] for path in node["sources"]],
+        "inputs": input_digests,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def run_node(node):
+    """Build one node in this process; returns (name, seconds)."""
+    t0 = time.perf_counter()
+    outputs = [os.path.join(ROOT, path) for path in node["outputs"]]
+    for path in outputs:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    inputs = [os.path.join(ROOT, path) for path in node["input_paths"]]
+    with contextlib.redirect_stdout(io.StringIO()):
+        BUILDERS[node["builder"]](node["params"], outputs, inputs)
+    return node["name"], time.perf_counter() - t0
+
+
+def dependency_levels(nodes):
+    """Nodes grouped so each group only reads from earlier groups."""
+    level = {}
+    for node in nodes:
+        level[node["name"]] = 1 + max((level[name] for name in node["inputs"]), default=-1)
+    groups = [[] for _ in range(max(level.values(), default=-1) + 1)]
+    for node in nodes:
+        groups[level[node["name"]]].append(node)
+    return groups
+
+
+def load_manifest(path):
+    """Recorded keys and output hashes by node name ({} if there is none)."""
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(path, manifest):
+    """Write the manifest atomically."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def build(nodes, n_workers=None, force=False, dry_run=False, manifest_path=MANIFEST):
+    """
+    Bring every node up to date.
+
+    Returns (names of nodes built, or that would be built with dry_run,
+    seconds spent building each).
+    """
+    manifest = load_manifest(manifest_path)
+    by_name = {node["name"]: node for node in nodes}
+    source_digests = {path: file_digest(os.path.join(ROOT, path))
+                      for path in {path for node in nodes for path in node["sources"]}}
+    # Output hashes of nodes already checked this run
+    output_digests = {}
+
+    built, timings = [], {}
+    pool = None
+    try:
+        for group in dependency_levels(nodes):
+            stale = []
+            for node in group:
+                input_digests = [output_digests[name] for name in node["inputs"]]
+                key = node_key(node, source_digests, input_digests)
+                current = {path: file_digest(os.path.join(ROOT, path)) for path in node["outputs"]}
+                recorded = manifest.get(node["name"], {})
+                if (force or recorded.get("key") != key or recorded.get("outputs") != current
+                        or None in current.values()):
+                    stale.append(dict(node, key=key, input_paths=[
+                        path for name in node["inputs"] for path in by_name[name]["outputs"]]))
+                else:
+                    output_digests[node["name"]] = current
+
+            if dry_run:
+                built += [node["name"] for node in stale]
+                # Assume rebuilt inputs change, so dependents count as stale too
+                for node in stale:
+                    output_digests[node["name"]] = {"stale": node["key"]}
+                continue
+
+            if stale:
+                if n_workers == 1 or len(stale) == 1:
+                    finished = map(run_node, stale)
+                else:
+                    if pool is None:
+                        pool = ProcessPoolExecutor(max_workers=n_workers)
+                    finished = pool.map(run_node, stale)
+                for name, seconds in finished:
+                    timings[name] = seconds
+
+            for node in stale:
+                outputs = {path: file_digest(os.path.join(ROOT, path)) for path in node["outputs"]}
+                manifest[node["name"]] = {"key": node["key"], "outputs": outputs}
+                output_digests[node["name"]] = outputs
+                built.append(node["name"])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if not dry_run:
+            save_manifest(manifest_path, manifest)
+
+    return built, timings
+
+
+def main():
+    """Build the example assets."""
+    parser = argparse.ArgumentParser(description="Build example MIDI, tempo table, notation and piano rolls")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Worker processes (default: CPU count; 1 = no pool)")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild everything")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="List stale artifacts without building them")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    nodes = build_graph()
+    built, timings = build(nodes, n_workers=args.jobs, force=args.force, dry_run=args.dry_run)
+    elapsed = time.perf_counter() - t0
+
+    for name in built:
+        seconds = f" ({timings[name]:.2f}s)" if name in timings else ""
+        print(f"{'Stale' if args.dry_run else 'Built'}: {name}{seconds}")
+    verb = "stale" if args.dry_run else "rebuilt"
+    print(f"\n{len(nodes)} artifacts: {len(built)} {verb}, {len(nodes) - len(built)} up to date "
+          f"({elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
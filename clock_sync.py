@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Play a Risset rhythm in sync with an external MIDI clock.
+
+MIDI clock sends 24 ticks per quarter note. Tick arrival times are noisy
+(interface buffering, USB polling, the sender's own scheduling), so the
+clock's tempo and phase are estimated with a Kalman filter over the tick
+times: the state is the time of the current tick and the tick period,
+measurements are arrival times, and tempo changes are modelled as a
+random walk of the period. The filter's steady state is a second-order
+PLL whose loop gain is set by the jitter and drift it is told to expect.
+
+ClockFollower consumes clock/start/stop/continue/songpos messages and,
+on each tick, schedules the notes of a RissetStream (queried in beats)
+that fall within the next few ticks, converting beats to times with the
+current estimate. simulate_clock() generates a jittery clock with an
+optional tempo ramp to test against; the report compares each scheduled
+onset with where the jitter-free clock put that beat.
+"""
+
+import argparse
+import heapq
+import sys
+import time
+
+import numpy as np
+
+from risset_stream import RissetStream
+
+try:
+    import mido
+    HAS_MIDO = True
+except ImportError:
+    HAS_MIDO = False
+
+PPQN = 24  # MIDI clock ticks per quarter note
+
+
+class ClockEstimator:
+    """
+    Kalman filter over MIDI clock tick arrival times.
+
+    jitter_s: standard deviation of a tick's arrival time around the true
+      tick (measurement noise).
+    drift_s: standard deviation of the tick period's change per tick
+      (process noise); larger follows tempo changes faster but passes
+      more jitter through.
+    """
+
+    def __init__(self, bpm=120.0, jitter_s=0.001, drift_s=2e-6):
+        self.initial_period = 60.0 / (bpm * PPQN)
+        self.R = jitter_s ** 2
+        self.Q = np.diag([1e-10, drift_s ** 2])
+        self.x = None  # [time of current tick, tick period]
+        self.P = None
+        self.period = self.initial_period
+
+    def restart(self):
+        """Forget the phase (after stop/start) but keep the tempo estimate."""
+        self.x = None
+
+    def tick(self, t):
+        """Update with the arrival time of the next tick."""
+        if self.x is None:
+            self.x = np.array([t, self.period])
+            self.P = np.diag([self.R, (0.1 * self.period) ** 2])
+            return
+        F = np.array([[1.0, 1.0], [0.0, 1.0]])
+        x = F @ self.x
+        P = F @ self.P @ F.T + self.Q
+
+        S = P[0, 0] + self.R
+        K = P[:, 0] / S
+        self.x = x + K * (t - x[0])
+        self.P = P - np.outer(K, P[0, :])
+        self.period = self.x[1]
+
+    def time_of(self, ticks_ahead):
+        """Estimated time of the tick ticks_ahead after the current one."""
+        return self.x[0] + ticks_ahead * self.x[1]
+
+    @property
+    def bpm(self):
+        """Current tempo estimate."""
+        return 60.0 / (self.period * PPQN)
+
+
+class RawEstimator:
+    """Unfiltered baseline: phase from the last tick, period from the last interval."""
+
+    def __init__(self, bpm=120.0):
+        self.period = 60.0 / (bpm * PPQN)
+        self.last = None
+
+    def restart(self):
+        """Forget the phase but keep the tempo estimate."""
+        self.last = None
+
+    def tick(self, t):
+        """Update with the arrival time of the next tick."""
+        if self.last is not None:
+            self.period = t - self.last
+        self.last = t
+
+    def time_of(self, ticks_ahead):
+        """Estimated time of the tick ticks_ahead after the current one."""
+        return self.last + ticks_ahead * self.period
+
+    @property
+    def bpm(self):
+        """Current tempo estimate."""
+        return 60.0 / (self.period * PPQN)
+
+
+class ClockFollower:
+    """
+    Schedule a RissetStream's notes against an incoming MIDI clock.
+
+    handle() takes each transport message as it arrives and returns the
+    notes newly scheduled by it (a RissetStream.query() dict plus "time"
+    and "end_time" in seconds); each note is scheduled exactly once,
+    lookahead_ticks before its beat.
+    """
+
+    def __init__(self, stream, estimator, lookahead_ticks=2):
+        self.stream = stream
+        self.estimator = estimator
+        self.lookahead_ticks = lookahead_ticks
+        self.running = False
+        self.tick_index = -1  # Ticks since song position 0 of the current tick
+        self.scheduled_until = 0  # Ticks: notes before this are already scheduled
+
+    def handle(self, message_type, t, song_position=None):
+        """Process one message received at time t (seconds)."""
+        if message_type == "start":
+            self.running = True
+            self.tick_index = -1
+            self.scheduled_until = 0
+            self.estimator.restart()
+        elif message_type == "continue":
+            self.running = True
+            self.estimator.restart()
+        elif message_type == "stop":
+            self.running = False
+        elif message_type == "songpos":
+            # Song position counts 16th notes: 6 ticks each
+            self.tick_index = song_position * 6 - 1
+            self.scheduled_until = song_position * 6
+        elif message_type == "clock" and self.running:
+            self.tick_index += 1
+            self.estimator.tick(t)
+            return self._schedule()
+        return None
+
+    def _schedule(self):
+        """Notes from scheduled_until up to lookahead_ticks past the current tick."""
+        until = self.tick_index + self.lookahead_ticks
+        if until <= self.scheduled_until:
+            return None
+        notes = self.stream.query(self.scheduled_until / PPQN, until / PPQN)
+        self.scheduled_until = until
+
+        # Beats → ticks ahead of the current tick → seconds
+        ticks_ahead = notes["start"] * PPQN - self.tick_index
+        notes["time"] = self.estimator.time_of(ticks_ahead)
+        notes["end_time"] = self.estimator.time_of(ticks_ahead + notes["duration"] * PPQN)
+        return notes
+
+
+def simulate_clock(bpm=120.0, end_bpm=None, n_beats=256, jitter_ms=2.0, start_time=0.5, seed=0):
+    """
+    A MIDI clock: start, n_beats × 24 ticks, stop.
+
+    The tempo ramps linearly from bpm to end_bpm (default: steady) and
+    every tick arrives with Gaussian jitter of jitter_ms. Returns
+    (messages, true_tick_times): messages are (type, arrival time) in
+    arrival order; true_tick_times are the jitter-free tick times.
+    """
+    rng = np.random.default_rng(seed)
+    end_bpm = bpm if end_bpm is None else end_bpm
+    n_ticks = n_beats * PPQN
+    tempo = np.linspace(bpm, end_bpm, n_ticks)
+    periods = 60.0 / (tempo * PPQN)
+    true_times = start_time + np.concatenate([[0.0], np.cumsum(periods[:-1])])
+
+    # Jitter can't reorder ticks or put one before the start message
+    arrivals = true_times + rng.normal(0.0, jitter_ms / 1000.0, n_ticks)
+    arrivals = np.maximum.accumulate(np.maximum(arrivals, start_time))
+
+    messages = [("start", start_time)]
+    messages += [("clock", t) for t in arrivals.tolist()]
+    messages.append(("stop", float(arrivals[-1] + periods[-1])))
+    return messages, true_times
+
+
+def run_simulation(stream, messages, true_tick_times, estimator, lookahead_ticks=2):
+    """
+    Feed a simulated clock through a ClockFollower.
+
+    Returns a dict: "errors" (scheduled minus true onset time, seconds,
+    one per note played before the stop), "notes" (the number played)
+    and "bpm" (the estimate after each tick).
+    """
+    follower = ClockFollower(stream, estimator, lookahead_ticks)
+    scheduled = []
+    bpm = []
+    for message_type, t in messages:
+        notes = follower.handle(message_type, t)
+        if message_type == "clock":
+            bpm.append(estimator.bpm)
+        if notes is not None and len(notes["start"]):
+            scheduled.append(notes)
+
+    if not scheduled:
+        return {"errors": np.zeros(0), "notes": 0, "bpm": np.array(bpm)}
+    beats = np.concatenate([notes["start"] for notes in scheduled])
+    times = np.concatenate([notes["time"] for notes in scheduled])
+
+    # Notes scheduled past the last tick are cancelled by the stop
+    ticks = np.arange(len(true_tick_times))
+    played = beats * PPQN <= ticks[-1]
+    beats, times = beats[played], times[played]
+
+    # Where the jitter-free clock put each beat
+    true_times = np.interp(beats * PPQN, ticks, true_tick_times)
+    return {"errors": times - true_times, "notes": len(beats), "bpm": np.array(bpm)}
+
+
+def phase_error_stats(errors):
+    """Mean, RMS, 95th-percentile and max absolute phase error in milliseconds."""
+    if len(errors) == 0:
+        return {"mean_ms": 0.0, "rms_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    ms = np.asarray(errors) * 1000.0
+    return {
+        "mean_ms": float(np.mean(ms)),
+        "rms_ms": float(np.sqrt(np.mean(ms * ms))),
+        "p95_ms": float(np.percentile(np.abs(ms), 95)),
+        "max_ms": float(np.max(np.abs(ms))),
+    }
+
+
+def run_live(stream, estimator, input_port, output_port, channel=0, lookahead_ticks=2):
+    """Follow clock from input_port and play the stream to output_port until Ctrl-C."""
+    follower = ClockFollower(stream, estimator, lookahead_ticks)
+    queue = []  # (time, order, message): note-offs sort before note-ons at equal times
+    order = 0
+    with mido.open_input(input_port) as inport, mido.open_output(output_port) as outport:
+        try:
+            while True:
+                for message in inport.iter_pending():
+                    now = time.perf_counter()
+                    if message.type == "stop":
+                        # Drop pending note-ons, release everything now
+                        for _, _, pending in sorted(queue):
+                            if pending.type == "note_off":
+                                outport.send(pending)
+                        queue = []
+                    notes = follower.handle(message.type, now, getattr(message, "pos", None))
+                    if notes is None:
+                        continue
+                    for t, end, pitch, velocity in zip(notes["time"].tolist(), notes["end_time"].tolist(),
+                                                       notes["pitch"].tolist(), notes["velocity"].tolist()):
+                        heapq.heappush(queue, (end, order, mido.Message(
+                            "note_off", channel=channel, note=pitch)))
+                        heapq.heappush(queue, (t, order + 1, mido.Message(
+                            "note_on", channel=channel, note=pitch, velocity=velocity)))
+                        order += 2
+
+                now = time.perf_counter()
+                while queue and queue[0][0] <= now:
+                    outport.send(heapq.heappop(queue)[2])
+                time.sleep(0.0005)
+        except KeyboardInterrupt:
+            outport.reset()
+
+
+def main():
+    """Simulate or run external clock sync."""
+    parser = argparse.ArgumentParser(description="Play a Risset rhythm synced to external MIDI clock")
+    parser.add_argument("--ratio", type=str, default=None,
+                        help="Speed ratio (default: 1/2 for accel, 2/1 for decel)")
+    parser.add_argument("--direction", type=str, default="accel", choices=["accel", "decel"],
+                        help="Direction (default: accel)")
+    parser.add_argument("--measures", type=int, default=8,
+                        help="Length of one loop in measures (default: 8)")
+    parser.add_argument("--time-sig", type=str, default="4/4",
+                        help="Time signature (default: 4/4)")
+    parser.add_argument("--ramp", action="store_true",
+                        help="Ramp mode (default: arc)")
+    parser.add_argument("--pitch-low", type=int, default=60,
+                        help="MIDI note for layer 1 (default: 60)")
+    parser.add_argument("--pitch-high", type=int, default=64,
+                        help="MIDI note for layer 2 (default: 64)")
+    parser.add_argument("--velocity-curve", type=float, default=1.5,
+                        help="Velocity curve gamma (default: 1.5)")
+    parser.add_argument("--lookahead", type=int, default=2,
+                        help="Schedule notes this many clock ticks ahead (default: 2)")
+    parser.add_argument("--jitter-model-ms", type=float, default=1.0,
+                        help="Tick jitter the estimator expects, in ms (default: 1.0)")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Follow a simulated jittery clock and report phase error")
+    parser.add_argument("--bpm", type=float, default=120.0,
+                        help="Simulated clock tempo, or the initial guess when live (default: 120)")
+    parser.add_argument("--end-bpm", type=float, default=None,
+                        help="Simulated tempo at the end (default: steady)")
+    parser.add_argument("--beats", type=int, default=256,
+                        help="Simulated clock length in beats (default: 256)")
+    parser.add_argument("--jitter-ms", type=float, default=2.0,
+                        help="Simulated tick jitter, standard deviation in ms (default: 2.0)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Simulation random seed (default: 0)")
+    parser.add_argument("--input-port", type=str, default=None,
+                        help="MIDI input port receiving clock (live mode)")
+    parser.add_argument("--output-port", type=str, default=None,
+                        help="MIDI output port for the notes (live mode)")
+    parser.add_argument("--channel", type=int, default=1,
+                        help="Output MIDI channel, 1-16 (default: 1)")
+    parser.add_argument("--list-ports", action="store_true",
+                        help="List MIDI ports and exit")
+    args = parser.parse_args()
+
+    # Parse time signature
+    time_parts = args.time_sig.split("/")
+    if len(time_parts) != 2 or not all(part.isdigit() and int(part) > 0 for part in time_parts):
+        print("Error: time signature must be num/den (e.g., 4/4)")
+        return 1
+    time_sig_num = int(time_parts[0])
+    time_sig_den = int(time_parts[1])
+
+    # Parse ratio (the default agrees with the direction, so needs no flip)
+    if args.ratio is None:
+        args.ratio = "1/2" if args.direction == "accel" else "2/1"
+    ratio_parts = args.ratio.split("/")
+    if len(ratio_parts) != 2 or not all(part.isdigit() and int(part) > 0 for part in ratio_parts):
+        print("Error: ratio must be num/den (e.g., 2/1)")
+        return 1
+    ratio_num = int(ratio_parts[0])
+    ratio_den = int(ratio_parts[1])
+
+    # Auto-flip a ratio that contradicts the direction, as risset.py does
+    ratio_value = ratio_num / ratio_den
+    if args.direction == "accel" and ratio_value > 1:
+        print(f"Warning: {ratio_num}/{ratio_den} with 'accel' is contradictory.")
+        print(f"  '{ratio_num}/{ratio_den}' suggests {ratio_num} slowing to {ratio_den}, not accelerating.")
+        print(f"  Auto-flipping to {ratio_den}/{ratio_num} for acceleration ({ratio_den} → {ratio_num}).")
+        ratio_num, ratio_den = ratio_den, ratio_num
+    elif args.direction == "decel" and ratio_value < 1:
+        print(f"Warning: {ratio_num}/{ratio_den} with 'decel' is contradictory.")
+        print(f"  '{ratio_num}/{ratio_den}' suggests {ratio_num} speeding to {ratio_den}, not decelerating.")
+        print(f"  Auto-flipping to {ratio_den}/{ratio_num} for deceleration ({ratio_den} → {ratio_num}).")
+        ratio_num, ratio_den = ratio_den, ratio_num
+
+    stream = RissetStream(time_sig_num=time_sig_num, time_sig_den=time_sig_den, bpm=args.bpm,
+                          num_measures=args.measures, ratio_num=ratio_num, ratio_den=ratio_den,
+                          direction=args.direction, note_pitch_low=args.pitch_low,
+                          note_pitch_high=args.pitch_high, ramp=args.ramp,
+                          velocity_gamma=args.velocity_curve)
+    jitter_s = args.jitter_model_ms / 1000.0
+
+    if args.simulate:
+        messages, true_tick_times = simulate_clock(args.bpm, args.end_bpm, args.beats,
+                                                   args.jitter_ms, seed=args.seed)
+        end_bpm = args.bpm if args.end_bpm is None else args.end_bpm
+        print(f"Simulated clock: {args.beats} beats, {args.bpm:g} → {end_bpm:g} BPM, "
+              f"{args.jitter_ms:g} ms jitter, lookahead {args.lookahead} ticks")
+        print(f"{'Estimator':<10} {'Notes':>6} {'Mean':>8} {'RMS':>8} {'p95':>8} {'Max':>8} {'Tempo err':>10}")
+        for name, estimator in (("kalman", ClockEstimator(args.bpm, jitter_s)), ("raw", RawEstimator(args.bpm))):
+            t0 = time.perf_counter()
+            result = run_simulation(stream, messages, true_tick_times, estimator, args.lookahead)
+            elapsed = time.perf_counter() - t0
+            stats = phase_error_stats(result["errors"])
+            tempo_error = abs(result["bpm"][-1] - end_bpm)
+            print(f"{name:<10} {result['notes']:>6} {stats['mean_ms']:>6.2f}ms {stats['rms_ms']:>6.2f}ms "
+                  f"{stats['p95_ms']:>6.2f}ms {stats['max_ms']:>6.2f}ms {tempo_error:>6.2f} BPM"
+                  f"  ({elapsed * 1000:.0f} ms)")
+        return 0
+
+    missing_backend = "Error: live mode needs mido and python-rtmidi (pip install mido python-rtmidi)"
+    if not HAS_MIDO:
+        print(missing_backend)
+        return 1
+    if not args.list_ports and (args.input_port is None or args.output_port is None):
+        print("Error: live mode needs --input-port and --output-port (or use --simulate)")
+        return 1
+
+    # mido loads its port backend (python-rtmidi) on first use
+    try:
+        if args.list_ports:
+            print("Inputs:", ", ".join(mido.get_input_names()) or "(none)")
+            print("Outputs:", ", ".join(mido.get_output_names()) or "(none)")
+            return 0
+        print(f"Following clock on {args.input_port}, playing to {args.output_port} (Ctrl-C to quit)")
+        run_live(stream, ClockEstimator(args.bpm, jitter_s), args.input_port, args.output_port,
+                 channel=args.channel - 1, lookahead_ticks=args.lookahead)
+    except ImportError:
+        print(missing_backend)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
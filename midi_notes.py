@@ -0,0 +1,137 @@
+"""
+Fast note extraction from Standard MIDI Files.
+
+read_midi_notes() walks the raw track bytes once, pairs each note-on with
+the earliest still-open note-on of the same (channel, pitch) (FIFO), and
+returns the notes as columnar NumPy arrays. It skips building a message
+object per event, which is where mido spends its time on large files.
+"""
+
+from collections import deque
+
+import numpy as np
+
+
+def _read_varlen(data, i):
+    """Decode a variable-length quantity at data[i]; returns (value, next index)."""
+    value = 0
+    while True:
+        byte = data[i]
+        i += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, i
+
+
+def read_midi_notes(source):
+    """
+    Extract notes from a MIDI file (path, or the file's bytes).
+
+    Returns a dict of equal-length arrays sorted by start (ties keep file
+    order): start and duration in beats, pitch, velocity, channel and
+    track, plus "ticks_per_beat". Note-ons with velocity 0 count as
+    note-offs; note-offs with no open note and notes never closed are
+    dropped.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        data = bytes(source)
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+
+    if data[:4] != b"MThd":
+        raise ValueError("Not a Standard MIDI File (missing MThd header)")
+    header_len = int.from_bytes(data[4:8], "big")
+    n_tracks = int.from_bytes(data[10:12], "big")
+    division = int.from_bytes(data[12:14], "big")
+    if division & 0x8000:
+        raise ValueError("SMPTE time division is not supported (need ticks per beat)")
+
+    starts, ends, pitches, velocities, channels, tracks = [], [], [], [], [], []
+
+    pos = 8 + header_len
+    track = 0
+    while pos + 8 <= len(data) and track < n_tracks:
+        chunk_len = int.from_bytes(data[pos + 4:pos + 8], "big")
+        i = pos + 8
+        end = min(i + chunk_len, len(data))
+        is_track = data[pos:pos + 4] == b"MTrk"
+        pos = end
+        if not is_track:
+            continue
+
+        tick = 0
+        status = 0
+        open_notes = {}
+        while i < end:
+            # Delta time (inlined: this loop is the hot path)
+            byte = data[i]
+            i += 1
+            delta = byte & 0x7F
+            while byte & 0x80:
+                byte = data[i]
+                i += 1
+                delta = (delta << 7) | (byte & 0x7F)
+            tick += delta
+
+            byte = data[i]
+            if byte & 0x80:
+                i += 1
+                if byte == 0xFF:
+                    length, i = _read_varlen(data, i + 1)
+                    i += length
+                    continue
+                if byte == 0xF0 or byte == 0xF7:
+                    length, i = _read_varlen(data, i)
+                    i += length
+                    status = 0
+                    continue
+                status = byte
+            elif not status:
+                raise ValueError(f"Running status without a status byte at offset {i}")
+
+            kind = status & 0xF0
+            if kind == 0xC0 or kind == 0xD0:
+                i += 1
+                continue
+            if kind != 0x90 and kind != 0x80:
+                i += 2
+                continue
+
+            key = (status & 0x0F, data[i])
+            velocity = data[i + 1]
+            i += 2
+            if kind == 0x90 and velocity > 0:
+                queue = open_notes.get(key)
+                if queue is None:
+                    queue = open_notes[key] = deque()
+                queue.append((tick, velocity))
+            else:
+                queue = open_notes.get(key)
+                if queue:
+                    start_tick, start_velocity = queue.popleft()
+                    starts.append(start_tick)
+                    ends.append(tick)
+                    pitches.append(key[1])
+                    velocities.append(start_velocity)
+                    channels.append(key[0])
+                    tracks.append(track)
+        track += 1
+
+    start_ticks = np.array(starts, dtype=np.int64)
+    order = np.argsort(start_ticks, kind="stable")
+    return {
+        "start": start_ticks[order] / division,
+        "duration": (np.array(ends, dtype=np.int64)[order] - start_ticks[order]) / division,
+        "pitch": np.array(pitches, dtype=np.int16)[order],
+        "velocity": np.array(velocities, dtype=np.int16)[order],
+        "channel": np.array(channels, dtype=np.int16)[order],
+        "track": np.array(tracks, dtype=np.int16)[order],
+        "ticks_per_beat": division,
+    }
+
+
+def note_tuples(notes):
+    """(start, pitch, velocity, duration) tuples from read_midi_notes() arrays."""
+    return list(zip(notes["start"].tolist(), notes["pitch"].tolist(),
+                    notes["velocity"].tolist(), notes["duration"].tolist()))
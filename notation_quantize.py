@@ -0,0 +1,170 @@
+"""
+Tuplet quantization of note onsets for LilyPond notation.
+
+quantize_onsets() fits each beat of a metabar with one subdivision (plain
+or tuplet, 1 to 8 notes per beat) and snaps the beat's onsets onto its
+grid. The subdivisions are chosen together by a dynamic program over
+beats that trades snapping error against notational complexity: larger
+subdivisions cost more, changing subdivision between beats costs more,
+and two onsets landing on the same slot (including an onset rounded up
+into the next beat's downbeat) cost the most. The state is just the
+previous beat's subdivision, so the cost is O(beats × subdivisions²).
+
+Results are cached per onset set; lilypond_rhythm() turns them into
+LilyPond notes, rests and \\tuplet groups.
+"""
+
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+
+DIVISIONS = (1, 2, 3, 4, 5, 6, 7, 8)
+
+# Cost weights: snapping error is measured in units of ERROR_SCALE beats
+ERROR_SCALE = 0.05
+COMPLEXITY_COST = 0.15   # per extra subdivision of a beat with notes
+SWITCH_COST = 0.5        # subdivision differs from the previous beat's
+COLLISION_COST = 25.0    # two onsets on one slot (a note is lost)
+
+
+def _beat_costs(times, n_beats, beat_unit, divisions):
+    """
+    Per-beat costs of each subdivision.
+
+    Returns (cost, carry, downbeat), each (n_beats, len(divisions)):
+    cost of the beat's own onsets, whether an onset rounds up into the
+    next beat's slot 0, and whether an onset sits on the beat's slot 0.
+    """
+    position = np.asarray(times, dtype=np.float64) / beat_unit
+    beat = np.minimum(np.floor(position).astype(np.int64), n_beats - 1)
+    frac = position - beat
+
+    cost = np.zeros((n_beats, len(divisions)))
+    carry = np.zeros((n_beats, len(divisions)), dtype=bool)
+    downbeat = np.zeros((n_beats, len(divisions)), dtype=bool)
+    has_notes = np.bincount(beat, minlength=n_beats) > 0
+
+    for j, n in enumerate(divisions):
+        slot = np.rint(frac * n).astype(np.int64)
+        error = (frac - slot / n) * beat_unit / ERROR_SCALE
+        cost[:, j] = np.bincount(beat, weights=error * error, minlength=n_beats)
+
+        # Onsets are sorted, so same-slot onsets are adjacent
+        key = beat * (n + 1) + slot
+        collided = np.flatnonzero(key[1:] == key[:-1]) + 1
+        cost[:, j] += COLLISION_COST * np.bincount(beat[collided], minlength=n_beats)
+        cost[:, j] += COMPLEXITY_COST * (n - 1) * has_notes
+
+        carry[beat[slot == n], j] = True
+        downbeat[beat[slot == 0], j] = True
+
+    return cost, carry, downbeat
+
+
+@lru_cache(maxsize=256)
+def _quantize(times, total_beats, beat_unit, divisions):
+    n_beats = max(1, int(np.ceil(total_beats / beat_unit - 1e-9)))
+    if not times:
+        return tuple((1, ()) for _ in range(n_beats))
+
+    cost, carry, downbeat = _beat_costs(times, n_beats, beat_unit, divisions)
+    n_div = len(divisions)
+    sizes = np.array(divisions)
+    switch = SWITCH_COST * (sizes[:, None] != sizes[None, :])
+
+    # Rounding past the last beat would lose the note off the end
+    cost[-1] += COLLISION_COST * carry[-1]
+
+    # total[j]: best cost of beats 0..b with beat b on divisions[j]
+    total = cost[0].copy()
+    back = np.zeros((n_beats, n_div), dtype=np.int64)
+    for b in range(1, n_beats):
+        # [previous, current]
+        step = total[:, None] + switch + COLLISION_COST * (carry[b - 1][:, None] & downbeat[b][None, :])
+        back[b] = np.argmin(step, axis=0)
+        total = step[back[b], np.arange(n_div)] + cost[b]
+
+    choice = np.empty(n_beats, dtype=np.int64)
+    choice[-1] = int(np.argmin(total))
+    for b in range(n_beats - 1, 0, -1):
+        choice[b - 1] = back[b, choice[b]]
+
+    # Snap each onset on its beat's chosen grid
+    slots = [set() for _ in range(n_beats)]
+    position = np.asarray(times, dtype=np.float64) / beat_unit
+    beat = np.minimum(np.floor(position).astype(np.int64), n_beats - 1)
+    n = sizes[choice[beat]]
+    slot = np.rint((position - beat) * n).astype(np.int64)
+    for b, s, size in zip(beat.tolist(), slot.tolist(), n.tolist()):
+        if s == size:
+            if b + 1 < n_beats:
+                slots[b + 1].add(0)
+        else:
+            slots[b].add(s)
+
+    beats = []
+    for j, occupied in zip(choice, slots):
+        # Write e.g. a sextuplet using only every other slot as a triplet
+        n = int(sizes[j])
+        step = gcd(n, *occupied)
+        beats.append((n // step, tuple(sorted(s // step for s in occupied))) if occupied else (1, ()))
+    return tuple(beats)
+
+
+def quantize_onsets(times, total_beats, beat_unit=1.0, divisions=DIVISIONS):
+    """
+    Quantize sorted onset times (in quarter-note beats) over [0, total_beats).
+
+    beat_unit is the notated beat in quarter notes (0.5 for x/8 time).
+    Returns one (subdivision, occupied slots) pair per notated beat, e.g.
+    (3, (0, 2)) is a triplet beat with notes on its first and third
+    eighths. Results are cached per (times, total_beats, beat_unit).
+    """
+    return _quantize(tuple(float(t) for t in times), float(total_beats), float(beat_unit),
+                     tuple(divisions))
+
+
+def _durations(length, denominator):
+    """
+    LilyPond durations adding up to `length` notes of 1/denominator,
+    largest first (dotted where exact).
+    """
+    values = []
+    while length > 0:
+        size = 1 << (length.bit_length() - 1)
+        if size > 1 and length >= size + size // 2:
+            values.append(f"{denominator // size}.")
+            length -= size + size // 2
+        else:
+            values.append(f"{denominator // size}")
+            length -= size
+    return values
+
+
+def lilypond_rhythm(beats, time_sig_den=4, note="c'"):
+    """
+    LilyPond notes for quantize_onsets() output.
+
+    Each note lasts until the next onset in its beat; leading empty
+    slots are rests. Subdivisions that aren't powers of two become
+    \\tuplet n/m groups of the next-smaller power of two.
+    """
+    parts = []
+    for n, occupied in beats:
+        if not occupied:
+            parts.append(f"r{time_sig_den}")
+            continue
+
+        power = 1 << (n.bit_length() - 1)  # Largest power of two <= n
+        denominator = time_sig_den * power
+
+        events = []
+        if occupied[0] > 0:
+            events += [f"r{d}" for d in _durations(occupied[0], denominator)]
+        for start, end in zip(occupied, list(occupied[1:]) + [n]):
+            events.append("~ ".join(f"{note}{d}" for d in _durations(end - start, denominator)))
+
+        group = " ".join(events)
+        parts.append(group if n == power else f"\\tuplet {n}/{power} {{ {group} }}")
+    return " ".join(parts)
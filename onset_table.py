@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Precomputed Risset onset table for the Max for Live device.
+
+risset.js recomputes both layers' onsets by phase accumulation on every
+bang. This module runs the same engine (risset.generate_metabar_layer_times)
+once for a grid of ratios, directions and metabar lengths and packs the
+results into a small binary file the device loads once. Onsets always
+fall on the engine's 0.01-beat Euler grid, so each one is stored as a
+uint16 step index.
+
+Velocity curves and pitches change neither onset times nor note counts
+(velocities are a closed-form function of note index), so they need no
+table axis. Clip lengths off the grid aren't interpolated: onset counts
+jump with length, so the device computes those itself.
+
+File layout (little-endian; "i32" is a signed 32-bit int):
+
+    magic        4 bytes  b"RSOT"
+    version      i32
+    time_step    f64      beats per stored step (0.01)
+    base_bpm     f64      tempo the table was built at (informational:
+                          onsets in beats don't depend on tempo)
+    n_ratios     i32
+    n_lengths    i32
+    ratios       n_ratios × (i32 num, i32 den), num >= den, reduced
+    lengths      n_lengths × i32 metabar length in steps
+    index        n_ratios × 2 directions (accel, decel) × n_lengths entries
+                 of (i32 offset, i32 layer1_count, i32 layer2_count);
+                 offset counts uint16 values from the start of data
+    data         uint16 step indices: Layer 1's onsets, then Layer 2's
+
+The onsets are the layers' raw times, before the duration filter, so the
+device's createLayerNotes() filters and shapes them exactly as before.
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from math import gcd
+
+import numpy as np
+
+from risset import generate_metabar_layer_times
+
+MAGIC = b"RSOT"
+VERSION = 1
+TIME_STEP = 0.01  # Euler step of the layer generators in risset.py
+DIRECTIONS = ("accel", "decel")
+
+# Device ratio knobs run 1..9; metabars up to 64 beats in half-beat steps
+DEFAULT_MAX_TERM = 9
+DEFAULT_MAX_BEATS = 64.0
+DEFAULT_LENGTH_STEP = 0.5
+
+# Step indices must match the engine's drifting float times this closely
+TOLERANCE = 1e-9
+
+
+def table_ratios(max_term=DEFAULT_MAX_TERM):
+    """Distinct ratios num/den (reduced, num >= den) with terms up to max_term."""
+    return [(num, den) for num in range(1, max_term + 1) for den in range(1, num + 1)
+            if gcd(num, den) == 1]
+
+
+def table_lengths(max_beats=DEFAULT_MAX_BEATS, step=DEFAULT_LENGTH_STEP):
+    """Metabar lengths in beats: step, 2·step, ... up to max_beats."""
+    return [step * i for i in range(1, int(round(max_beats / step)) + 1)]
+
+
+def _entry_steps(args):
+    """Both layers' onsets for one table entry, as step indices."""
+    ratio, direction, metabar_beats, base_bpm = args
+    layer1_times, layer2_times = generate_metabar_layer_times(
+        metabar_beats, base_bpm, ratio[0] / ratio[1], direction)
+    return (np.rint(np.array(layer1_times) / TIME_STEP).astype(np.int64),
+            np.rint(np.array(layer2_times) / TIME_STEP).astype(np.int64))
+
+
+def _entries(ratios, lengths, base_bpm):
+    """Table entries in index order."""
+    return [(ratio, direction, metabar_beats, base_bpm)
+            for ratio in ratios for direction in DIRECTIONS for metabar_beats in lengths]
+
+
+def build_onset_table(ratios, lengths, base_bpm=120.0, n_workers=None):
+    """
+    Run the engine for every grid point.
+
+    Returns the table as a dict: ratios, lengths (beats), base_bpm,
+    index (n_entries × 3 int32: offset, layer1_count, layer2_count) and
+    data (uint16 step indices).
+    """
+    max_steps = max(lengths) / TIME_STEP
+    if max_steps > np.iinfo(np.uint16).max:
+        raise ValueError(f"Metabars over {np.iinfo(np.uint16).max * TIME_STEP:g} beats don't fit uint16 steps")
+
+    entries = _entries(ratios, lengths, base_bpm)
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        results = list(pool.map(_entry_steps, entries, chunksize=max(1, len(entries) // 64)))
+
+    index = np.zeros((len(entries), 3), dtype=np.int32)
+    offset = 0
+    for row, (layer1, layer2) in zip(index, results):
+        row[:] = offset, len(layer1), len(layer2)
+        offset += len(layer1) + len(layer2)
+    data = np.concatenate([np.concatenate(pair) for pair in results]).astype(np.uint16)
+
+    return {
+        "ratios": list(ratios),
+        "lengths": list(lengths),
+        "base_bpm": base_bpm,
+        "index": index,
+        "data": data,
+    }
+
+
+def write_onset_table(table, path):
+    """Write a table from build_onset_table() in the binary layout above."""
+    ratios = np.array(table["ratios"], dtype="<i4").reshape(-1, 2)
+    length_steps = np.rint(np.array(table["lengths"]) / TIME_STEP).astype("<i4")
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<idd", VERSION, TIME_STEP, table["base_bpm"]))
+        f.write(struct.pack("<ii", len(ratios), len(length_steps)))
+        f.write(ratios.tobytes())
+        f.write(length_steps.tobytes())
+        f.write(table["index"].astype("<i4").tobytes())
+        f.write(table["data"].astype("<u2").tobytes())
+        return f.tell()
+
+
+def read_onset_table(path):
+    """Load a table written by write_onset_table()."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if raw[:4] != MAGIC:
+        raise ValueError(f"{path} is not a Risset onset table (missing {MAGIC!r})")
+    version, time_step, base_bpm = struct.unpack_from("<idd", raw, 4)
+    if version != VERSION:
+        raise ValueError(f"Unsupported onset table version {version}")
+    n_ratios, n_lengths = struct.unpack_from("<ii", raw, 24)
+
+    pos = 32
+    ratios = np.frombuffer(raw, dtype="<i4", count=2 * n_ratios, offset=pos).reshape(-1, 2)
+    pos += ratios.nbytes
+    length_steps = np.frombuffer(raw, dtype="<i4", count=n_lengths, offset=pos)
+    pos += length_steps.nbytes
+    n_entries = n_ratios * len(DIRECTIONS) * n_lengths
+    index = np.frombuffer(raw, dtype="<i4", count=3 * n_entries, offset=pos).reshape(-1, 3)
+    pos += index.nbytes
+    data = np.frombuffer(raw, dtype="<u2", offset=pos)
+
+    return {
+        "ratios": [tuple(r) for r in ratios.tolist()],
+        "lengths": (length_steps * time_step).tolist(),
+        "base_bpm": base_bpm,
+        "index": index,
+        "data": data,
+    }
+
+
+def lookup_onsets(table, ratio_num, ratio_den, direction, metabar_beats):
+    """
+    (layer1_times, layer2_times) in beats for one grid point, or None if
+    the ratio or metabar length isn't in the table. The ratio may be
+    given either way round and unreduced (2/3, 6/4, ...).
+    """
+    num, den = max(ratio_num, ratio_den), min(ratio_num, ratio_den)
+    common = gcd(num, den)
+    try:
+        i_ratio = table["ratios"].index((num // common, den // common))
+    except ValueError:
+        return None
+    steps = metabar_beats / TIME_STEP
+    length_steps = np.rint(np.array(table["lengths"]) / TIME_STEP)
+    matches = np.flatnonzero(length_steps == round(steps))
+    if not len(matches) or abs(steps - round(steps)) > 1e-6:
+        return None
+
+    n_lengths = len(table["lengths"])
+    entry = (i_ratio * len(DIRECTIONS) + DIRECTIONS.index(direction)) * n_lengths + int(matches[0])
+    offset, n_layer1, n_layer2 = (int(v) for v in table["index"][entry])
+    times = table["data"][offset:offset + n_layer1 + n_layer2].astype(np.float64) * TIME_STEP
+    return times[:n_layer1], times[n_layer1:]
+
+
+def _verify_entry(args):
+    """Engine times for one entry vs the steps stored for it: (ok, worst error)."""
+    entry_args, layer1_steps, layer2_steps = args
+    ratio, direction, metabar_beats, base_bpm = entry_args
+    engine = generate_metabar_layer_times(metabar_beats, base_bpm, ratio[0] / ratio[1], direction)
+    worst = 0.0
+    for times, steps in zip(engine, (layer1_steps, layer2_steps)):
+        if len(times) != len(steps):
+            return False, float("inf")
+        if len(times):
+            worst = max(worst, float(np.max(np.abs(np.array(times) - steps * TIME_STEP))))
+    return worst <= TOLERANCE, worst
+
+
+def verify_onset_table(table, n_workers=None):
+    """
+    Rerun the engine for every entry and compare with the stored onsets.
+
+    Returns (number of entries checked, list of mismatching entries as
+    (ratio, direction, metabar_beats, worst error)).
+    """
+    entries = _entries(table["ratios"], table["lengths"], table["base_bpm"])
+    data = table["data"].astype(np.float64)
+    jobs = []
+    for entry_args, (offset, n_layer1, n_layer2) in zip(entries, table["index"].tolist()):
+        jobs.append((entry_args, data[offset:offset + n_layer1],
+                     data[offset + n_layer1:offset + n_layer1 + n_layer2]))
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        results = list(pool.map(_verify_entry, jobs, chunksize=max(1, len(jobs) // 64)))
+
+    mismatches = [(ratio, direction, metabar_beats, worst)
+                  for (ratio, direction, metabar_beats, _), (ok, worst) in zip(entries, results) if not ok]
+    return len(entries), mismatches
+
+
+def main():
+    """Build, write and check an onset table."""
+    parser = argparse.ArgumentParser(description="Export a precomputed Risset onset table for the M4L device")
+    parser.add_argument("-o", "--output", default=os.path.join("ableton", "risset_onsets.bin"),
+                        help="Table file (default: ableton/risset_onsets.bin)")
+    parser.add_argument("--max-term", type=int, default=DEFAULT_MAX_TERM,
+                        help=f"Largest ratio term (default: {DEFAULT_MAX_TERM})")
+    parser.add_argument("--max-beats", type=float, default=DEFAULT_MAX_BEATS,
+                        help=f"Longest metabar in beats (default: {DEFAULT_MAX_BEATS:g})")
+    parser.add_argument("--length-step", type=float, default=DEFAULT_LENGTH_STEP,
+                        help=f"Metabar length grid step in beats (default: {DEFAULT_LENGTH_STEP:g})")
+    parser.add_argument("--bpm", type=float, default=120.0,
+                        help="Base tempo to run the engine at (default: 120)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--verify", action="store_true",
+                        help="Read the file back and check every entry against the engine")
+    args = parser.parse_args()
+
+    ratios = table_ratios(args.max_term)
+    lengths = table_lengths(args.max_beats, args.length_step)
+
+    t0 = time.perf_counter()
+    table = build_onset_table(ratios, lengths, base_bpm=args.bpm, n_workers=args.jobs)
+    n_bytes = write_onset_table(table, args.output)
+    print(f"Onset table: {len(ratios)} ratios x {len(DIRECTIONS)} directions x {len(lengths)} lengths "
+          f"= {len(table['index'])} entries, {len(table['data']):,} onsets")
+    print(f"Wrote {args.output} ({n_bytes / 1024:.0f} KiB) in {time.perf_counter() - t0:.1f}s")
+
+    if args.verify:
+        t0 = time.perf_counter()
+        n_checked, mismatches = verify_onset_table(read_onset_table(args.output), n_workers=args.jobs)
+        print(f"Verified {n_checked} entries against the engine in {time.perf_counter() - t0:.1f}s: "
+              f"{len(mismatches)} mismatches")
+        for ratio, direction, metabar_beats, worst in mismatches[:20]:
+            print(f"  {ratio[0]}/{ratio[1]} {direction} {metabar_beats:g} beats: worst error {worst:.3g}")
+        return not mismatches
+
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
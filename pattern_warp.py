@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Tempo-warp an arbitrary MIDI pattern through the Risset process.
+
+risset.py plays one note per phase crossing. Here each layer instead
+plays a looped input pattern (a drum groove, an arpeggio, ...): an event
+at pattern position p beats sounds where the layer's accumulated phase
+reaches p. With the layer's playback rate ramping linearly from r0 to r1
+over a metabar of T beats, the phase is
+
+    phi(t) = r0·t + (r1 - r0)·t² / (2T)
+
+so the warp is its inverse, t = 2·phi / (r0 + sqrt(r0² + 2·(r1 - r0)·phi/T)),
+evaluated for all events at once. Layer 1 starts the pattern at t = 0;
+Layer 2 is aligned to end a whole number of pattern loops exactly at
+the seam, where Layer 1 of the next metabar picks it up. Velocities are
+the input velocities scaled by each layer's crossfade, by phase progress
+(the index-based fade of risset.py, for a pattern of one pulse per beat).
+
+In arc mode the two layers are written to two tracks that swap each
+metabar, the pattern counterpart of risset.py's pitch swap: each track
+plays one continuous stream, fading in and then out.
+"""
+
+import argparse
+import math
+import sys
+import time
+
+import numpy as np
+
+from midi_notes import read_midi_notes
+from risset import create_midi_file, layer_tempos
+
+# Same note-length rule as risset.filter_layer_notes
+MIN_END_GAP = 0.2
+MIN_DURATION = 0.01
+
+
+def phase_coefficients(metabar_beats, start_rate, end_rate):
+    """(a, c) of a layer's phase a·t + c·t² for a linear rate ramp."""
+    return start_rate, (end_rate - start_rate) / (2.0 * metabar_beats)
+
+
+def phase_at(t, a, c):
+    """Accumulated phase (pattern beats) at time t."""
+    return a * t + c * t * t
+
+
+def warp_times(phase, a, c):
+    """
+    Times at which the phase reaches each value of `phase` (the inverse
+    of phase_at), vectorized. Uses the cancellation-free root, so it
+    stays accurate as c → 0 (a ratio of 1).
+    """
+    phase = np.asarray(phase, dtype=np.float64)
+    return 2.0 * phase / (a + np.sqrt(np.maximum(a * a + 4.0 * c * phase, 0.0)))
+
+
+def pattern_loop_beats(notes, beats_per_measure=4.0):
+    """Loop length of a pattern: its last note end, rounded up to whole measures."""
+    if len(notes["start"]) == 0:
+        return beats_per_measure
+    end = float(np.max(notes["start"] + notes["duration"]))
+    return max(1, math.ceil(end / beats_per_measure - 1e-9)) * beats_per_measure
+
+
+def _tile(positions, loop_beats, lo, hi):
+    """Every phase p + k·loop_beats in [lo, hi), with the index of p."""
+    k = np.arange(math.floor(lo / loop_beats), math.ceil(hi / loop_beats) + 1)
+    phases = np.add.outer(k * loop_beats, positions).ravel()
+    source = np.tile(np.arange(len(positions)), len(k))
+    keep = (phases >= lo) & (phases < hi)
+    return phases[keep], source[keep]
+
+
+def warp_layer(notes, loop_beats, metabar_beats, start_rate, end_rate, fade_out,
+               velocity_gamma=1.5, align_end=False):
+    """
+    One layer's notes over a metabar: the pattern looped and warped.
+
+    align_end=False starts the pattern at t = 0 (Layer 1); True places it
+    so a loop ends exactly at metabar_beats (Layer 2). Returns a dict of
+    arrays (start, duration, pitch, velocity, channel) sorted by start.
+    """
+    a, c = phase_coefficients(metabar_beats, start_rate, end_rate)
+    total = phase_at(metabar_beats, a, c)
+    offset = math.ceil(total / loop_beats - 1e-9) * loop_beats - total if align_end else 0.0
+
+    phases, source = _tile(notes["start"], loop_beats, offset, offset + total)
+    start = warp_times(phases - offset, a, c)
+    end = warp_times(phases - offset + notes["duration"][source], a, c)
+
+    # Keep the generator's end gap before the loop point
+    duration = np.minimum(end - start, metabar_beats - start - MIN_END_GAP)
+    keep = duration > MIN_DURATION
+    phases, source, start, duration = phases[keep], source[keep], start[keep], duration[keep]
+
+    progress = (phases - offset) / total
+    shaped = np.power(1.0 - progress if fade_out else progress, velocity_gamma)
+    velocity = np.rint(1 + (notes["velocity"][source] - 1) * shaped)
+
+    order = np.argsort(start, kind="stable")
+    return {
+        "start": start[order],
+        "duration": duration[order],
+        "pitch": notes["pitch"][source][order],
+        "velocity": np.clip(velocity[order], 1, 127).astype(np.int16),
+        "channel": notes["channel"][source][order],
+    }
+
+
+def warp_pattern(notes, loop_beats, metabar_beats, bpm=120.0, ratio_value=2.0, direction="accel",
+                 velocity_gamma=1.5):
+    """
+    Both layers of one metabar, warped from the pattern's notes
+    (midi_notes.read_midi_notes() arrays). Returns (layer1, layer2).
+    """
+    (layer1_start, layer1_end), (layer2_start, layer2_end) = layer_tempos(bpm, ratio_value, direction)
+    layer1 = warp_layer(notes, loop_beats, metabar_beats, layer1_start / bpm, layer1_end / bpm,
+                        fade_out=True, velocity_gamma=velocity_gamma)
+    layer2 = warp_layer(notes, loop_beats, metabar_beats, layer2_start / bpm, layer2_end / bpm,
+                        fade_out=False, velocity_gamma=velocity_gamma, align_end=True)
+    return layer1, layer2
+
+
+def write_warped_midi(layers, metabar_beats, output_file, bpm=120.0, time_sig=(4, 4), ramp=False):
+    """
+    Write warped layers (from warp_pattern) as a two-track MIDI file.
+    In arc mode the layers swap tracks for the second metabar. Returns
+    the number of notes written.
+    """
+    midi = create_midi_file(bpm, time_sig[0], time_sig[1], num_tracks=2)
+    midi.addTrackName(0, 0, "Voice A")
+    midi.addTrackName(1, 0, "Voice B")
+
+    # Meta-bar 1: Layer 1 on track 0, Layer 2 on track 1; meta-bar 2 swapped
+    placements = [(0, 0, 0.0), (1, 1, 0.0)]
+    if not ramp:
+        placements += [(0, 1, metabar_beats), (1, 0, metabar_beats)]
+
+    n_notes = 0
+    for layer, track, time_offset in placements:
+        notes = layers[layer]
+        for start, duration, pitch, velocity, channel in zip(
+                (notes["start"] + time_offset).tolist(), notes["duration"].tolist(), notes["pitch"].tolist(),
+                notes["velocity"].tolist(), notes["channel"].tolist()):
+            midi.addNote(track, channel, pitch, start, duration, velocity)
+        n_notes += len(notes["start"])
+
+    with open(output_file, "wb") as f:
+        midi.writeFile(f)
+    return n_notes
+
+
+def main():
+    """Warp a MIDI pattern into a Risset rhythm."""
+    parser = argparse.ArgumentParser(description="Tempo-warp a MIDI pattern through the Risset curve")
+    parser.add_argument("input", help="Pattern MIDI file (looped)")
+    parser.add_argument("--pattern-beats", type=float, default=None,
+                        help="Pattern loop length in beats (default: last note end, rounded up to a measure)")
+    parser.add_argument("--time-sig", type=str, default="4/4",
+                        help="Time signature (default: 4/4)")
+    parser.add_argument("--bpm", type=float, default=120.0,
+                        help="Base tempo (default: 120)")
+    parser.add_argument("--measures", type=int, default=8,
+                        help="Output length in measures (default: 8)")
+    parser.add_argument("--ratio", type=str, default="2/1",
+                        help="Speed ratio (default: 2/1)")
+    parser.add_argument("--direction", type=str, required=True, choices=["accel", "decel"],
+                        help="Direction: accel or decel (REQUIRED)")
+    parser.add_argument("--ramp", action="store_true",
+                        help="Ramp mode: output 1 metabar (default is arc: 2 metabars)")
+    parser.add_argument("--velocity-curve", type=float, default=1.5,
+                        help="Velocity curve gamma (0.5=punch, 1.0=linear, 1.5=default, 3.0=gentle)")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="Output file (default: <input>_risset_<direction>.mid)")
+    args = parser.parse_args()
+
+    # Parse time signature
+    time_parts = args.time_sig.split("/")
+    if len(time_parts) != 2 or not all(part.isdigit() and int(part) > 0 for part in time_parts):
+        print("Error: time signature must be num/den (e.g., 4/4)")
+        return 1
+    time_sig = (int(time_parts[0]), int(time_parts[1]))
+
+    # Parse ratio
+    ratio_parts = args.ratio.split("/")
+    if len(ratio_parts) != 2 or not all(part.isdigit() and int(part) > 0 for part in ratio_parts):
+        print("Error: ratio must be num/den (e.g., 2/1)")
+        return 1
+    ratio_num = int(ratio_parts[0])
+    ratio_den = int(ratio_parts[1])
+
+    ratio_value = ratio_num / ratio_den
+    if ratio_value < 1:
+        ratio_value = 1 / ratio_value
+
+    beats_per_measure = time_sig[0] * (4.0 / time_sig[1])
+    total_output_beats = beats_per_measure * args.measures
+    metabar_beats = total_output_beats if args.ramp else total_output_beats / 2
+
+    notes = read_midi_notes(args.input)
+    loop_beats = args.pattern_beats or pattern_loop_beats(notes, beats_per_measure)
+
+    t0 = time.perf_counter()
+    layers = warp_pattern(notes, loop_beats, metabar_beats, bpm=args.bpm, ratio_value=ratio_value,
+                          direction=args.direction, velocity_gamma=args.velocity_curve)
+    warp_ms = (time.perf_counter() - t0) * 1000
+
+    output_file = args.output or args.input.rsplit(".", 1)[0] + f"_risset_{args.direction}.mid"
+    n_notes = write_warped_midi(layers, metabar_beats, output_file, bpm=args.bpm, time_sig=time_sig,
+                                ramp=args.ramp)
+
+    print(f"Generated: {output_file}")
+    print(f"  Pattern: {args.input} ({len(notes['start'])} notes, {loop_beats:g}-beat loop)")
+    print(f"  Mode: {'ramp' if args.ramp else 'arc'}, {args.measures} measures, {args.direction} {ratio_num}/{ratio_den}")
+    print(f"  Layer 1: {len(layers[0]['start'])} notes, Layer 2: {len(layers[1]['start'])} notes per metabar")
+    print(f"  Warped in {warp_ms:.2f} ms; {n_notes} notes written")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
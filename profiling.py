@@ -0,0 +1,111 @@
+"""
+Stage-level timing and counters for risset.py and audio_risset.py.
+
+Wrap each stage of a render in profiler.stage(name) and set counters
+(notes, samples, bytes, ...) on the dict it yields. Every finished stage
+is passed to the optional callback as an event dict and summed per name
+for report() and as_dict().
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+def cpu_time():
+    """
+    User + system CPU seconds of this process and its finished children
+    (the rubberband backend runs as a subprocess).
+    """
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class StageProfiler:
+    """
+    Collects per-stage wall time, CPU time and counters.
+
+    callback(event) is called as each stage finishes, with
+    {"stage", "wall_s", "cpu_s", **counters}. Stages that run more than
+    once (per layer, per block) are summed under one name.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.stages = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, **counters):
+        wall0 = time.perf_counter()
+        cpu0 = cpu_time()
+        try:
+            yield counters
+        finally:
+            self._record(name, time.perf_counter() - wall0, cpu_time() - cpu0, counters)
+
+    def count(self, name, **counters):
+        """Add counters to a stage without timing anything (e.g. bytes written)."""
+        self._record(name, 0.0, 0.0, counters, calls=0)
+
+    def _record(self, name, wall_s, cpu_s, counters, calls=1):
+        totals = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0})
+        totals["calls"] += calls
+        totals["wall_s"] += wall_s
+        totals["cpu_s"] += cpu_s
+        for key, value in counters.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[key] = totals.get(key, 0) + value
+            else:
+                totals[key] = value
+
+        if self.callback is not None:
+            self.callback(dict(counters, stage=name, wall_s=wall_s, cpu_s=cpu_s))
+
+    def as_dict(self):
+        """Stage totals in the order stages first ran, plus overall wall time."""
+        return {
+            "total_wall_s": time.perf_counter() - self.started,
+            "stages": [dict(stage=name, **totals) for name, totals in self.stages.items()],
+        }
+
+    def write_json(self, path):
+        """Write as_dict() to path ("-" for stdout)."""
+        text = json.dumps(self.as_dict(), indent=2)
+        if path == "-":
+            print(text)
+        else:
+            with open(path, "w") as f:
+                f.write(text + "\n")
+
+    def report(self):
+        """Print a per-stage table."""
+        profile = self.as_dict()
+        total = profile["total_wall_s"]
+        print(f"\n{'Stage':<22} {'Calls':>6} {'Wall':>10} {'CPU':>10} {'%':>6}  Counters")
+        print("-" * 80)
+        for totals in profile["stages"]:
+            counters = ", ".join(
+                f"{key}={value:,}" if isinstance(value, int) else f"{key}={value}"
+                for key, value in totals.items()
+                if key not in ("stage", "calls", "wall_s", "cpu_s")
+            )
+            share = 100 * totals["wall_s"] / total if total > 0 else 0.0
+            print(f"{totals['stage']:<22} {totals['calls']:>6} {totals['wall_s']:>9.4f}s "
+                  f"{totals['cpu_s']:>9.4f}s {share:>5.1f}%  {counters}")
+        print(f"{'total':<22} {'':>6} {total:>9.4f}s")
+
+
+class NullProfiler:
+    """Stand-in when profiling is off: stages cost one context manager and record nothing."""
+
+    @contextmanager
+    def stage(self, name, **counters):
+        yield counters
+
+    def count(self, name, **counters):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
@@ -9,6 +9,8 @@ from midiutil import MIDIFile
 import math
 import os
 
+from profiling import NULL_PROFILER, StageProfiler
+
 
 def generate_layer_times_forward(total_beats, base_bpm, start_tempo, end_tempo):
     """
@@ -160,6 +162,290 @@ def split_continuous_to_layers(continuous_times, total_beats):
     return layer1_times, layer2_times
 
 
+def layer_tempos(bpm, ratio_value, direction):
+    """
+    ((start, end), (start, end)) tempos of Layer 1 and Layer 2 over a metabar.
+    ratio_value is normalized to >= 1.
+    """
+    if direction == "accel":
+        # Accel: Layer 1 speeds up (base → fast), Layer 2 speeds up (slow → base)
+        return (bpm, bpm * ratio_value), (bpm / ratio_value, bpm)
+    # Decel: Layer 1 slows down (base → slow), Layer 2 slows down (fast → base)
+    return (bpm, bpm / ratio_value), (bpm * ratio_value, bpm)
+
+
+def generate_metabar_layer_times(metabar_beats, bpm, ratio_value, direction):
+    """
+    Note times of both layers over one metabar.
+
+    Layer 1: forward from t=0 (guaranteed loud note at start)
+    Layer 2: backward from metabar_beats (guaranteed loud note at end)
+    This ensures consistent, predictable behavior regardless of ratio or measure count.
+    """
+    (layer1_start, layer1_end), (layer2_start, layer2_end) = layer_tempos(bpm, ratio_value, direction)
+    layer1_times = generate_layer_times_forward(metabar_beats, bpm, layer1_start, layer1_end)
+    layer2_times = generate_layer_times_backward(metabar_beats, bpm, layer2_start, layer2_end)
+    return layer1_times, layer2_times
+
+
+def filter_layer_notes(times, metabar_beats, min_end_gap=0.2):
+    """
+    (time, duration) for the notes of a layer that are long enough to play.
+
+    Each note lasts 80% of the gap to the next one (1 beat for the last),
+    cut short to end min_end_gap beats before the loop point; notes left
+    with 0.01 beats or less are dropped.
+    """
+    valid_notes = []
+    for i, t in enumerate(times):
+        if i < len(times) - 1:
+            next_time = times[i + 1]
+            duration = min((next_time - t) * 0.8, metabar_beats - t - min_end_gap)
+        else:
+            duration = min(1.0, metabar_beats - t - min_end_gap)
+
+        if duration > 0.01:
+            valid_notes.append((t, duration))
+    return valid_notes
+
+
+def layer_velocities(n_notes, fade_out, velocity_gamma):
+    """
+    Velocities for a layer's n_notes (after filtering), by note index.
+
+    fade_out=True: 127 → 1. fade_out=False: 1 → just under 127, since the
+    127 belongs to the first note of the fade_out layer at the seam.
+    """
+    velocities = []
+    for i in range(n_notes):
+        if fade_out:
+            # Fade out: 127 → 1 (first note = 127, last note = 1)
+            if n_notes > 1:
+                progress = i / (n_notes - 1)  # 0.0 to 1.0
+            else:
+                progress = 0.0  # Single note gets 127
+            linear_vel = 1.0 - progress  # 1.0 → 0.0
+        else:
+            # Fade in: 1 → (not quite 127)
+            # Two 1s in a row at the opposite seam is fine (imperceptible).
+            if n_notes > 1:
+                progress = i / n_notes  # 0.0 to (n_notes-1)/n_notes, never reaches 1.0
+            else:
+                progress = 0.0  # Single note gets 1
+            linear_vel = progress  # 0.0 → ~0.9
+
+        # Apply gamma curve (power law) to shape the velocity
+        shaped = math.pow(linear_vel, velocity_gamma)
+        velocity = round(1 + 126 * shaped)
+
+        # Clamp to valid MIDI range
+        velocities.append(max(1, min(127, velocity)))
+    return velocities
+
+
+def crossfade_level(progress, fade_out, velocity_gamma):
+    """Controller value (0–127, unrounded) of a crossfade at progress 0–1 through the metabar."""
+    linear = 1.0 - progress if fade_out else progress
+    return 127 * math.pow(linear, velocity_gamma)
+
+
+def controller_curve(segments, metabar_beats, velocity_gamma, time_step=0.01):
+    """
+    Sample one voice's crossfade every time_step beats.
+
+    segments: (time_offset, fade_out) per metabar the voice plays, in
+    order. Returns (times, values) covering all of them.
+    """
+    n_steps = int(round(metabar_beats / time_step))
+    times, values = [], []
+    for time_offset, fade_out in segments:
+        for i in range(n_steps):
+            times.append(time_offset + i * time_step)
+            values.append(crossfade_level(i / n_steps, fade_out, velocity_gamma))
+    return times, values
+
+
+def thin_controller_curve(times, values, tolerance=1.0):
+    """
+    Fewest controller events that keep a sampled curve within tolerance.
+
+    A synth holds each CC value until the next one, so the output is a
+    step function: each event's integer value stays within tolerance of
+    every sample until the next event. Greedily extending each step as
+    far as one integer still fits is optimal for this bound. Returns
+    (time, value) pairs; tolerance must be at least 0.5.
+    """
+    events = []
+    start = 0
+    while start < len(values):
+        low = high = values[start]
+        end = start + 1
+        while end < len(values):
+            new_low, new_high = min(low, values[end]), max(high, values[end])
+            if math.ceil(new_high - tolerance) > math.floor(new_low + tolerance):
+                break
+            low, high = new_low, new_high
+            end += 1
+        # The integer nearest the step's midpoint that fits every sample
+        value = min(max(round((low + high) / 2), math.ceil(high - tolerance)), math.floor(low + tolerance))
+        if not events or events[-1][1] != value:
+            events.append((times[start], max(0, min(127, value))))
+        start = end
+    return events
+
+
+def thin_notes(notes, bpm, min_velocity=None, max_events_per_second=None):
+    """
+    Which notes to keep under an event budget, as a list of bools.
+
+    notes: (time in beats, velocity, protected) per note; the velocity
+    is the note's effective loudness (its crossfade level in CC mode).
+    Notes below
+    min_velocity are dropped; then at most max_events_per_second onsets
+    are kept in each second of output, the loudest first (earliest
+    first among equal velocities). Protected notes are always kept and
+    count against the budget.
+    """
+    keep = [False] * len(notes)
+    per_second = {}
+    beats_per_second = bpm / 60.0
+    order = sorted(range(len(notes)), key=lambda i: (not notes[i][2], -notes[i][1], notes[i][0]))
+    for i in order:
+        t, velocity, protected = notes[i]
+        second = math.floor(t / beats_per_second)
+        if not protected:
+            if min_velocity is not None and velocity < min_velocity:
+                continue
+            if max_events_per_second is not None and per_second.get(second, 0) >= max_events_per_second:
+                continue
+        keep[i] = True
+        per_second[second] = per_second.get(second, 0) + 1
+    return keep
+
+
+def peak_events_per_second(times, bpm):
+    """Most onsets (times in beats) in any one second of output, as thin_notes counts them."""
+    counts = {}
+    for t in times:
+        second = math.floor(t / (bpm / 60.0))
+        counts[second] = counts.get(second, 0) + 1
+    return max(counts.values(), default=0)
+
+
+def create_midi_file(bpm, time_sig_num, time_sig_den, num_tracks=1):
+    """MIDIFile with the tempo and time signature set at t=0 on track 0."""
+    midi = MIDIFile(num_tracks)
+    midi.addTempo(0, 0, bpm)
+    midi.addTimeSignature(0, 0, time_sig_num, int(math.log2(time_sig_den)), 24, 8)
+    return midi
+
+
+def build_risset_midi(
+    layer_notes,
+    velocities,
+    metabar_beats,
+    bpm=120.0,
+    time_sig_num=4,
+    time_sig_den=4,
+    note_pitch_low=60,
+    note_pitch_high=64,
+    ramp=False,
+    velocity_gamma=1.5,
+    min_velocity=None,
+    max_events_per_second=None,
+    crossfade="velocity",
+    cc_number=11,
+    cc_tolerance=1.0,
+    profiler=None
+):
+    """
+    The MIDIFile of a Risset rhythm, from one metabar of both layers.
+
+    layer_notes: (Layer 1, Layer 2) lists of (time, duration) from
+    filter_layer_notes; velocities: their layer_velocities (Layer 1
+    fading out). Meta-bar 1 puts Layer 1 on the low pitch and Layer 2
+    on the high one; meta-bar 2 (arc mode) swaps them to reveal the
+    continuous lines. The other options are generate_risset_rhythm's.
+
+    Returns (midi, stats): stats has notes_written, notes_dropped,
+    cc_events and peak_rate_before/after (notes per second, None
+    without an event budget). profiler gets "thin", "add_notes" and
+    "controllers".
+    """
+    profiler = profiler or NULL_PROFILER
+    midi = create_midi_file(bpm, time_sig_num, time_sig_den)
+    track = 0
+    cc_mode = crossfade == "cc"
+    # CC mode: one channel per pitch, so each voice's controller is its own
+    channels = {note_pitch_low: 0, note_pitch_high: 1 if cc_mode else 0}
+
+    # (layer, pitch, time offset) in the order notes are added
+    voices = [(0, note_pitch_low, 0), (1, note_pitch_high, 0)]
+    if not ramp:
+        voices += [(0, note_pitch_high, metabar_beats), (1, note_pitch_low, metabar_beats)]
+
+    # (time, duration, pitch, velocity, loudness, protected) for every
+    # note. The seam notes (first of the fading-out layer, last of the
+    # fading-in one) are protected from thinning
+    pending = []
+    for layer, pitch, time_offset in voices:
+        fade_out = layer == 0
+        notes = layer_notes[layer]
+        seam_index = 0 if fade_out else len(notes) - 1
+        for i, ((t, duration), velocity) in enumerate(zip(notes, velocities[layer])):
+            if cc_mode:
+                loudness = crossfade_level(t / metabar_beats, fade_out, velocity_gamma)
+                velocity = 127
+            else:
+                loudness = velocity
+            pending.append((t + time_offset, duration, pitch, velocity, loudness, i == seam_index))
+
+    # Event budget: drop notes too quiet to hear, then thin dense seconds
+    peak_rate_before = peak_rate_after = None
+    if min_velocity is not None or max_events_per_second is not None:
+        with profiler.stage("thin", notes=len(pending)) as counters:
+            keep = thin_notes([(t, loudness, protected) for t, _, _, _, loudness, protected in pending],
+                              bpm, min_velocity, max_events_per_second)
+            kept = [note for note, k in zip(pending, keep) if k]
+            counters["dropped"] = len(pending) - len(kept)
+        peak_rate_before = peak_events_per_second([note[0] for note in pending], bpm)
+        peak_rate_after = peak_events_per_second([note[0] for note in kept], bpm)
+    else:
+        kept = pending
+
+    with profiler.stage("add_notes", notes=len(kept)):
+        for t, duration, pitch, velocity, _, _ in kept:
+            midi.addNote(track, channels[pitch], pitch, t, duration, velocity)
+
+    # CC mode: each pitch's crossfade arc as a thinned controller curve
+    cc_events = 0
+    if cc_mode:
+        # Meta-bar 1: low pitch fades out, high fades in; meta-bar 2 swapped
+        curves = [(note_pitch_low, [(0, True)]), (note_pitch_high, [(0, False)])]
+        if not ramp:
+            curves[0][1].append((metabar_beats, False))
+            curves[1][1].append((metabar_beats, True))
+        with profiler.stage("controllers") as counters:
+            n_samples = 0
+            for pitch, segments in curves:
+                times, values = controller_curve(segments, metabar_beats, velocity_gamma)
+                events = thin_controller_curve(times, values, cc_tolerance)
+                for t, value in events:
+                    midi.addControllerEvent(track, channels[pitch], t, cc_number, value)
+                n_samples += len(times)
+                cc_events += len(events)
+            counters["samples"] = n_samples
+            counters["events"] = cc_events
+
+    return midi, {
+        "notes_written": len(kept),
+        "notes_dropped": len(pending) - len(kept),
+        "cc_events": cc_events,
+        "peak_rate_before": peak_rate_before,
+        "peak_rate_after": peak_rate_after,
+    }
+
+
 def generate_lilypond(
     layer1_times,
     layer2_times,
@@ -177,21 +463,16 @@ def generate_lilypond(
     Generate a LilyPond file showing the Risset rhythm notation.
 
     Uses Volkov's notation style:
-    - Fixed polyrhythm using tuplets (ratio directly maps to subdivision)
+    - The layers' real onsets, quantized to tuplets beat by beat
+      (notation_quantize.quantize_onsets)
     - Dynamic hairpins (ff → n for fade out, n → ff for fade in)
     - Start/end tempo markings
     - Repeat signs for looping
     """
 
-    # Normalize ratio so we know which layer has more notes per beat
     ratio_value = ratio_num / ratio_den
     if ratio_value < 1:
         ratio_value = 1 / ratio_value
-        layer1_div = ratio_den  # Layer 1 subdivision (notes per beat)
-        layer2_div = ratio_num  # Layer 2 subdivision
-    else:
-        layer1_div = ratio_num
-        layer2_div = ratio_den
 
     # Calculate tempos
     if direction == "accel":
@@ -203,39 +484,23 @@ def generate_lilypond(
         end_tempo = bpm / ratio_value
         tempo_text = "rit."
 
-    def make_tuplet_beat(n):
-        """Generate one beat of n-tuplet notes."""
-        if n == 1:
-            return "c'4"
-        elif n == 2:
-            return "c'8 c'"
-        elif n == 3:
-            return "\\tuplet 3/2 { c'8 c' c' }"
-        elif n == 4:
-            return "c'16 c' c' c'"
-        elif n == 5:
-            return "\\tuplet 5/4 { c'16 c' c' c' c' }"
-        elif n == 6:
-            return "\\tuplet 6/4 { c'16 c' c' c' c' c' }"
-        elif n == 7:
-            return "\\tuplet 7/4 { c'16 c' c' c' c' c' c' }"
-        elif n == 8:
-            return "c'32 c' c' c' c' c' c' c'"
-        else:
-            # Fallback for unusual divisions
-            return "\\tuplet {}/4 {{ {} }}".format(n, " ".join(["c'16"] * n))
-
-    # Generate 8 beats (2 measures of 4/4) of each layer
-    num_beats = 8
-    layer1_beat = make_tuplet_beat(layer1_div)
-    layer2_beat = make_tuplet_beat(layer2_div)
+    # Needs numpy: imported here so MIDI-only runs need just midiutil
+    from notation_quantize import lilypond_rhythm, quantize_onsets
 
-    layer1_notes = " ".join([layer1_beat for _ in range(num_beats)])
-    layer2_notes = " ".join([layer2_beat for _ in range(num_beats)])
+    # One metabar of each layer's played notes, quantized to tuplets per
+    # notated beat (both metabars of arc mode share the same rhythm)
+    beat_unit = 4.0 / time_sig_den
+    layer_notes = []
+    for times in (layer1_times, layer2_times):
+        onsets = [t for t, _ in filter_layer_notes(times, metabar_beats)]
+        layer_notes.append(lilypond_rhythm(quantize_onsets(onsets, metabar_beats, beat_unit), time_sig_den))
+    layer1_notes, layer2_notes = layer_notes
 
-    # Build LilyPond file
-    display_ratio = f"{max(layer1_div, layer2_div)}:{min(layer1_div, layer2_div)}"
-    direction_name = "Accelerando" if direction == "accel" else "Ritardando"
+    # Hairpins across the metabar, ending at the start of its last measure
+    sixteenths = round(metabar_beats * 4)
+    last_measure = min(round(time_sig_num * 16 / time_sig_den), sixteenths - 1)
+    fade_out = f"s16*{sixteenths - last_measure}\\ff\\> s16*{last_measure}\\n"
+    fade_in = f"s16*{sixteenths - last_measure}\\n\\< s16*{last_measure}\\ff"
 
     ly_content = f'''\\version "2.24.0"
 
@@ -269,7 +534,7 @@ def generate_lilypond(
       \\mark \\markup {{ \\concat {{ \\smaller \\general-align #Y #DOWN \\note {{4}} #1 " = {int(end_tempo)}" }} }}
     }}
     \\new Dynamics {{
-      s1\\ff\\> s1 s1 s1\\n
+      {fade_out}
     }}
     \\new RhythmicStaff \\with {{
       instrumentName = "Layer 2"
@@ -280,7 +545,7 @@ def generate_lilypond(
       }}
     }}
     \\new Dynamics {{
-      s1\\n\\< s1 s1 s1\\ff
+      {fade_in}
     }}
   >>
   \\layout {{
@@ -310,7 +575,13 @@ def generate_risset_rhythm(
     note_pitch_high=64,
     output_file="risset.mid",
     ramp=False,
-    velocity_gamma=1.5
+    velocity_gamma=1.5,
+    min_velocity=None,
+    max_events_per_second=None,
+    crossfade="velocity",
+    cc_number=11,
+    cc_tolerance=1.0,
+    profiler=None
 ):
     """
     Generate a Risset rhythm MIDI file with two layers.
@@ -328,7 +599,24 @@ def generate_risset_rhythm(
       - 1.0 = Linear (proportional fade)
       - 1.5 = Default (balanced)
       - 3.0 = "Gentle" (soft, conservative - reduces middle velocities)
+
+    crossfade: "velocity" bakes the crossfade into note velocities.
+      "cc" plays every note at velocity 127 and writes the crossfade as a
+      controller curve (cc_number, e.g. 7 = volume, 11 = expression)
+      per voice, thinned to stay within cc_tolerance of the exact curve.
+      The two pitches go on MIDI channels 1 and 2 so each voice has its
+      own controller.
+
+    min_velocity / max_events_per_second: optional event budget (see
+      thin_notes). Quiet notes at the far end of each crossfade are
+      dropped; the loud notes either side of the seam are always kept.
+      None (default) writes every note.
+
+    profiler: optional profiling.StageProfiler; records onset generation,
+      note filtering, velocity shaping, thinning, note adding, the
+      controller curves (CC mode) and the MIDI write.
     """
+    profiler = profiler or NULL_PROFILER
 
     # Calculate duration in beats
     beats_per_measure = time_sig_num * (4.0 / time_sig_den)
@@ -346,121 +634,47 @@ def generate_risset_rhythm(
     if ratio_value < 1:
         ratio_value = 1 / ratio_value
 
-    # Create MIDI file
-    midi = MIDIFile(1)
-    track = 0
-    channel = 0
-    midi.addTempo(track, 0, bpm)
-    midi.addTimeSignature(track, 0, time_sig_num, int(math.log2(time_sig_den)), 24, 8)
-
     # Generate layer times using independent layer approach for both directions
-    # Layer 1: forward from t=0 (guaranteed loud note at start)
-    # Layer 2: backward from metabar_beats (guaranteed loud note at end)
-    # This ensures consistent, predictable behavior regardless of ratio or measure count
+    with profiler.stage("onsets") as counters:
+        layer1_times, layer2_times = generate_metabar_layer_times(metabar_beats, bpm, ratio_value, direction)
+        counters["notes"] = len(layer1_times) + len(layer2_times)
 
-    if direction == "accel":
-        # Accel: Layer 1 speeds up (base → fast), Layer 2 speeds up (slow → base)
-        layer1_start_tempo = bpm
-        layer1_end_tempo = bpm * ratio_value
-        layer2_start_tempo = bpm / ratio_value
-        layer2_end_tempo = bpm
-    else:
-        # Decel: Layer 1 slows down (base → slow), Layer 2 slows down (fast → base)
-        layer1_start_tempo = bpm
-        layer1_end_tempo = bpm / ratio_value
-        layer2_start_tempo = bpm * ratio_value
-        layer2_end_tempo = bpm
-
-    layer1_times = generate_layer_times_forward(metabar_beats, bpm, layer1_start_tempo, layer1_end_tempo)
-    layer2_times = generate_layer_times_backward(metabar_beats, bpm, layer2_start_tempo, layer2_end_tempo)
-
-    # Determine display tempos for output
-    if direction == "accel":
-        layer1_start, layer1_end = bpm, bpm * ratio_value
-        layer2_start, layer2_end = bpm / ratio_value, bpm
-    else:
-        layer1_start, layer1_end = bpm, bpm / ratio_value
-        layer2_start, layer2_end = bpm * ratio_value, bpm
+    # Display tempos for output
+    (layer1_start, layer1_end), (layer2_start, layer2_end) = layer_tempos(bpm, ratio_value, direction)
 
     # Both directions: Layer 1 fades out (127→1), Layer 2 fades in (1→127)
     # This creates the crossfade illusion regardless of tempo direction
 
-    # Minimum gap to leave at end for seamless looping (at base tempo)
-    min_end_gap = 0.2  # Leave at least 0.2 beats before loop point
-
-    # Helper to add a layer's notes
-    def add_layer_notes(times, pitch, fade_out, time_offset=0):
-        """Add notes for a layer. fade_out=True means 127→1, False means 1→~120.
-
-        Velocity is calculated by note INDEX (not time position) to ensure:
-        - First note of fade_out = 127, last note = 1
-        - First note of fade_in = 1, last note = slightly less than 127
-
-        The fade_in layer doesn't reach 127 because the 127 belongs to the
-        first note of the fade_out layer at the seam. Two 1s at the opposite
-        seam is acceptable (imperceptible).
-
-        Velocity curve is shaped by velocity_gamma (power law):
-        - 0.5 = "Punch" (hard, compensatory - boosts middle velocities)
-        - 1.0 = Linear (proportional fade)
-        - 3.0 = "Gentle" (soft, conservative - reduces middle velocities)
-
-        Notes are filtered by duration FIRST, then velocities calculated on
-        the remaining notes.
-        """
-        # First pass: calculate durations and filter out invalid notes
-        valid_notes = []
-        for i, t in enumerate(times):
-            if i < len(times) - 1:
-                next_time = times[i + 1]
-                duration = min((next_time - t) * 0.8, metabar_beats - t - min_end_gap)
-            else:
-                duration = min(1.0, metabar_beats - t - min_end_gap)
-
-            if duration > 0.01:
-                valid_notes.append((t, duration))
-
-        # Second pass: calculate velocities and add notes
-        n_notes = len(valid_notes)
-        for i, (t, duration) in enumerate(valid_notes):
-            if fade_out:
-                # Fade out: 127 → 1 (first note = 127, last note = 1)
-                if n_notes > 1:
-                    progress = i / (n_notes - 1)  # 0.0 to 1.0
-                else:
-                    progress = 0.0  # Single note gets 127
-                linear_vel = 1.0 - progress  # 1.0 → 0.0
-            else:
-                # Fade in: 1 → (not quite 127)
-                # The 127 belongs to the first note of the fade_out layer at the seam.
-                # Two 1s in a row at the opposite seam is fine (imperceptible).
-                if n_notes > 1:
-                    progress = i / n_notes  # 0.0 to (n_notes-1)/n_notes, never reaches 1.0
-                else:
-                    progress = 0.0  # Single note gets 1
-                linear_vel = progress  # 0.0 → ~0.9
-
-            # Apply gamma curve (power law) to shape the velocity
-            shaped = math.pow(linear_vel, velocity_gamma)
-            velocity = round(1 + 126 * shaped)
-
-            # Clamp to valid MIDI range
-            velocity = max(1, min(127, velocity))
-
-            midi.addNote(track, channel, pitch, t + time_offset, duration, velocity)
-
-    # Meta-bar 1: Layer 1 on low pitch (fades out), Layer 2 on high pitch (fades in)
-    add_layer_notes(layer1_times, note_pitch_low, fade_out=True, time_offset=0)
-    add_layer_notes(layer2_times, note_pitch_high, fade_out=False, time_offset=0)
-
-    # Meta-bar 2 (arc mode only): pitches swapped to reveal continuous lines
-    if not ramp:
-        add_layer_notes(layer1_times, note_pitch_high, fade_out=True, time_offset=metabar_beats)
-        add_layer_notes(layer2_times, note_pitch_low, fade_out=False, time_offset=metabar_beats)
-
-    # Write file
-    with open(output_file, "wb") as f:
-        midi.writeFile(f)
+    # Durations and velocities once per layer; both metabars reuse them.
+    # Notes are filtered by duration FIRST, then velocities are calculated
+    # by note index on the remaining notes (see layer_velocities)
+    layer_notes, velocities = [], []
+    for times, fade_out in ((layer1_times, True), (layer2_times, False)):
+        with profiler.stage("filter") as counters:
+            valid_notes = filter_layer_notes(times, metabar_beats)
+            counters["notes"] = len(times)
+            counters["dropped"] = len(times) - len(valid_notes)
+        with profiler.stage("velocity", notes=len(valid_notes)):
+            velocities.append(layer_velocities(len(valid_notes), fade_out, velocity_gamma))
+        layer_notes.append(valid_notes)
+
+    midi, stats = build_risset_midi(
+        layer_notes, velocities, metabar_beats, bpm=bpm, time_sig_num=time_sig_num,
+        time_sig_den=time_sig_den, note_pitch_low=note_pitch_low, note_pitch_high=note_pitch_high,
+        ramp=ramp, velocity_gamma=velocity_gamma, min_velocity=min_velocity,
+        max_events_per_second=max_events_per_second, crossfade=crossfade, cc_number=cc_number,
+        cc_tolerance=cc_tolerance, profiler=profiler)
+
+    # Write file (a path, or an open binary file such as io.BytesIO)
+    with profiler.stage("write") as counters:
+        if hasattr(output_file, "write"):
+            start = output_file.tell()
+            midi.writeFile(output_file)
+            counters["bytes"] = output_file.tell() - start
+        else:
+            with open(output_file, "wb") as f:
+                midi.writeFile(f)
+                counters["bytes"] = f.tell()
 
     duration_seconds = (total_output_beats / bpm) * 60.0
     mode_str = "ramp" if ramp else "arc"
@@ -476,12 +690,23 @@ def generate_risset_rhythm(
     print(f"  Layer 2: {layer2_start:.1f} → {layer2_end:.1f} BPM (fades in)")
     curve_name = "punch" if velocity_gamma < 0.8 else "linear" if velocity_gamma < 1.2 else "gentle" if velocity_gamma > 2.5 else "balanced"
     print(f"  Velocity curve: {velocity_gamma:.1f} ({curve_name})")
+    if crossfade == "cc":
+        print(f"  Crossfade: CC{cc_number} curves, {stats['cc_events']} events (within ±{cc_tolerance:g})")
+    if stats["peak_rate_before"] is not None:
+        saved = stats["notes_dropped"]
+        total = stats["notes_written"] + saved
+        print(f"  Event budget: {stats['notes_written']} of {total} notes kept, "
+              f"{saved} dropped ({2 * saved} note on/off events, {100 * saved / max(1, total):.1f}%)")
+        print(f"  Peak rate: {stats['peak_rate_before']} → {stats['peak_rate_after']} notes/sec")
 
     # Return data for LilyPond generation
     return {
         "layer1_times": layer1_times,
         "layer2_times": layer2_times,
-        "metabar_beats": metabar_beats
+        "metabar_beats": metabar_beats,
+        "notes_written": stats["notes_written"],
+        "notes_dropped": stats["notes_dropped"],
+        "cc_events": stats["cc_events"]
     }
 
 
@@ -511,8 +736,22 @@ if __name__ == "__main__":
                         help="Ramp mode: output 1 metabar (default is arc: 2 metabars)")
     parser.add_argument("--velocity-curve", type=float, default=1.5,
                         help="Velocity curve gamma (0.5=punch, 1.0=linear, 1.5=default, 3.0=gentle)")
+    parser.add_argument("--min-velocity", type=int, default=None,
+                        help="Drop notes below this velocity (1-127; default: keep all)")
+    parser.add_argument("--max-events-per-sec", type=float, default=None,
+                        help="Keep at most this many notes per second, loudest first (default: no limit)")
+    parser.add_argument("--crossfade", type=str, default="velocity", choices=["velocity", "cc"],
+                        help="Crossfade in note velocities (default) or as a CC curve per voice")
+    parser.add_argument("--cc", type=int, default=11,
+                        help="Controller for --crossfade cc (7=volume, 11=expression; default: 11)")
+    parser.add_argument("--cc-tolerance", type=float, default=1.0,
+                        help="Max deviation of the thinned CC curve, in controller steps (default: 1.0)")
     parser.add_argument("--lilypond", action="store_true",
-                        help="Also generate LilyPond notation file (.ly)")
+                        help="Also generate LilyPond notation file (.ly; needs numpy)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print per-stage wall/CPU time and counters")
+    parser.add_argument("--profile-json", type=str, default=None,
+                        help="Write the per-stage profile as JSON to this file ('-' for stdout)")
 
     args = parser.parse_args()
 
@@ -539,6 +778,22 @@ if __name__ == "__main__":
         print(f"Error: velocity-curve must be between 0.5 and 3.0 (got {args.velocity_curve})")
         exit(1)
 
+    # Validate event budget
+    if args.min_velocity is not None and not 1 <= args.min_velocity <= 127:
+        print(f"Error: min-velocity must be between 1 and 127 (got {args.min_velocity})")
+        exit(1)
+    if args.max_events_per_sec is not None and args.max_events_per_sec <= 0:
+        print(f"Error: max-events-per-sec must be positive (got {args.max_events_per_sec})")
+        exit(1)
+
+    # Validate controller options
+    if not 0 <= args.cc <= 127:
+        print(f"Error: cc must be between 0 and 127 (got {args.cc})")
+        exit(1)
+    if args.cc_tolerance < 0.5:
+        print(f"Error: cc-tolerance must be at least 0.5 (got {args.cc_tolerance})")
+        exit(1)
+
     # Validate ratio direction and auto-flip if contradictory
     # For accel: ratio should be < 1 (num < den) - "speeding up from num to den"
     # For decel: ratio should be > 1 (num > den) - "slowing down from num to den"
@@ -563,6 +818,8 @@ if __name__ == "__main__":
     else:
         output_file = args.output
 
+    profiler = StageProfiler() if args.profile or args.profile_json else None
+
     result = generate_risset_rhythm(
         time_sig_num=time_sig_num,
         time_sig_den=time_sig_den,
@@ -575,22 +832,36 @@ if __name__ == "__main__":
         note_pitch_high=args.pitch_high,
         output_file=output_file,
         ramp=args.ramp,
-        velocity_gamma=args.velocity_curve
+        velocity_gamma=args.velocity_curve,
+        min_velocity=args.min_velocity,
+        max_events_per_second=args.max_events_per_sec,
+        crossfade=args.crossfade,
+        cc_number=args.cc,
+        cc_tolerance=args.cc_tolerance,
+        profiler=profiler
     )
 
     # Generate LilyPond file if requested
     if args.lilypond:
         ly_file = output_file.replace(".mid", ".ly")
-        generate_lilypond(
-            layer1_times=result["layer1_times"],
-            layer2_times=result["layer2_times"],
-            metabar_beats=result["metabar_beats"],
-            time_sig_num=time_sig_num,
-            time_sig_den=time_sig_den,
-            bpm=args.bpm,
-            ratio_num=ratio_num,
-            ratio_den=ratio_den,
-            direction=args.direction,
-            output_file=ly_file,
-            ramp=args.ramp
-        )
\ No newline at end of file
+        with (profiler or NULL_PROFILER).stage("lilypond") as counters:
+            generate_lilypond(
+                layer1_times=result["layer1_times"],
+                layer2_times=result["layer2_times"],
+                metabar_beats=result["metabar_beats"],
+                time_sig_num=time_sig_num,
+                time_sig_den=time_sig_den,
+                bpm=args.bpm,
+                ratio_num=ratio_num,
+                ratio_den=ratio_den,
+                direction=args.direction,
+                output_file=ly_file,
+                ramp=args.ramp
+            )
+            counters["bytes"] = os.path.getsize(ly_file)
+
+    if profiler is not None:
+        if args.profile:
+            profiler.report()
+        if args.profile_json:
+            profiler.write_json(args.profile_json)
\ No newline at end of file
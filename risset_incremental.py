@@ -0,0 +1,224 @@
+"""
+Incremental Risset rhythm generation for knob-at-a-time editing.
+
+RissetGenerator holds the parameters of risset.generate_risset_rhythm
+and the output of each generation stage:
+
+    tempos → onsets → durations → velocities → serialize → write
+
+Each stage lists the parameters it reads and the stages it builds on.
+generate() reruns a stage only when one of its parameters or inputs
+changed since its last run, so changing velocity_gamma skips onset
+generation and changing output_file just rewrites the cached bytes. A
+stage whose output comes out unchanged (4/2 after 2/1, say) does not
+invalidate the stages after it. The file is rewritten whenever it is
+missing or was changed since the last write, even if nothing else was.
+"""
+
+import io
+import os
+
+from profiling import NULL_PROFILER
+from risset import (
+    build_risset_midi,
+    filter_layer_notes,
+    generate_layer_times_backward,
+    generate_layer_times_forward,
+    layer_tempos,
+    layer_velocities,
+)
+
+
+DEFAULT_PARAMS = {
+    "time_sig_num": 4,
+    "time_sig_den": 4,
+    "bpm": 120.0,
+    "num_measures": 4,
+    "ratio_num": 2,
+    "ratio_den": 1,
+    "direction": "accel",
+    "note_pitch_low": 60,
+    "note_pitch_high": 64,
+    "output_file": "risset.mid",
+    "ramp": False,
+    "velocity_gamma": 1.5,
+    "min_velocity": None,
+    "max_events_per_second": None,
+    "crossfade": "velocity",
+    "cc_number": 11,
+    "cc_tolerance": 1.0,
+}
+
+# (stage, parameters it reads, stages it reads), in run order
+STAGES = [
+    ("tempos", ("bpm", "ratio_num", "ratio_den", "direction"), ()),
+    ("onsets", ("bpm", "time_sig_num", "time_sig_den", "num_measures", "ramp"), ("tempos",)),
+    ("durations", (), ("onsets",)),
+    ("velocities", ("velocity_gamma",), ("durations",)),
+    ("serialize", ("bpm", "time_sig_num", "time_sig_den", "note_pitch_low", "note_pitch_high",
+                   "velocity_gamma", "min_velocity", "max_events_per_second", "crossfade",
+                   "cc_number", "cc_tolerance"),
+     ("onsets", "durations", "velocities")),
+    ("write", ("output_file",), ("serialize",)),
+]
+
+
+class RissetGenerator:
+    """
+    Stateful Risset rhythm generator that recomputes only stale stages.
+
+    Output is byte-identical to risset.generate_risset_rhythm with the
+    same parameters, including the event budget and CC crossfade
+    options: both serialize through risset.build_risset_midi.
+    """
+
+    def __init__(self, **params):
+        self.params = dict(DEFAULT_PARAMS)
+        self.outputs = {}
+        self._keys = {}
+        self._versions = {}
+        self._written = None  # (path, size, mtime) of the last file written
+        self.update(**params)
+
+    def update(self, **params):
+        """Change parameters; nothing is recomputed until generate()."""
+        unknown = set(params) - set(DEFAULT_PARAMS)
+        if unknown:
+            raise TypeError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+        self.params.update(params)
+
+    def _stage_key(self, params, inputs):
+        return (tuple(self.params[name] for name in params),
+                tuple(self._versions.get(name, 0) for name in inputs))
+
+    def dirty_stages(self):
+        """Stages the next generate() would rerun, assuming every upstream rerun changes its output."""
+        dirty = set()
+        for name, params, inputs in STAGES:
+            if (self._stage_key(params, inputs) != self._keys.get(name)
+                    or dirty.intersection(inputs) or self._must_write(name)):
+                dirty.add(name)
+        return [name for name, _, _ in STAGES if name in dirty]
+
+    def _must_write(self, name):
+        """Whether the write stage must run even with unchanged inputs."""
+        if name != "write":
+            return False
+        output_file = self.params["output_file"]
+        # An open file object can't be compared to the last one written: always write
+        if hasattr(output_file, "write"):
+            return True
+        # The file on disk may have been deleted or overwritten since
+        return self._file_signature(output_file) != self._written
+
+    @staticmethod
+    def _file_signature(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return os.fspath(path), st.st_size, st.st_mtime_ns
+
+    def generate(self, profiler=None):
+        """
+        Bring every stage up to date and write the file.
+
+        Returns the dict generate_risset_rhythm returns, plus "recomputed"
+        (the stages that ran) and "midi_bytes".
+        """
+        profiler = profiler or NULL_PROFILER
+        recomputed = []
+
+        for name, params, inputs in STAGES:
+            key = self._stage_key(params, inputs)
+            if key == self._keys.get(name) and not self._must_write(name):
+                continue
+
+            with profiler.stage(name) as counters:
+                output = getattr(self, f"_run_{name}")(counters)
+            recomputed.append(name)
+
+            if name not in self.outputs or output != self.outputs[name]:
+                self._versions[name] = self._versions.get(name, 0) + 1
+            self.outputs[name] = output
+            # Versions of inputs may have just changed: key on the current ones
+            self._keys[name] = self._stage_key(params, inputs)
+
+        onsets = self.outputs["onsets"]
+        return {
+            "layer1_times": onsets["layer1_times"],
+            "layer2_times": onsets["layer2_times"],
+            "metabar_beats": onsets["metabar_beats"],
+            "notes_written": self.outputs["serialize"]["notes_written"],
+            "notes_dropped": self.outputs["serialize"]["notes_dropped"],
+            "cc_events": self.outputs["serialize"]["cc_events"],
+            "midi_bytes": self.outputs["serialize"]["midi_bytes"],
+            "recomputed": recomputed,
+        }
+
+    def _run_tempos(self, counters):
+        p = self.params
+        # Normalize to >= 1 so multiply = faster, divide = slower
+        ratio_value = p["ratio_num"] / p["ratio_den"]
+        if ratio_value < 1:
+            ratio_value = 1 / ratio_value
+        return layer_tempos(p["bpm"], ratio_value, p["direction"])
+
+    def _run_onsets(self, counters):
+        p = self.params
+        beats_per_measure = p["time_sig_num"] * (4.0 / p["time_sig_den"])
+        total_output_beats = beats_per_measure * p["num_measures"]
+        metabar_beats = total_output_beats if p["ramp"] else total_output_beats / 2
+
+        (layer1_start, layer1_end), (layer2_start, layer2_end) = self.outputs["tempos"]
+        layer1_times = generate_layer_times_forward(metabar_beats, p["bpm"], layer1_start, layer1_end)
+        layer2_times = generate_layer_times_backward(metabar_beats, p["bpm"], layer2_start, layer2_end)
+        counters["notes"] = len(layer1_times) + len(layer2_times)
+        return {
+            "metabar_beats": metabar_beats,
+            "ramp": p["ramp"],
+            "layer1_times": layer1_times,
+            "layer2_times": layer2_times,
+        }
+
+    def _run_durations(self, counters):
+        onsets = self.outputs["onsets"]
+        layer1_notes = filter_layer_notes(onsets["layer1_times"], onsets["metabar_beats"])
+        layer2_notes = filter_layer_notes(onsets["layer2_times"], onsets["metabar_beats"])
+        counters["notes"] = len(layer1_notes) + len(layer2_notes)
+        return layer1_notes, layer2_notes
+
+    def _run_velocities(self, counters):
+        layer1_notes, layer2_notes = self.outputs["durations"]
+        gamma = self.params["velocity_gamma"]
+        counters["notes"] = len(layer1_notes) + len(layer2_notes)
+        return (layer_velocities(len(layer1_notes), True, gamma),
+                layer_velocities(len(layer2_notes), False, gamma))
+
+    def _run_serialize(self, counters):
+        p = self.params
+        onsets = self.outputs["onsets"]
+        midi, stats = build_risset_midi(
+            self.outputs["durations"], self.outputs["velocities"], onsets["metabar_beats"],
+            bpm=p["bpm"], time_sig_num=p["time_sig_num"], time_sig_den=p["time_sig_den"],
+            note_pitch_low=p["note_pitch_low"], note_pitch_high=p["note_pitch_high"],
+            ramp=onsets["ramp"], velocity_gamma=p["velocity_gamma"], min_velocity=p["min_velocity"],
+            max_events_per_second=p["max_events_per_second"], crossfade=p["crossfade"],
+            cc_number=p["cc_number"], cc_tolerance=p["cc_tolerance"])
+
+        buffer = io.BytesIO()
+        midi.writeFile(buffer)
+        counters["bytes"] = buffer.tell()
+        return dict(stats, midi_bytes=buffer.getvalue())
+
+    def _run_write(self, counters):
+        output_file = self.params["output_file"]
+        midi_bytes = self.outputs["serialize"]["midi_bytes"]
+        counters["bytes"] = len(midi_bytes)
+        if hasattr(output_file, "write"):
+            output_file.write(midi_bytes)
+            return None
+        with open(output_file, "wb") as f:
+            f.write(midi_bytes)
+        self._written = self._file_signature(output_file)
+        return os.fspath(output_file)
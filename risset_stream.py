@@ -0,0 +1,186 @@
+"""
+Time-window queries over an endlessly looping Risset rhythm.
+
+RissetStream builds the notes of one metabar once, with the same onset,
+filter and velocity logic as risset.generate_risset_rhythm, and answers
+"which notes start between beat t0 and t1" for any position of the loop
+without generating what comes before it. The metabar holding a beat is
+found by division, the notes inside it by binary search over the cached
+onsets; in arc mode the two pitches swap every metabar.
+
+Positions may be ints, floats, Fractions or decimal strings ("1e30").
+They are split into (metabar index, offset) with exact rational
+arithmetic, so offsets keep full float precision however far into the
+stream the window is.
+"""
+
+from fractions import Fraction
+
+import numpy as np
+
+from risset import filter_layer_notes, generate_metabar_layer_times, layer_velocities
+
+
+class RissetStream:
+    """
+    The notes of a Risset rhythm looped forever, queryable by beat window.
+
+    Parameters match risset.generate_risset_rhythm. num_measures is the
+    length of one generated file: in arc mode (the default) that file is
+    two metabars and the stream alternates their pitch assignment; in
+    ramp mode every metabar is identical.
+    """
+
+    def __init__(
+        self,
+        time_sig_num=4,
+        time_sig_den=4,
+        bpm=120.0,
+        num_measures=4,
+        ratio_num=2,
+        ratio_den=1,
+        direction="accel",
+        note_pitch_low=60,
+        note_pitch_high=64,
+        ramp=False,
+        velocity_gamma=1.5
+    ):
+        self.bpm = bpm
+        self.ramp = ramp
+        self.pitches = (note_pitch_low, note_pitch_high)
+
+        beats_per_measure = time_sig_num * (4.0 / time_sig_den)
+        total_output_beats = beats_per_measure * num_measures
+        self.metabar_beats = total_output_beats if ramp else total_output_beats / 2
+        self._metabar = Fraction(self.metabar_beats)
+
+        ratio_value = ratio_num / ratio_den
+        if ratio_value < 1:
+            ratio_value = 1 / ratio_value
+
+        # One metabar of notes, both layers merged and sorted by onset
+        layer1_times, layer2_times = generate_metabar_layer_times(
+            self.metabar_beats, bpm, ratio_value, direction)
+        columns = []
+        for layer, times, fade_out in ((0, layer1_times, True), (1, layer2_times, False)):
+            notes = filter_layer_notes(times, self.metabar_beats)
+            velocities = layer_velocities(len(notes), fade_out, velocity_gamma)
+            columns += [(t, duration, velocity, layer)
+                        for (t, duration), velocity in zip(notes, velocities)]
+        columns.sort(key=lambda note: (note[0], note[3]))
+
+        self.onsets = np.array([note[0] for note in columns], dtype=np.float64)
+        self.durations = np.array([note[1] for note in columns], dtype=np.float64)
+        self.velocities = np.array([note[2] for note in columns], dtype=np.int16)
+        self.layers = np.array([note[3] for note in columns], dtype=np.int16)
+        self.max_duration = float(self.durations.max()) if len(columns) else 0.0
+
+    def __len__(self):
+        """Notes per metabar."""
+        return len(self.onsets)
+
+    def locate(self, beat):
+        """(metabar index, offset in beats within it) of an absolute beat position."""
+        index, offset = divmod(Fraction(beat), self._metabar)
+        return index, float(offset)
+
+    def layer_pitches(self, metabar):
+        """(Layer 1 pitch, Layer 2 pitch) in the given metabar."""
+        low, high = self.pitches
+        if not self.ramp and metabar % 2:
+            return high, low
+        return low, high
+
+    def query(self, start, end, sounding=False):
+        """
+        Notes with onsets in [start, end), in onset order.
+
+        sounding=True also returns notes that started before start and are
+        still held at start. Returns a dict of equal-length arrays:
+        "metabar" (int64), "offset" (beats into that metabar), "start"
+        (absolute beats, as float64), "duration", "pitch", "velocity" and
+        "layer" (0 fades out, 1 fades in). For positions beyond float
+        precision use "metabar" and "offset" rather than "start".
+
+        Cost is a binary search at each end of the window plus the notes
+        returned.
+        """
+        start = Fraction(start)
+        end = Fraction(end)
+        first = start - Fraction(self.max_duration) if sounding else start
+
+        first_metabar, first_offset = divmod(first, self._metabar)
+        last_metabar, last_offset = divmod(end, self._metabar)
+        n_notes = len(self.onsets)
+
+        # Index ranges into the cached metabar: [lo, hi) in the first and
+        # last metabars, everything in the ones between
+        lo = int(np.searchsorted(self.onsets, float(first_offset), side="left"))
+        hi = int(np.searchsorted(self.onsets, float(last_offset), side="left"))
+        n_metabars = max(0, last_metabar - first_metabar + 1)
+        if n_metabars == 0 or n_notes == 0:
+            return self._empty()
+
+        bounds_lo = np.zeros(n_metabars, dtype=np.int64)
+        bounds_hi = np.full(n_metabars, n_notes, dtype=np.int64)
+        bounds_lo[0] = lo
+        bounds_hi[-1] = hi
+        counts = np.maximum(bounds_hi - bounds_lo, 0)
+        total = int(counts.sum())
+        if total == 0:
+            return self._empty()
+
+        # Flat note indices and the (relative) metabar each one belongs to
+        relative = np.repeat(np.arange(n_metabars, dtype=np.int64), counts)
+        within = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+        index = np.repeat(bounds_lo, counts) + within
+
+        offset = self.onsets[index]
+        duration = self.durations[index]
+        if sounding:
+            # Note end relative to first_metabar's start, against the window start
+            window_start = float(start - first_metabar * self._metabar)
+            keep = relative * self.metabar_beats + offset + duration > window_start
+            keep |= relative * self.metabar_beats + offset >= window_start
+            relative, index, offset, duration = relative[keep], index[keep], offset[keep], duration[keep]
+
+        if abs(first_metabar) + n_metabars < 2 ** 62:
+            metabar = first_metabar + relative
+        else:
+            # Past int64: keep exact Python ints
+            metabar = np.array([first_metabar + r for r in relative.tolist()], dtype=object)
+        layer = self.layers[index]
+        low, high = self.pitches
+        if self.ramp:
+            pitch = np.where(layer == 0, low, high)
+        else:
+            swapped = (metabar % 2).astype(bool)
+            pitch = np.where((layer == 0) ^ swapped, low, high)
+
+        return {
+            "metabar": metabar,
+            "offset": offset,
+            "start": float(first_metabar * self._metabar) + relative * self.metabar_beats + offset,
+            "duration": duration,
+            "pitch": pitch.astype(np.int16),
+            "velocity": self.velocities[index],
+            "layer": layer,
+        }
+
+    def query_seconds(self, start_s, end_s, sounding=False):
+        """query() with the window given in seconds at the base tempo."""
+        beats_per_second = Fraction(self.bpm) / 60
+        return self.query(Fraction(start_s) * beats_per_second,
+                          Fraction(end_s) * beats_per_second, sounding=sounding)
+
+    def _empty(self):
+        """A query result with no notes."""
+        return {
+            "metabar": np.zeros(0, dtype=np.int64),
+            "offset": np.zeros(0),
+            "start": np.zeros(0),
+            "duration": np.zeros(0),
+            "pitch": np.zeros(0, dtype=np.int16),
+            "velocity": np.zeros(0, dtype=np.int16),
+            "layer": np.zeros(0, dtype=np.int16),
+        }
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Seam-quality audit for audio_risset.py.
+
+Renders synthetic test loops (click trains, noise bursts) through every
+audio mode over a grid of ratios and gammas, then checks the wrap point:
+level jumps (RMS and peak), a sample step (click) across the seam, and
+gaps in the onset pattern. Cases run in parallel; prints a pass/fail
+table and render timing per mode.
+
+Also stretches a click train through the WSOLA backend at fixed and
+varying rates and checks that every click comes out exactly once.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import audio_risset  # noqa: E402
+
+
+# Largest allowed level change between the windows either side of the seam
+MAX_LEVEL_JUMP_DB = 3.0
+
+# Seam sample step relative to the largest step anywhere else in the render
+MAX_STEP_RATIO = 1.0
+
+# Onset interval spanning the seam relative to the longest interval near it
+MAX_GAP_RATIO = 1.5
+
+# WSOLA transient check: (start rate, end rate or None for fixed)
+TRANSIENT_RATES = [(2.0, None), (0.5, None), (1.5, None), (2 / 3, None), (3.0, None),
+                   (1 / 3, None), (0.5, 2.0), (2.0, 0.5)]
+
+# Largest distance between an expected and a detected onset
+ONSET_TOLERANCE_MS = 10.0
+
+
+def make_click_train(sr, seconds, bpm=120, click_ms=2.0):
+    """Decaying single-cycle clicks on every beat."""
+    audio = np.zeros(int(seconds * sr))
+    n_click = max(int(click_ms * sr / 1000), 1)
+    click = np.sin(np.linspace(0, 2 * np.pi, n_click)) * np.exp(-np.linspace(0, 4, n_click))
+    for start in np.arange(0, seconds, 60.0 / bpm):
+        i = int(start * sr)
+        click_len = min(n_click, len(audio) - i)
+        audio[i:i + click_len] += click[:click_len]
+    return audio
+
+
+def make_noise_bursts(sr, seconds, bpm=120, burst_ms=30.0, seed=0):
+    """Short exponentially decaying white-noise bursts on every beat."""
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(seconds * sr))
+    n_burst = int(burst_ms * sr / 1000)
+    decay = np.exp(-np.linspace(0, 6, n_burst))
+    for start in np.arange(0, seconds, 60.0 / bpm):
+        i = int(start * sr)
+        burst_len = min(n_burst, len(audio) - i)
+        audio[i:i + burst_len] += (rng.uniform(-1, 1, n_burst) * decay)[:burst_len]
+    return audio * 0.5
+
+
+TEST_SIGNALS = {
+    "clicks": make_click_train,
+    "noise": make_noise_bursts,
+}
+
+
+def frame_levels_db(mono, frame):
+    """Non-overlapping frame RMS in dB (floored at -120)."""
+    n_frames = len(mono) // frame
+    frames = mono[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-6))
+
+
+def detect_onsets(mono, sr, frame_ms=5.0, rise_db=12.0, floor_db=-60.0):
+    """
+    Onset times (seconds) from a frame-energy envelope.
+
+    An onset is the first frame of a run where the level rises by more
+    than rise_db over the quietest of the previous few frames and ends
+    above floor_db relative to the loudest frame.
+    """
+    frame = max(int(frame_ms * sr / 1000), 1)
+    levels = frame_levels_db(mono, frame)
+    if len(levels) < 5:
+        return np.array([])
+
+    lookback = 4
+    previous_min = sliding_window_view(levels[:-1], lookback).min(axis=1)
+    rise = levels[lookback:] - previous_min
+    rising = (rise > rise_db) & (levels[lookback:] > levels.max() + floor_db)
+    first = rising & ~np.concatenate(([False], rising[:-1]))
+    return (np.flatnonzero(first) + lookback) * frame / sr
+
+
+def level_jump_db(before, after):
+    """RMS and peak level change (dB) from one window to the next."""
+    def db(x):
+        return 20 * np.log10(max(x, 1e-6))
+    rms_jump = db(np.sqrt(np.mean(after ** 2))) - db(np.sqrt(np.mean(before ** 2)))
+    peak_jump = db(np.max(np.abs(after))) - db(np.max(np.abs(before)))
+    return rms_jump, peak_jump
+
+
+def analyze_audio_seam(output, sr, window_s=0.5):
+    """
+    Measure the loop seam of a rendered output.
+
+    Compares the last window_s seconds against the first window_s seconds
+    (the audio either side of the wrap point) and runs onset detection on
+    the two joined together.
+    """
+    mono = output.mean(axis=1) if output.ndim == 2 else output
+    n_window = min(int(window_s * sr), len(mono) // 2)
+    tail, head = mono[-n_window:], mono[:n_window]
+
+    rms_jump, peak_jump = level_jump_db(tail, head)
+
+    # A click at the seam shows up as a sample step larger than any inside the render
+    steps = np.abs(np.diff(mono))
+    step_ratio = abs(mono[0] - mono[-1]) / max(steps.max(), 1e-12)
+
+    onsets = detect_onsets(np.concatenate([tail, head]), sr)
+    seam_time = n_window / sr
+    gap_ratio = None
+    if len(onsets) >= 3:
+        intervals = np.diff(onsets)
+        spanning = np.searchsorted(onsets, seam_time) - 1
+        if 0 <= spanning < len(intervals):
+            others = np.delete(intervals, spanning)
+            if len(others):
+                gap_ratio = intervals[spanning] / others.max()
+
+    return {
+        "rms_jump_db": rms_jump,
+        "peak_jump_db": peak_jump,
+        "step_ratio": step_ratio,
+        "n_onsets": len(onsets),
+        "gap_ratio": gap_ratio,
+    }
+
+
+def evaluate_audio_result(analysis):
+    """
+    Evaluate if a result passes seam checks.
+    Returns (pass/fail, reason)
+    """
+    if "error" in analysis:
+        return "ERROR", analysis["error"]
+
+    issues = []
+    if abs(analysis["rms_jump_db"]) > MAX_LEVEL_JUMP_DB:
+        issues.append(f"RMS jump {analysis['rms_jump_db']:+.1f} dB")
+    if abs(analysis["peak_jump_db"]) > MAX_LEVEL_JUMP_DB:
+        issues.append(f"Peak jump {analysis['peak_jump_db']:+.1f} dB")
+    if analysis["step_ratio"] > MAX_STEP_RATIO:
+        issues.append(f"Click {analysis['step_ratio']:.2f}")
+    if analysis["gap_ratio"] is not None and analysis["gap_ratio"] > MAX_GAP_RATIO:
+        issues.append(f"Onset gap {analysis['gap_ratio']:.2f}")
+
+    gap = "-" if analysis["gap_ratio"] is None else f"{analysis['gap_ratio']:.2f}"
+    details = (f"RMS={analysis['rms_jump_db']:+.1f}dB Peak={analysis['peak_jump_db']:+.1f}dB "
+               f"Step={analysis['step_ratio']:.2f} Gap={gap}")
+    if issues:
+        return "FAIL", ", ".join(issues)
+    return "PASS", details
+
+
+def run_audio_case(case):
+    """Render one grid point and analyze its seam (runs in a worker process)."""
+    sr = case["sr"]
+    audio = TEST_SIGNALS[case["signal"]](sr, case["seconds"], bpm=case["bpm"])
+    backend = audio_risset.resolve_backend(case["backend"], case["mode"])
+
+    t0 = time.perf_counter()
+    try:
+        output = audio_risset.render_audio_risset(
+            audio, sr, mode=case["mode"], ratio=case["ratio"],
+            direction=case["direction"], gamma=case["gamma"], backend=backend
+        )
+    except Exception as e:
+        analysis = {"error": f"{type(e).__name__}: {e}"}
+    else:
+        analysis = analyze_audio_seam(output, sr)
+    render_s = time.perf_counter() - t0
+
+    status, details = evaluate_audio_result(analysis)
+    return dict(case, status=status, details=details, render_s=render_s, analysis=analysis)
+
+
+def stretched_time(source_s, total_s, start_rate, end_rate=None):
+    """Output time of a source time under time_stretch_wsola's rate curve."""
+    if end_rate is None or np.isclose(start_rate, end_rate):
+        return source_s / start_rate
+    slope = (end_rate - start_rate) / total_s
+    return np.log1p(slope * source_s / start_rate) / slope
+
+
+def audit_wsola_transients(sr, seconds, bpm):
+    """
+    Stretch a click train with time_stretch_wsola and match output onsets.
+
+    Expected onsets are the source onsets mapped through the rate curve;
+    both sides go through detect_onsets, so a click it can't see (the one
+    at 0) is left out of both. Returns one result dict per rate.
+    """
+    source = make_click_train(sr, seconds, bpm=bpm)
+    source_onsets = detect_onsets(source, sr)
+    tolerance = ONSET_TOLERANCE_MS / 1000
+
+    results = []
+    for start_rate, end_rate in TRANSIENT_RATES:
+        output = audio_risset.time_stretch_wsola(source, sr, start_rate, end_rate)
+        expected = stretched_time(source_onsets, seconds, start_rate, end_rate)
+        found = detect_onsets(output, sr)
+
+        unmatched = list(found)
+        missing = 0
+        for t in expected:
+            distances = np.abs(np.array(unmatched) - t) if unmatched else np.array([np.inf])
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= tolerance:
+                unmatched.pop(nearest)
+            else:
+                missing += 1
+
+        rate = f"{start_rate:.3g}" if end_rate is None else f"{start_rate:.3g}->{end_rate:.3g}"
+        status = "PASS" if missing == 0 and not unmatched else "FAIL"
+        results.append({"rate": rate, "expected": len(expected), "found": len(found),
+                        "missing": missing, "extra": len(unmatched), "status": status})
+    return results
+
+
+def build_grid(modes, signals, directions, ratios, gammas, **common):
+    """Every combination of the audit axes, as case dicts."""
+    return [
+        dict(common, mode=mode, signal=signal, direction=direction, ratio=ratio, gamma=gamma)
+        for mode in modes
+        for signal in signals
+        for direction in directions
+        for ratio in ratios
+        for gamma in gammas
+    ]
+
+
+def main():
+    """Run the audio seam audit."""
+    parser = argparse.ArgumentParser(description="Audit loop seams of audio_risset.py renders")
+    parser.add_argument("--modes", nargs="+", default=["simple", "variable", "shepard"],
+                        choices=["simple", "variable", "shepard"])
+    parser.add_argument("--signals", nargs="+", default=list(TEST_SIGNALS),
+                        choices=list(TEST_SIGNALS))
+    parser.add_argument("--directions", nargs="+", default=["accel", "decel"],
+                        choices=["accel", "decel"])
+    parser.add_argument("--ratios", nargs="+", default=["3/2", "2", "3"],
+                        help="Tempo ratios, e.g. 2 3/2 (default: 3/2 2 3)")
+    parser.add_argument("--gammas", nargs="+", type=float, default=[1.0, 1.5, 3.0])
+    parser.add_argument("--seconds", type=float, default=4.0,
+                        help="Length of each test loop (default: 4)")
+    parser.add_argument("--sr", type=int, default=22050, help="Sample rate (default: 22050)")
+    parser.add_argument("--bpm", type=float, default=120.0,
+                        help="Pulse rate of the test signals (default: 120)")
+    parser.add_argument("--stretch-backend", default="wsola", choices=audio_risset.STRETCH_BACKENDS,
+                        help="Time-stretch backend (default: wsola, needs no extra packages)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    ratios = [audio_risset.parse_ratio(r) for r in args.ratios]
+    cases = build_grid(args.modes, args.signals, args.directions, ratios, args.gammas,
+                       sr=args.sr, seconds=args.seconds, bpm=args.bpm,
+                       backend=args.stretch_backend)
+
+    print("=" * 80)
+    print("AUDIO RISSET SEAM AUDIT")
+    print("=" * 80)
+    print(f"{len(cases)} cases, {args.seconds:g} s loops at {args.sr} Hz, backend {args.stretch_backend}")
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        results = list(pool.map(run_audio_case, cases))
+    wall_s = time.perf_counter() - t0
+
+    for mode in args.modes:
+        print(f"\n{'=' * 80}")
+        print(f"MODE {mode.upper()}")
+        print("=" * 80)
+        print(f"{'Signal':<8} {'Dir':<6} {'Ratio':<7} {'Gamma':<6} {'Status':<8} {'Details'}")
+        print("-" * 80)
+        for r in results:
+            if r["mode"] != mode:
+                continue
+            status_symbol = "✓" if r["status"] == "PASS" else "✗" if r["status"] == "FAIL" else "?"
+            print(f"{r['signal']:<8} {r['direction']:<6} {r['ratio']:<7.3g} {r['gamma']:<6g} "
+                  f"{status_symbol} {r['status']:<6} {r['details']}")
+
+    # Summary
+    print("\n" + "=" * 80)
+    print("SUMMARY")
+    print("=" * 80)
+    print(f"\n{'Mode':<10} {'Passed':>8} {'Failed':>8} {'Errors':>8} {'Mean render':>12} {'Total':>9}")
+    for mode in args.modes:
+        mode_results = [r for r in results if r["mode"] == mode]
+        times = [r["render_s"] for r in mode_results]
+        counts = [sum(1 for r in mode_results if r["status"] == s) for s in ("PASS", "FAIL", "ERROR")]
+        print(f"{mode:<10} {counts[0]:>8} {counts[1]:>8} {counts[2]:>8} "
+              f"{np.mean(times):>11.3f}s {np.sum(times):>8.2f}s")
+    print(f"\nWall time: {wall_s:.2f}s")
+
+    transient_results = audit_wsola_transients(args.sr, args.seconds, args.bpm)
+    print("\n" + "=" * 80)
+    print("WSOLA TRANSIENTS (click train, each click once)")
+    print("=" * 80)
+    print(f"{'Rate':<12} {'Expected':>8} {'Found':>8} {'Missing':>8} {'Extra':>8}  {'Status'}")
+    print("-" * 80)
+    for r in transient_results:
+        status_symbol = "✓" if r["status"] == "PASS" else "✗"
+        print(f"{r['rate']:<12} {r['expected']:>8} {r['found']:>8} {r['missing']:>8} {r['extra']:>8}  "
+              f"{status_symbol} {r['status']}")
+
+    failed = sum(1 for r in results + transient_results if r["status"] == "FAIL")
+    errors = sum(1 for r in results if r["status"] == "ERROR")
+    print("\n" + "=" * 80)
+    print(f"OVERALL: {'ALL TESTS PASSED' if failed == 0 and errors == 0 else 'SOME TESTS FAILED'}")
+    print("=" * 80)
+
+    return failed == 0 and errors == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
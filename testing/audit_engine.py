@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Large-grid Risset audit engine.
+
+Builds the cartesian grid of ratios, directions, measure counts, BPMs,
+time signatures and velocity curves from a JSON config and runs the
+full_audit.py seam checks on each config in-process on a worker pool:
+MIDI is generated into memory and analyzed from the bytes. Results are
+cached by parameter hash (invalidated when the generator or the checks
+change) and written to a JSON report.
+
+Example config (any key may be omitted to keep the default):
+
+    {
+        "ratios": ["2/1", "3/2", "5/4"],
+        "directions": ["accel", "decel"],
+        "measures": [4, 8, 16],
+        "bpms": [90, 120],
+        "time_sigs": ["4/4", "3/4", "7/8"],
+        "velocity_curves": [1.5]
+    }
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+TESTING_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(TESTING_DIR, "..")
+sys.path.insert(0, REPO_DIR)
+import risset  # noqa: E402
+from full_audit import analyze_seam, evaluate_result  # noqa: E402
+
+
+DEFAULT_GRID = {
+    "ratios": ["2/1", "3/1", "3/2", "4/3", "5/3", "5/4", "6/5", "7/4", "7/5", "8/5"],
+    "directions": ["accel", "decel"],
+    "measures": [4, 8],
+    "bpms": [120],
+    "time_sigs": ["4/4"],
+    "velocity_curves": [1.5],
+}
+
+# Files whose contents decide a result; the cache is keyed on them too
+SOURCE_FILES = [
+    os.path.join(REPO_DIR, "risset.py"),
+    os.path.join(REPO_DIR, "midi_notes.py"),
+    os.path.join(TESTING_DIR, "full_audit.py"),
+]
+
+
+def load_grid(config_path=None):
+    """DEFAULT_GRID, with any keys from the JSON config replacing the defaults."""
+    grid = dict(DEFAULT_GRID)
+    if config_path:
+        with open(config_path) as f:
+            config = json.load(f)
+        unknown = set(config) - set(DEFAULT_GRID)
+        if unknown:
+            raise ValueError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+        grid.update(config)
+    return grid
+
+
+def build_configs(grid):
+    """Every combination of the grid axes, as config dicts."""
+    return [
+        {"ratio": ratio, "direction": direction, "measures": measures, "bpm": bpm,
+         "time_sig": time_sig, "velocity_curve": velocity_curve}
+        for ratio, direction, measures, bpm, time_sig, velocity_curve in itertools.product(
+            grid["ratios"], grid["directions"], grid["measures"], grid["bpms"],
+            grid["time_sigs"], grid["velocity_curves"])
+    ]
+
+
+def source_digest():
+    """Hash of the generator and check sources, so stale cache entries never match."""
+    h = hashlib.sha256()
+    for path in SOURCE_FILES:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def config_key(config, digest):
+    """Cache key for one config."""
+    payload = json.dumps(config, sort_keys=True) + digest
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def audit_config(config):
+    """
+    Generate one config into memory and run the seam checks on it.
+
+    Returns the config with "status", "details" and "analysis" added;
+    malformed ratios or time signatures and generator errors become
+    status ERROR instead of raising.
+    """
+    midi_bytes = io.BytesIO()
+    try:
+        ratio_num, ratio_den = (int(x) for x in config["ratio"].split("/"))
+        time_sig_num, time_sig_den = (int(x) for x in config["time_sig"].split("/"))
+        total_beats = config["measures"] * time_sig_num * (4.0 / time_sig_den)
+        seam_beats = total_beats / 2  # Arc mode: seam is at midpoint
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            risset.generate_risset_rhythm(
+                time_sig_num=time_sig_num,
+                time_sig_den=time_sig_den,
+                bpm=config["bpm"],
+                num_measures=config["measures"],
+                ratio_num=ratio_num,
+                ratio_den=ratio_den,
+                direction=config["direction"],
+                output_file=midi_bytes,
+                velocity_gamma=config["velocity_curve"]
+            )
+        analysis = analyze_seam(midi_bytes.getvalue(), seam_beats)
+    except Exception as e:
+        analysis = {"error": f"{type(e).__name__}: {e}"}
+
+    status, details = evaluate_result(analysis)
+    return dict(config, status=status, details=details, analysis=analysis)
+
+
+def load_cache(path):
+    """Cached results by key ({} if the file doesn't exist yet)."""
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def save_cache(path, cache):
+    """Write the cache atomically."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+
+def run_audit(configs, n_workers=None, cache_path=None):
+    """
+    Audit every config, reusing cached results.
+
+    Returns (results in config order, number served from the cache).
+    """
+    digest = source_digest()
+    cache = load_cache(cache_path)
+    keys = [config_key(config, digest) for config in configs]
+
+    todo = [(i, config) for i, (key, config) in enumerate(zip(keys, configs)) if key not in cache]
+    results = [cache.get(key) for key in keys]
+
+    if todo:
+        chunksize = max(1, len(todo) // ((n_workers or os.cpu_count() or 1) * 16))
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            fresh = pool.map(audit_config, [config for _, config in todo], chunksize=chunksize)
+            for (i, _), result in zip(todo, fresh):
+                results[i] = result
+                cache[keys[i]] = result
+
+        if cache_path:
+            save_cache(cache_path, cache)
+
+    return results, len(configs) - len(todo)
+
+
+def summarize(results):
+    """Pass/fail/error counts overall and the failure count along each axis."""
+    counts = Counter(r["status"] for r in results)
+    by_axis = {}
+    for axis in ("ratio", "direction", "measures", "bpm", "time_sig", "velocity_curve"):
+        failing = Counter(str(r[axis]) for r in results if r["status"] != "PASS")
+        if failing:
+            by_axis[axis] = dict(sorted(failing.items()))
+    return {
+        "total": len(results),
+        "passed": counts["PASS"],
+        "failed": counts["FAIL"],
+        "errors": counts["ERROR"],
+        "not_passing_by_axis": by_axis,
+    }
+
+
+def main():
+    """Run the grid audit."""
+    parser = argparse.ArgumentParser(description="Audit Risset seam quality over a large parameter grid")
+    parser.add_argument("--config", default=None,
+                        help="JSON grid config (keys: " + ", ".join(DEFAULT_GRID) + ")")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument("--cache", default=os.path.join(TESTING_DIR, ".audit_cache.json"),
+                        help="Result cache file (default: testing/.audit_cache.json)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore and don't update the cache")
+    parser.add_argument("--report", default="audit_report.json",
+                        help="JSON report path (default: audit_report.json)")
+    parser.add_argument("--show-failures", type=int, default=20,
+                        help="Failures to list (default: 20)")
+    args = parser.parse_args()
+
+    grid = load_grid(args.config)
+    configs = build_configs(grid)
+
+    print("=" * 80)
+    print("RISSET GRID AUDIT")
+    print("=" * 80)
+    print(" x ".join(f"{len(values)} {axis}" for axis, values in grid.items()) + f" = {len(configs)} configs")
+
+    t0 = time.perf_counter()
+    results, n_cached = run_audit(configs, n_workers=args.jobs,
+                                  cache_path=None if args.no_cache else args.cache)
+    wall_s = time.perf_counter() - t0
+
+    summary = summarize(results)
+    summary.update(cached=n_cached, wall_s=wall_s)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "source_digest": source_digest(),
+            "grid": grid,
+        },
+        "summary": summary,
+        "results": results,
+    }
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=1)
+
+    total = summary["total"]
+    print(f"\nTotal: {total} ({n_cached} cached) in {wall_s:.2f}s")
+    print(f"Passed: {summary['passed']} ({100 * summary['passed'] / total:.1f}%)")
+    print(f"Failed: {summary['failed']} ({100 * summary['failed'] / total:.1f}%)")
+    print(f"Errors: {summary['errors']} ({100 * summary['errors'] / total:.1f}%)")
+
+    for axis, failing in summary["not_passing_by_axis"].items():
+        print(f"  not passing by {axis}: " + ", ".join(f"{k}={v}" for k, v in failing.items()))
+
+    not_passing = [r for r in results if r["status"] != "PASS"]
+    if not_passing:
+        print(f"\n--- NOT PASSING (first {min(args.show_failures, len(not_passing))}) ---")
+        for r in not_passing[:args.show_failures]:
+            print(f"  {r['measures']}m {r['time_sig']} {r['bpm']}bpm {r['direction']} "
+                  f"{r['ratio']} gamma={r['velocity_curve']}: {r['status']} {r['details']}")
+
+    print(f"\nReport: {args.report}")
+    print("=" * 80)
+    print(f"OVERALL: {'ALL TESTS PASSED' if not not_passing else 'SOME TESTS FAILED'}")
+    print("=" * 80)
+
+    return not not_passing
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for risset.py and audio_risset.py.
+
+Times the MIDI layer generators, the full generate_risset_rhythm (with
+MIDI write) and each audio mode on synthetic signals, over sizes from
+4 to 4096 measures and 1 s to 10 min of audio. Records wall time, peak
+traced memory and realtime factor, saves them to JSON and compares
+against a stored baseline with regression thresholds.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import risset  # noqa: E402
+import audio_risset  # noqa: E402
+from audio_audit import make_noise_bursts  # noqa: E402
+
+
+MEASURE_SIZES = [4, 16, 64, 256, 1024, 4096]
+AUDIO_SECONDS = [1, 10, 60, 600]
+
+# Sizes used with --quick
+QUICK_MEASURE_SIZES = [4, 64, 256]
+QUICK_AUDIO_SECONDS = [1, 10]
+
+# Cases whose first run takes longer than this are not repeated
+REPEAT_LIMIT_S = 5.0
+
+# Timing changes smaller than this are noise, whatever the relative change
+MIN_REGRESSION_S = 0.001
+
+BPM = 120.0
+RATIO = 2.0
+SAMPLE_RATE = 44100
+
+
+def midi_cases(measures, out_dir):
+    """(name, callable, music seconds) for the MIDI benchmarks at one size."""
+    metabar_beats = measures * 4 / 2
+    music_s = measures * 4 / BPM * 60.0
+    output_file = os.path.join(out_dir, f"risset_{measures}m.mid")
+
+    def full_rhythm():
+        with contextlib.redirect_stdout(io.StringIO()):
+            risset.generate_risset_rhythm(num_measures=measures, bpm=BPM, ratio_num=2, ratio_den=1,
+                                          direction="accel", output_file=output_file)
+
+    return [
+        ("layer_times_forward",
+         lambda: risset.generate_layer_times_forward(metabar_beats, BPM, BPM, BPM * RATIO), music_s / 2),
+        ("layer_times_backward",
+         lambda: risset.generate_layer_times_backward(metabar_beats, BPM, BPM / RATIO, BPM), music_s / 2),
+        ("continuous_line_times",
+         lambda: risset.generate_continuous_line_times(metabar_beats, BPM, RATIO, "accel"), music_s),
+        ("generate_risset_rhythm", full_rhythm, music_s),
+    ]
+
+
+def audio_cases(seconds, modes, backend):
+    """(name, callable, audio seconds) for the audio benchmarks at one size."""
+    audio = make_noise_bursts(SAMPLE_RATE, seconds, bpm=BPM)
+    audio = np.column_stack([audio, audio[::-1]])
+
+    def render(mode):
+        return lambda: audio_risset.render_audio_risset(
+            audio, SAMPLE_RATE, mode=mode, ratio=RATIO, direction="accel",
+            backend=audio_risset.resolve_backend(backend, mode)
+        )
+
+    return [(f"audio_{mode}", render(mode), seconds) for mode in modes]
+
+
+def measure(fn, repeat=3, memory=True):
+    """
+    Best-of-repeat wall time and the peak traced memory of one more run.
+
+    Memory is traced in a separate run because tracemalloc slows down
+    pure-Python code enough to distort the timing.
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+        if times[-1] > REPEAT_LIMIT_S:
+            break
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        finally:
+            tracemalloc.stop()
+
+    return min(times), peak_mb
+
+
+def run_benchmarks(measure_sizes, audio_seconds, modes, backend, repeat=3, memory=True):
+    """Run every case and return a list of result dicts."""
+    out_dir = tempfile.mkdtemp(prefix="risset_bench_")
+    cases = []
+    for measures in measure_sizes:
+        cases += [(name, measures, "measures", fn, music_s)
+                  for name, fn, music_s in midi_cases(measures, out_dir)]
+    for seconds in audio_seconds:
+        cases += [(name, seconds, "seconds", fn, music_s)
+                  for name, fn, music_s in audio_cases(seconds, modes, backend)]
+
+    results = []
+    for name, size, unit, fn, music_s in cases:
+        wall_s, peak_mb = measure(fn, repeat=repeat, memory=memory)
+        result = {
+            "name": name,
+            "size": size,
+            "unit": unit,
+            "wall_s": wall_s,
+            "peak_mb": peak_mb,
+            "realtime_factor": music_s / wall_s if wall_s > 0 else None,
+        }
+        results.append(result)
+        memory_str = "-" if peak_mb is None else f"{peak_mb:.1f}"
+        print(f"{name:<24} {size:>6g} {unit:<9} {wall_s:>10.4f}s {memory_str:>10} MB "
+              f"{result['realtime_factor']:>10.1f}x")
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=0.25, memory_threshold=0.25):
+    """
+    Compare results against a baseline run.
+
+    A case regresses when its wall time (or peak memory) grows by more
+    than threshold (memory_threshold) relative to the baseline; time
+    changes under MIN_REGRESSION_S are ignored. Returns the list of
+    regression descriptions.
+    """
+    previous = {(r["name"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+
+    print(f"\n{'Case':<40} {'Baseline':>10} {'Current':>10} {'Change':>8}")
+    print("-" * 72)
+    for r in results:
+        old = previous.get((r["name"], r["size"]))
+        if old is None:
+            continue
+        label = f"{r['name']} @ {r['size']:g} {r['unit']}"
+        change = r["wall_s"] / old["wall_s"] - 1.0
+        flag = ""
+        if change > threshold and r["wall_s"] - old["wall_s"] > MIN_REGRESSION_S:
+            flag = "  SLOWER"
+            regressions.append(f"{label}: time {change:+.0%}")
+        if r["peak_mb"] is not None and old.get("peak_mb"):
+            mem_change = r["peak_mb"] / old["peak_mb"] - 1.0
+            if mem_change > memory_threshold:
+                flag += "  MEMORY"
+                regressions.append(f"{label}: memory {mem_change:+.0%}")
+        print(f"{label:<40} {old['wall_s']:>9.4f}s {r['wall_s']:>9.4f}s {change:>+8.0%}{flag}")
+
+    return regressions
+
+
+def main():
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(description="Benchmark risset.py and audio_risset.py")
+    parser.add_argument("--quick", action="store_true",
+                        help=f"Small sizes only ({QUICK_MEASURE_SIZES} measures, {QUICK_AUDIO_SECONDS} s)")
+    parser.add_argument("--measures", type=int, nargs="+", default=None,
+                        help=f"MIDI sizes in measures (default: {MEASURE_SIZES})")
+    parser.add_argument("--seconds", type=float, nargs="+", default=None,
+                        help=f"Audio lengths in seconds (default: {AUDIO_SECONDS})")
+    parser.add_argument("--modes", nargs="+", default=["simple", "variable", "shepard"],
+                        choices=["simple", "variable", "shepard"])
+    parser.add_argument("--stretch-backend", default="wsola", choices=audio_risset.STRETCH_BACKENDS,
+                        help="Time-stretch backend (default: wsola)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Timed runs per case, best is kept (default: 3)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Skip the tracemalloc run")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Save results to this JSON file")
+    parser.add_argument("--baseline", default=None,
+                        help="Compare against a JSON file saved by an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed wall-time increase over the baseline (default: 0.25)")
+    parser.add_argument("--memory-threshold", type=float, default=0.25,
+                        help="Allowed peak-memory increase over the baseline (default: 0.25)")
+    args = parser.parse_args()
+
+    measure_sizes = args.measures or (QUICK_MEASURE_SIZES if args.quick else MEASURE_SIZES)
+    audio_seconds = args.seconds or (QUICK_AUDIO_SECONDS if args.quick else AUDIO_SECONDS)
+
+    print("=" * 80)
+    print("RISSET BENCHMARKS")
+    print("=" * 80)
+    print(f"{'Case':<24} {'Size':>6} {'':<9} {'Wall':>11} {'Peak mem':>13} {'Realtime':>11}")
+    print("-" * 80)
+
+    results = run_benchmarks(measure_sizes, audio_seconds, args.modes, args.stretch_backend,
+                             repeat=args.repeat, memory=not args.no_memory)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "stretch_backend": args.stretch_backend,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold, args.memory_threshold)
+        print("\n" + "=" * 80)
+        if regressions:
+            print(f"REGRESSIONS ({len(regressions)}):")
+            for line in regressions:
+                print(f"  {line}")
+        else:
+            print("NO REGRESSIONS")
+        print("=" * 80)
+        return not regressions
+
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -6,8 +6,11 @@ Tests seam quality for all ratios at multiple measure counts.
 
 import subprocess
 import os
+import sys
 import tempfile
-from mido import MidiFile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from midi_notes import read_midi_notes, note_tuples  # noqa: E402
 
 
 def analyze_seam(filepath, total_beats):
@@ -15,28 +18,8 @@ def analyze_seam(filepath, total_beats):
     Analyze a Risset MIDI file for seam quality.
     Returns dict with Layer 1 start offset and seam gap.
     """
-    mid = MidiFile(filepath)
-    notes = []
-    current_time = 0
-    ticks_per_beat = mid.ticks_per_beat
-    active_notes = {}
-
-    for track in mid.tracks:
-        current_time = 0
-        for msg in track:
-            current_time += msg.time
-            time_beats = current_time / ticks_per_beat
-
-            if msg.type == 'note_on' and msg.velocity > 0:
-                active_notes[msg.note] = (time_beats, msg.velocity)
-            elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
-                if msg.note in active_notes:
-                    start, vel = active_notes[msg.note]
-                    dur = time_beats - start
-                    notes.append((start, msg.note, vel, dur))
-                    del active_notes[msg.note]
-
-    notes.sort(key=lambda x: x[0])
+    # (start, pitch, velocity, duration), sorted by start
+    notes = note_tuples(read_midi_notes(filepath))
 
     # Separate by pitch
     pitches = sorted(set(n[1] for n in notes))
@@ -232,6 +215,5 @@ def main():
 
 
 if __name__ == "__main__":
-    import sys
     success = main()
     sys.exit(0 if success else 1)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Analytical seam-quality map for Risset rhythms.
+
+Computes the quantities full_audit.py's evaluate_result checks (seam gap,
+Layer 1 start offset, velocities either side of the seam) straight from
+the tempo-ramp math in risset.py, for whole arrays of ratios, measure
+counts, BPMs and velocity curves at once: no MIDI is generated or parsed.
+
+risset.py places notes where a phase, summed in 0.01-beat Euler steps of
+tempo/bpm, crosses an integer. The tempo ramps are linear, so the sum
+after j steps is a quadratic in j and the first crossing can be solved
+for directly. The step times themselves are taken from a table built
+with the generator's own repeated float additions, and note times are
+truncated to MIDI ticks as midiutil does, so results match the
+generated files except at exact floating-point ties of the phase.
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+from midiutil.MidiFile import TICKSPERQUARTERNOTE
+
+# Euler step of the layer generators in risset.py
+TIME_STEP = 0.01
+
+
+def _step_times(start, step, n_steps):
+    """
+    current_time at each iteration of a risset.py layer loop, with the
+    same float rounding as its repeated `current_time += step`.
+    """
+    return np.add.accumulate(np.concatenate(([start], np.full(n_steps, step))))
+
+
+def _ticks(beats):
+    """Beat times as midiutil writes them (truncated to ticks), in beats."""
+    return np.floor(np.asarray(beats) * TICKSPERQUARTERNOTE) / TICKSPERQUARTERNOTE
+
+
+def _first_crossing_step(c1, c2):
+    """
+    Smallest step index j whose phase sum dt·Σ r reaches 1, where the sum
+    after j steps is c2·x² + c1·x with x = j + 1. NaN where it never does.
+    """
+    disc = c1 * c1 + 4 * c2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Stable root of c2·x² + c1·x - 1 = 0 (also fine as c2 → 0)
+        x = 2.0 / (c1 + np.sqrt(disc))
+    j = np.ceil(x) - 1
+
+    # Nudge off-by-one from rounding so S(j) >= 1 > S(j - 1)
+    def phase_sum(j):
+        x = j + 1
+        return c2 * x * x + c1 * x
+
+    j = np.where(phase_sum(j) < 1.0, j + 1, j)
+    j = np.where((j > 0) & (phase_sum(j - 1) >= 1.0), j - 1, j)
+    return np.where(disc >= 0, j, np.nan)
+
+
+def seam_map(ratio, measures, bpm=120.0, time_sig=(4, 4), direction="accel", velocity_gamma=1.5):
+    """
+    Seam quantities for every combination of the broadcast inputs.
+
+    ratio, measures, bpm and velocity_gamma may be scalars or arrays
+    (NumPy broadcasting rules; use np.meshgrid / [:, None] for grids).
+    Returns a dict of arrays matching full_audit.analyze_seam's keys
+    (seam_gap, layer1_start_offset, vel_before_seam, vel_after_seam), plus
+    seam_gap_seconds and a boolean "pass" from the evaluate_result rules.
+    """
+    ratio = np.asarray(ratio, dtype=np.float64)
+    ratio = np.where(ratio < 1, 1 / ratio, ratio)
+    measures = np.asarray(measures, dtype=np.float64)
+    bpm = np.asarray(bpm, dtype=np.float64)
+    velocity_gamma = np.asarray(velocity_gamma, dtype=np.float64)
+
+    beats_per_measure = time_sig[0] * (4.0 / time_sig[1])
+    metabar = measures * beats_per_measure / 2  # Arc mode: seam at the midpoint
+    dt = TIME_STEP
+
+    # Tempo ramps as playback rates (tempo / bpm); bpm cancels out in beats
+    if direction == "accel":
+        l1_start, l1_end = 1.0, ratio
+        l2_start, l2_end = 1.0 / ratio, 1.0
+    else:
+        l1_start, l1_end = 1.0, 1.0 / ratio
+        l2_start, l2_end = ratio, 1.0
+
+    shape = np.broadcast_shapes(ratio.shape, measures.shape, bpm.shape, velocity_gamma.shape)
+    metabar = np.broadcast_to(metabar, shape)
+
+    # Layer 2 (backward from the seam): sum over steps i = 0..j of
+    # r(T - i·dt)·dt = dt·x·b - (b - a)·dt²/(2T)·(x² - x), x = j + 1
+    c2 = -(l2_end - l2_start) * dt * dt / (2 * metabar)
+    c1 = dt * l2_end - c2
+    j2 = _first_crossing_step(c1, c2)
+
+    # Layer 1 (forward from 0): the step of its second note
+    c2_forward = (l1_end - l1_start) * dt * dt / (2 * metabar)
+    c1_forward = dt * l1_start - c2_forward
+    j1 = _first_crossing_step(c1_forward, c2_forward)
+
+    # Step times and loop lengths, per distinct metabar length
+    last_before = np.full(shape, np.nan)
+    second_note = np.full(shape, np.nan)
+    n_steps = np.zeros(shape)
+    for length in np.unique(metabar):
+        where = metabar == length
+        n = int(np.ceil(length / dt)) + 2
+        backward = _step_times(length, -dt, n)
+        forward = _step_times(0.0, dt, n)
+        n_steps[where] = np.count_nonzero(backward > 0)
+        j = j2[where]
+        ok = np.isfinite(j) & (j < n)
+        last_before[where] = np.where(ok, backward[np.where(ok, j, 0).astype(int)], np.nan)
+        j = j1[where]
+        ok = np.isfinite(j) & (j < n)
+        second_note[where] = np.where(ok, forward[np.where(ok, j, 0).astype(int)], np.nan)
+
+    # Layer 2's last valid note is its first crossing; the forced note at
+    # T - 0.05 is always dropped by the duration filter (it would end past
+    # T - 0.2). Layer 1's note at t = 0 opens metabar 2 on the same pitch.
+    seam_gap = _ticks(metabar) - _ticks(last_before)
+
+    # Layer 2 note count sets the fade-in velocity of that note
+    x = n_steps
+    n_notes = np.floor(c2 * x * x + c1 * x)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        progress = np.where(n_notes > 1, (n_notes - 1) / n_notes, 0.0)
+    vel_before = np.clip(np.round(1 + 126 * progress ** velocity_gamma), 1, 127)
+
+    # Layer 1's t = 0 note survives the duration filter unless the next
+    # note or the metabar end is too close
+    first_ok = np.minimum(second_note * 0.8, metabar - 0.2) > 0.01
+    first_after = np.where(first_ok, 0.0, second_note)
+    layer1_start_offset = _ticks(metabar + first_after) - metabar
+    vel_after = np.where(first_ok, 127.0, np.nan)
+
+    result = {
+        "seam_gap": seam_gap,
+        "seam_gap_seconds": seam_gap * 60.0 / bpm,
+        "layer1_start_offset": np.broadcast_to(layer1_start_offset, shape),
+        "vel_before_seam": np.broadcast_to(vel_before, shape),
+        "vel_after_seam": np.broadcast_to(vel_after, shape),
+    }
+    result["pass"] = evaluate_map(result)
+    return result
+
+
+def evaluate_map(result):
+    """Vectorized full_audit.evaluate_result: True where every check passes."""
+    return (
+        (np.abs(result["layer1_start_offset"]) <= 0.1)
+        & (result["seam_gap"] >= 0.3) & (result["seam_gap"] <= 2.5)
+        & (result["vel_before_seam"] >= 100)
+        & (result["vel_after_seam"] >= 100)
+    )
+
+
+def save_image(path, ratios, measures, result, title):
+    """Heatmaps (ratio × measures) of the seam quantities and the pass mask."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    panels = [
+        ("seam_gap", "Seam gap (beats)", "viridis"),
+        ("vel_before_seam", "Velocity before seam", "magma"),
+        ("layer1_start_offset", "Layer 1 start offset (beats)", "viridis"),
+        ("pass", "Passes evaluate_result", "RdYlGn"),
+    ]
+    fig, axes = plt.subplots(len(panels), 1, figsize=(10, 3 * len(panels)), sharex=True)
+    extent = [ratios[0], ratios[-1], measures[0] - 0.5, measures[-1] + 0.5]
+    for ax, (key, label, cmap) in zip(axes, panels):
+        image = ax.imshow(result[key].astype(float).T, origin="lower", aspect="auto",
+                          extent=extent, cmap=cmap, interpolation="nearest")
+        ax.set_ylabel("Measures")
+        ax.set_title(label, fontsize=10)
+        fig.colorbar(image, ax=ax, pad=0.01)
+    axes[-1].set_xlabel("Ratio")
+    fig.suptitle(title, fontweight="bold")
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+
+
+def main():
+    """Compute a ratio × measures seam map and save it."""
+    parser = argparse.ArgumentParser(description="Analytical Risset seam-quality map")
+    parser.add_argument("--direction", choices=["accel", "decel"], default="accel")
+    parser.add_argument("--ratio-min", type=float, default=1.05)
+    parser.add_argument("--ratio-max", type=float, default=4.0)
+    parser.add_argument("--ratio-steps", type=int, default=1000)
+    parser.add_argument("--measures", type=int, nargs="+", default=None,
+                        help="Measure counts (default: 2 to 64)")
+    parser.add_argument("--bpm", type=float, default=120.0)
+    parser.add_argument("--time-sig", type=str, default="4/4")
+    parser.add_argument("--velocity-curve", type=float, default=1.5)
+    parser.add_argument("-o", "--output", default=None,
+                        help="Save the arrays to this .npz file")
+    parser.add_argument("--image", default=None,
+                        help="Save heatmaps to this image file")
+    args = parser.parse_args()
+
+    time_sig = tuple(int(x) for x in args.time_sig.split("/"))
+    ratios = np.linspace(args.ratio_min, args.ratio_max, args.ratio_steps)
+    measures = np.array(args.measures or range(2, 65))
+
+    t0 = time.perf_counter()
+    result = seam_map(ratios[:, np.newaxis], measures[np.newaxis, :], bpm=args.bpm,
+                      time_sig=time_sig, direction=args.direction,
+                      velocity_gamma=args.velocity_curve)
+    elapsed = time.perf_counter() - t0
+
+    n_points = result["seam_gap"].size
+    passed = int(result["pass"].sum())
+    print(f"Seam map: {len(ratios)} ratios x {len(measures)} measure counts = {n_points} points")
+    print(f"Computed in {elapsed * 1000:.1f} ms ({n_points / max(elapsed, 1e-9):,.0f} points/s)")
+    print(f"Passing: {passed} ({100 * passed / n_points:.1f}%)")
+
+    if args.output:
+        np.savez(args.output, ratios=ratios, measures=measures,
+                 **{key: np.asarray(value) for key, value in result.items()})
+        print(f"Saved: {args.output}")
+    if args.image:
+        title = (f"Risset seam map ({args.direction}, {args.time_sig}, "
+                 f"velocity curve {args.velocity_curve:g})")
+        save_image(args.image, ratios, measures, result, title)
+        print(f"Saved: {args.image}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
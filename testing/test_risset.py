@@ -4,16 +4,12 @@ Test script for Risset rhythm generator.
 Checks velocity crossfade and loop seam continuity.
 """
 
+import os
 import subprocess
 import sys
 
-# Try to import mido for MIDI parsing
-try:
-    from mido import MidiFile
-except ImportError:
-    print("Installing mido for MIDI analysis...")
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "mido"])
-    from mido import MidiFile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from midi_notes import read_midi_notes, note_tuples  # noqa: E402
 
 
 def analyze_midi(filepath, total_beats, base_bpm):
@@ -21,35 +17,8 @@ def analyze_midi(filepath, total_beats, base_bpm):
     Analyze a Risset MIDI file for loop seam quality.
     Returns analysis dict with pass/fail status.
     """
-    mid = MidiFile(filepath)
-
-    # Extract notes with duration: (time_in_beats, pitch, velocity, duration)
-    notes = []
-    current_time = 0  # in ticks
-    ticks_per_beat = mid.ticks_per_beat
-
-    # Track note_on events to calculate durations
-    active_notes = {}  # (pitch, channel) -> (start_time, velocity)
-
-    for track in mid.tracks:
-        current_time = 0
-        for msg in track:
-            current_time += msg.time
-            time_beats = current_time / ticks_per_beat
-
-            if msg.type == 'note_on' and msg.velocity > 0:
-                key = (msg.note, msg.channel if hasattr(msg, 'channel') else 0)
-                active_notes[key] = (time_beats, msg.velocity)
-            elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
-                key = (msg.note, msg.channel if hasattr(msg, 'channel') else 0)
-                if key in active_notes:
-                    start_time, velocity = active_notes[key]
-                    duration = time_beats - start_time
-                    notes.append((start_time, msg.note, velocity, duration))
-                    del active_notes[key]
-
-    # Sort by time
-    notes.sort(key=lambda x: x[0])
+    # Notes with duration: (time_in_beats, pitch, velocity, duration)
+    notes = note_tuples(read_midi_notes(filepath))
 
     # Separate layers by pitch (now includes duration)
     pitches = sorted(set(n[1] for n in notes))
@@ -259,7 +228,6 @@ def print_results(results):
 
 def run_test(ratio, direction, measures=4, bpm=120):
     """Generate a MIDI file and analyze it."""
-    import os
     import re
 
     # Generate the MIDI file
@@ -9,42 +9,27 @@ Creates PNG images showing:
 - Tempo marking (120 BPM)
 """
 
+import argparse
 import os
-from mido import MidiFile
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use('Agg')  # Files only; also safe in worker processes
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+from matplotlib.collections import PolyCollection
 from matplotlib.colors import LinearSegmentedColormap
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from midi_notes import read_midi_notes, note_tuples  # noqa: E402
+
 
 def parse_midi_notes(filepath):
     """
     Parse MIDI file and extract notes with timing, pitch, velocity, duration.
     Returns list of (start_beat, pitch, velocity, duration_beats) tuples.
     """
-    mid = MidiFile(filepath)
-    ticks_per_beat = mid.ticks_per_beat
-
-    notes = []
-    active_notes = {}  # pitch -> (start_time, velocity)
-    current_tick = 0
-
-    for track in mid.tracks:
-        current_tick = 0
-        for msg in track:
-            current_tick += msg.time
-            time_beats = current_tick / ticks_per_beat
-
-            if msg.type == 'note_on' and msg.velocity > 0:
-                active_notes[msg.note] = (time_beats, msg.velocity)
-            elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
-                if msg.note in active_notes:
-                    start, vel = active_notes[msg.note]
-                    duration = time_beats - start
-                    notes.append((start, msg.note, vel, duration))
-                    del active_notes[msg.note]
-
-    return notes
+    return note_tuples(read_midi_notes(filepath))
 
 
 def parse_filename(filename):
@@ -69,34 +54,46 @@ def parse_filename(filename):
     return ratio_num, ratio_den, direction
 
 
-def generate_piano_roll(midi_path, output_path, ratio_num, ratio_den, direction, max_beats=None):
+def generate_piano_roll(midi_path, output_path, ratio_num, ratio_den, direction, max_beats=None,
+                        notes=None):
     """
     Generate a piano roll PNG for a Risset rhythm MIDI file.
 
+    All notes are drawn as one PolyCollection, so render time barely grows
+    with note count.
+
     Args:
         max_beats: If specified, only show notes up to this beat (for ramp mode).
+        notes: Note arrays from midi_notes.read_midi_notes(); if given,
+            midi_path is not read (it is only used in messages).
     """
-    notes = parse_midi_notes(midi_path)
+    if notes is None:
+        notes = read_midi_notes(midi_path)
 
-    if not notes:
-        print(f"No notes found in {midi_path}")
-        return False
+    starts = notes["start"]
+    pitch_values = notes["pitch"]
+    velocities = notes["velocity"]
+    durations = notes["duration"]
 
     # Filter notes if max_beats specified (for ramp mode)
     if max_beats is not None:
-        notes = [(start, pitch, vel, min(dur, max_beats - start))
-                 for start, pitch, vel, dur in notes
-                 if start < max_beats]
+        keep = starts < max_beats
+        starts, pitch_values, velocities = starts[keep], pitch_values[keep], velocities[keep]
+        durations = np.minimum(durations[keep], max_beats - starts)
+
+    if len(starts) == 0:
+        print(f"No notes found in {midi_path}")
+        return False
 
     # Get unique pitches and sort them
-    pitches = sorted(set(n[1] for n in notes))
-    pitch_to_row = {p: i for i, p in enumerate(pitches)}
+    pitches = np.unique(pitch_values).tolist()
+    rows = np.searchsorted(pitches, pitch_values)
 
     # Determine total duration
     if max_beats is not None:
         total_beats = max_beats
     else:
-        max_time = max(n[0] + n[3] for n in notes)
+        max_time = np.max(starts + durations)
         total_beats = np.ceil(max_time / 4) * 4  # Round up to nearest 4 beats
     num_measures = int(total_beats / 4)
 
@@ -111,34 +108,37 @@ def generate_piano_roll(midi_path, output_path, ratio_num, ratio_den, direction,
     cmap = LinearSegmentedColormap.from_list('velocity',
         [(0, colors_low[0]), (1, colors_high[0])])
 
-    # Plot each note as a rectangle
+    # All notes as one collection of rectangles
     row_height = 0.8
-    for start, pitch, velocity, duration in notes:
-        row = pitch_to_row[pitch]
-
-        # Normalize velocity to 0-1 for color
-        vel_norm = (velocity - 1) / 126  # vel ranges 1-127
-        color = cmap(vel_norm)
-
-        rect = patches.Rectangle(
-            (start, row + 0.1),
-            duration,
-            row_height,
-            linewidth=0.5,
-            edgecolor='black',
-            facecolor=color
-        )
-        ax.add_patch(rect)
-
-    # Draw measure lines
-    for measure in range(num_measures + 1):
-        beat = measure * 4
-        ax.axvline(x=beat, color='black', linewidth=1.5, zorder=1)
+    bottom = rows + 0.1
+    top = bottom + row_height
+    right = starts + durations
+    verts = np.stack([
+        np.column_stack([starts, bottom]),
+        np.column_stack([right, bottom]),
+        np.column_stack([right, top]),
+        np.column_stack([starts, top]),
+    ], axis=1)
+
+    # Normalize velocity to 0-1 for color
+    vel_norm = (velocities - 1) / 126  # vel ranges 1-127
+    ax.add_collection(PolyCollection(
+        verts,
+        facecolors=cmap(vel_norm),
+        edgecolors='black',
+        linewidths=0.5
+    ))
+
+    # Draw measure lines (full height, like axvline, but one collection)
+    grid = ax.get_xaxis_transform()
+    ax.vlines(np.arange(num_measures + 1) * 4, 0, 1, transform=grid,
+              color='black', linewidth=1.5, zorder=1)
 
     # Draw beat lines (lighter)
-    for beat in range(int(total_beats) + 1):
-        if beat % 4 != 0:  # Skip measure lines
-            ax.axvline(x=beat, color='gray', linewidth=0.5, linestyle='--', alpha=0.5, zorder=0)
+    beats = np.arange(int(total_beats) + 1)
+    beats = beats[beats % 4 != 0]  # Skip measure lines
+    ax.vlines(beats, 0, 1, transform=grid,
+              color='gray', linewidth=0.5, linestyle='--', alpha=0.5, zorder=0)
 
     # Labels
     pitch_names = {60: 'C3', 64: 'E3'}  # Default pitches
@@ -186,11 +186,53 @@ def generate_piano_roll(midi_path, output_path, ratio_num, ratio_den, direction,
     return True
 
 
+def render_midi_file(midi_path, output_dir):
+    """
+    Render the arc and ramp piano rolls for one MIDI file.
+
+    The notes are read once and passed to both renders. Returns the list
+    of images written.
+    """
+    midi_file = os.path.basename(midi_path)
+    base_name = os.path.splitext(midi_file)[0]
+
+    ratio_num, ratio_den, direction = parse_filename(midi_file)
+    if not (ratio_num and ratio_den and direction):
+        print(f"Skipping {midi_file}: couldn't parse filename")
+        return []
+
+    notes = read_midi_notes(midi_path)
+    written = []
+
+    # Generate arc version (full file, 8 measures = 2 metabars)
+    arc_output = os.path.join(output_dir, f"{base_name}_arc.png")
+    if generate_piano_roll(midi_path, arc_output, ratio_num, ratio_den, direction, notes=notes):
+        written.append(arc_output)
+
+    # Generate ramp version (first 4 measures = 1 metabar)
+    ramp_output = os.path.join(output_dir, f"{base_name}_ramp.png")
+    if generate_piano_roll(midi_path, ramp_output, ratio_num, ratio_den, direction, max_beats=16,
+                           notes=notes):
+        written.append(ramp_output)
+
+    return written
+
+
 def main():
     """Generate piano rolls for all MIDI files in examples/midi/."""
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    examples_dir = os.path.join(script_dir, '..', 'examples', 'midi')
-    output_dir = os.path.join(script_dir, 'piano_rolls')
+
+    parser = argparse.ArgumentParser(description="Generate piano roll images for Risset MIDI files")
+    parser.add_argument('--input-dir', default=os.path.join(script_dir, '..', 'examples', 'midi'),
+                        help="Directory of .mid files (default: examples/midi)")
+    parser.add_argument('--output-dir', default=os.path.join(script_dir, 'piano_rolls'),
+                        help="Where to write the PNGs (default: visualization/piano_rolls)")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="Worker processes (default: CPU count; 1 = no pool)")
+    args = parser.parse_args()
+
+    examples_dir = args.input_dir
+    output_dir = args.output_dir
 
     os.makedirs(output_dir, exist_ok=True)
 
@@ -203,21 +245,13 @@ def main():
 
     print(f"Found {len(midi_files)} MIDI files")
 
-    for midi_file in sorted(midi_files):
-        midi_path = os.path.join(examples_dir, midi_file)
-        base_name = os.path.splitext(midi_file)[0]
-
-        ratio_num, ratio_den, direction = parse_filename(midi_file)
-        if ratio_num and ratio_den and direction:
-            # Generate arc version (full file, 8 measures = 2 metabars)
-            arc_output = os.path.join(output_dir, f"{base_name}_arc.png")
-            generate_piano_roll(midi_path, arc_output, ratio_num, ratio_den, direction)
-
-            # Generate ramp version (first 4 measures = 1 metabar)
-            ramp_output = os.path.join(output_dir, f"{base_name}_ramp.png")
-            generate_piano_roll(midi_path, ramp_output, ratio_num, ratio_den, direction, max_beats=16)
-        else:
-            print(f"Skipping {midi_file}: couldn't parse filename")
+    midi_paths = [os.path.join(examples_dir, f) for f in sorted(midi_files)]
+    if args.jobs == 1:
+        for midi_path in midi_paths:
+            render_midi_file(midi_path, output_dir)
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            list(pool.map(render_midi_file, midi_paths, [output_dir] * len(midi_paths)))
 
     print(f"\nGenerated piano roll images in {output_dir}")
 